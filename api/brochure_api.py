@@ -1,8 +1,10 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import sys
+import uuid
 import os
 import re
 import logging
@@ -18,6 +20,11 @@ parent_dir = current_dir.parent
 sys.path.insert(0, str(parent_dir))
 
 from models.generate_single_page_brochure import SinglePageBrochureGenerator
+from models.rate_limiter import RateLimiter, RateLimiterUnavailable, RateLimitExceeded, client_id
+from models.image_bank import get_image_bank
+from models.image_cache import get_image_cache
+from models.layer_cache import get_layer_cache
+from models.sd_pool import get_pool
 from api.models import BrochureRequest, BrochureResponse, ErrorResponse
 
 # Configure logging
@@ -66,8 +73,39 @@ async def add_pdf_headers(request, call_next):
 # Store background tasks status
 tasks_status = {}
 
+# Two-phase brochures: the final pass runs in the background after the preview is returned
+PREVIEW_ABANDON_AFTER = int(os.getenv("BROCHURE_PREVIEW_ABANDON_AFTER", "120"))  # Cancel the final pass if its status isn't polled for this long
+ABANDON_CHECK_INTERVAL = 1.0
+running_tasks = {}  # task_id -> asyncio.Task generating a brochure (or a preview's final pass) in the background
+last_polled = {}  # task_id -> time.monotonic() of the last status poll
+
+# Rate limiting configuration: brochures per client, shared across workers through RATE_LIMIT_DB
+RATE_LIMIT_WINDOW = 3600  # 1 hour in seconds
+MAX_REQUESTS_PER_WINDOW = int(os.getenv("BROCHURE_MAX_REQUESTS_PER_WINDOW", "100"))
+rate_limiter = RateLimiter("brochure_api", MAX_REQUESTS_PER_WINDOW, RATE_LIMIT_WINDOW)
+
+async def check_rate_limit(http_request: Request):
+    try:
+        # SQLite may wait on other processes' locks; keep that off the event loop
+        await asyncio.to_thread(rate_limiter.acquire, client_id(http_request))
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except RateLimiterUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
 class PromptRequest(BaseModel):
     prompt: str
+    force_regenerate: bool = False  # Skip the image cache and call Stable Diffusion again
+    preview: bool = False  # Answer with a quick preview brochure, then render the final one in the background
+    fast: bool = False  # Use the closest pre-generated images from the image bank where it has them
 
 def extract_hotel_info(prompt: str) -> dict:
     """Extract hotel name and location from the prompt using simple pattern matching."""
@@ -133,104 +171,149 @@ def extract_hotel_info(prompt: str) -> dict:
         logger.error(f"Error type: {type(e)}")
         raise ValueError("Could not understand the prompt. Please try rephrasing it.")
 
-def generate_brochure_task(task_id: str, request: BrochureRequest):
+def track_image_progress(status, start, end, total):
+    """Callback for generate_images_async that folds SD's per-image progress into a task status.
+
+    Each image's progress and ETA go under `image_progress`; the task's
+    `progress` moves from `start` to `end` percent as the `total` images are
+    sampled and `eta` is the longest time any of them has left.
+    """
+    images = status["image_progress"] = {}
+    
+    def on_progress(name, progress, eta):
+        images[name] = {"progress": round(progress, 3), "eta": round(eta, 1) if eta is not None else None}
+        done = sum(image["progress"] for image in images.values()) / total
+        etas = [image["eta"] for image in images.values() if image["progress"] < 1 and image["eta"] is not None]
+        status.update(progress=int(start + (end - start) * min(done, 1.0)), eta=max(etas, default=None))
+    
+    return on_progress
+
+async def generate_brochure_task(task_id: str, request: BrochureRequest):
+    status = tasks_status[task_id]
     try:
         logger.info(f"Starting brochure generation task {task_id} for {request.hotel_name}")
-        tasks_status[task_id] = {"status": "processing", "message": "Generating brochure..."}
-        
-        # Initialize the brochure generator
-        generator = SinglePageBrochureGenerator(
+        # Writing the descriptions calls T5 and blocks, so keep it off the event loop
+        generator = await asyncio.to_thread(
+            SinglePageBrochureGenerator,
             hotel_name=request.hotel_name,
             location=request.location,
             layout=request.layout
         )
         
-        # Generate the brochure
-        generator.generate_brochure()
+        status.update(message="Generating AI images for your hotel...", progress=10)
+        await generator.generate_images_async(
+            request.force_regenerate,
+            on_progress=track_image_progress(status, 10, 80, len(generator.image_slots())),
+            fast=request.fast
+        )
         
-        # Update task status
-        brochure_filename = f"{request.hotel_name}_full_bleed_brochure.png"
-        brochure_path = os.path.join("generated_brochures", brochure_filename)
+        status.update(message="AI images generated successfully. Creating brochure layout...", progress=80, eta=None)
+        brochure_path = await asyncio.to_thread(generator.generate_brochure)
+        if not brochure_path:
+            raise Exception("Failed to generate brochure")
+        await asyncio.to_thread(generator.assets.flush)
         
-        if os.path.exists(brochure_path):
-            tasks_status[task_id] = {
-                "status": "completed",
-                "message": "Brochure generated successfully",
-                "file_path": brochure_path
-            }
-        else:
-            tasks_status[task_id] = {
-                "status": "failed",
-                "message": "Failed to generate brochure"
-            }
-            
+        status.update(
+            status="completed",
+            message="Brochure generated successfully!",
+            progress=100,
+            file_path=brochure_path
+        )
+    except asyncio.CancelledError:
+        status.update(status="cancelled", message="Brochure generation cancelled")
     except Exception as e:
         logger.error(f"Error in task {task_id}: {str(e)}")
-        tasks_status[task_id] = {
-            "status": "failed",
-            "message": str(e)
-        }
+        status.update(status="failed", message=str(e))
+    finally:
+        running_tasks.pop(task_id, None)
 
 @app.post("/generate-brochure")
-async def generate_brochure(request: BrochureRequest):
+async def generate_brochure(request: BrochureRequest, http_request: Request):
+    """Start generating a brochure in the background; poll /task-status/{task_id} for its progress"""
+    await check_rate_limit(http_request)
+    task_id = str(uuid.uuid4())
+    tasks_status[task_id] = {
+        "status": "processing",
+        "message": "Starting brochure generation process",
+        "progress": 0
+    }
+    running_tasks[task_id] = asyncio.create_task(generate_brochure_task(task_id, request))
+    return {**tasks_status[task_id], "task_id": task_id}
+
+async def start_preview(generator, force_regenerate):
+    """Render a low-step preview brochure, return it and start the final pass in the background"""
+    task_id = str(uuid.uuid4())
+    tasks_status[task_id] = {"status": "processing", "phase": "preview", "message": "Generating preview images...", "progress": 10}
     try:
-        # Create response object for streaming updates
-        response = {
-            "status": "generating",
-            "message": "Starting brochure generation process",
-            "progress": 0
-        }
-        
-        # Update progress: Starting image generation
-        response.update({
-            "message": "Generating AI images for your hotel...",
-            "progress": 20
-        })
-        
-        # Initialize brochure generator
-        generator = SinglePageBrochureGenerator(
-            hotel_name=request.hotel_name,
-            location=request.location,
-            layout=request.layout
+        await generator.generate_images_async(
+            force_regenerate, persist=False, phase="preview",
+            on_progress=track_image_progress(tasks_status[task_id], 10, 35, len(generator.image_slots()))
         )
-        
-        # Update progress: Images generated
-        response.update({
-            "message": "AI images generated successfully. Creating brochure layout...",
-            "progress": 60
-        })
-        
-        # Generate brochure
-        brochure = generator.generate_brochure()
-        
-        if brochure:
-            # Get the file path
-            file_path = f"generated_brochures/{request.hotel_name}_{request.layout}_brochure.pdf"
-            
-            # Update progress: Brochure completed
-            response.update({
-                "status": "completed",
-                "message": "Brochure generated successfully!",
-                "progress": 100,
-                "file_path": file_path
-            })
-            
-            return response
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to generate brochure"
-            )
-            
+        preview_path = await asyncio.to_thread(generator.generate_brochure, "_preview")
+        if not preview_path:
+            raise Exception("Failed to render preview brochure")
     except Exception as e:
-        logger.error(f"Error generating brochure: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error generating brochure: {str(e)}"
+        logger.error(f"Error generating preview {task_id}: {str(e)}")
+        tasks_status[task_id] = {"status": "failed", "phase": "preview", "message": str(e)}
+        raise HTTPException(status_code=500, detail=f"Failed to generate preview: {str(e)}")
+    
+    tasks_status[task_id] = {
+        "status": "processing",
+        "phase": "final",
+        "message": "Preview ready. Rendering full-quality images...",
+        "progress": 40,
+        "preview_path": os.path.basename(preview_path)
+    }
+    last_polled[task_id] = time.monotonic()
+    running_tasks[task_id] = asyncio.create_task(run_final_pass(task_id, generator, force_regenerate))
+    return {**tasks_status[task_id], "status": "preview", "task_id": task_id}
+
+async def run_final_pass(task_id, generator, force_regenerate):
+    """Replace a preview with the final brochure, unless it is cancelled or nobody polls for it any more"""
+    status = tasks_status[task_id]
+    
+    async def render():
+        await generator.generate_images_async(
+            force_regenerate, phase="final",
+            on_progress=track_image_progress(status, 40, 90, len(generator.image_slots()))
         )
+        brochure_path = await asyncio.to_thread(generator.generate_brochure)
+        if not brochure_path:
+            raise Exception("Failed to render brochure")
+        await asyncio.to_thread(generator.assets.flush)
+        return brochure_path
+    
+    work = asyncio.create_task(render())
+    try:
+        while not work.done():
+            await asyncio.wait({work}, timeout=ABANDON_CHECK_INTERVAL)
+            if not work.done() and time.monotonic() - last_polled[task_id] > PREVIEW_ABANDON_AFTER:
+                logger.info(f"Preview {task_id} was abandoned, cancelling its final pass")
+                work.cancel()
+                status.update(status="cancelled", message="Final pass cancelled: preview abandoned")
+                return
+        brochure_path = work.result()
+        safe_hotel_name = generator.hotel_name.replace(' ', '_')
+        status.update(
+            status="completed",
+            message="Brochure generated successfully",
+            progress=100,
+            file_path=os.path.basename(brochure_path),
+            images={name: f"{safe_hotel_name}_{name}.png" for name in generator.assets.paths}
+        )
+    except asyncio.CancelledError:
+        work.cancel()
+        status.update(status="cancelled", message="Final pass cancelled")
+    except Exception as e:
+        logger.error(f"Error in final pass of {task_id}: {str(e)}")
+        status.update(status="failed", message=str(e))
+    finally:
+        running_tasks.pop(task_id, None)
+        last_polled.pop(task_id, None)
 
 @app.post("/generate-brochure-from-prompt")
-async def generate_brochure_from_prompt(request: PromptRequest):
+async def generate_brochure_from_prompt(request: PromptRequest, http_request: Request):
+    await check_rate_limit(http_request)
     print("\n=== Generate Brochure From Prompt ===")
     print(f"Raw request data: {request}")
     print(f"Request type: {type(request)}")
@@ -254,10 +337,14 @@ async def generate_brochure_from_prompt(request: PromptRequest):
             location=hotel_info['location']
         )
         
+        # Banked images are already final, so fast mode has nothing to preview
+        if request.preview and not request.fast:
+            return await start_preview(generator, request.force_regenerate)
+        
         # Generate images first
         print("\nStarting image generation...")
         try:
-            generator.generate_images()
+            await generator.generate_images_async(request.force_regenerate, fast=request.fast)
             print("Image generation completed successfully")
         except Exception as img_error:
             logger.error(f"Error during image generation: {str(img_error)}")
@@ -272,6 +359,8 @@ async def generate_brochure_from_prompt(request: PromptRequest):
         try:
             brochure = generator.generate_brochure()
             print("Brochure generation completed successfully")
+            # The images were saved in the background while the brochure rendered
+            await asyncio.to_thread(generator.assets.flush)
         except Exception as brochure_error:
             logger.error(f"Error during brochure generation: {str(brochure_error)}")
             logger.error(f"Error type: {type(brochure_error)}")
@@ -365,11 +454,30 @@ async def get_image(filename: str):
 async def get_task_status(task_id: str):
     if task_id not in tasks_status:
         raise HTTPException(status_code=404, detail="Task not found")
+    last_polled[task_id] = time.monotonic()
+    return JSONResponse(tasks_status[task_id])
+
+@app.post("/task-status/{task_id}/cancel")
+async def cancel_task(task_id: str):
+    """Stop a background brochure job or the final pass of a preview brochure"""
+    if task_id not in tasks_status:
+        raise HTTPException(status_code=404, detail="Task not found")
+    task = running_tasks.get(task_id)
+    if task is not None:
+        task.cancel()
     return JSONResponse(tasks_status[task_id])
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    image_cache = get_image_cache()
+    image_bank = get_image_bank()
+    return {
+        "status": "healthy",
+        "stable_diffusion": get_pool().stats,
+        "image_cache": image_cache.summary() if image_cache is not None else None,
+        "image_bank": image_bank.summary() if image_bank is not None else None,
+        "layer_cache": get_layer_cache().summary()
+    }
 
 if __name__ == "__main__":
     import uvicorn
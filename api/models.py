@@ -6,6 +6,8 @@ class BrochureRequest(BaseModel):
     location: str
     layout: Optional[str] = "full_bleed"
     custom_prompts: Optional[dict] = None
+    force_regenerate: Optional[bool] = False  # Skip the image cache and call Stable Diffusion again
+    fast: Optional[bool] = False  # Use the closest pre-generated images from the image bank where it has them
 
 class BrochureResponse(BaseModel):
     file_path: str
@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+import asyncio
 import os
 from models.generate_single_page_brochure import SinglePageBrochureGenerator
 
@@ -25,6 +26,8 @@ app.mount("/brochures", StaticFiles(directory="generated_brochures"), name="broc
 
 class BrochureRequest(BaseModel):
     prompt: str
+    force_regenerate: bool = False  # Skip the image cache and call Stable Diffusion again
+    fast: bool = False  # Use the closest pre-generated images from the image bank where it has them
 
 @app.post("/generate-brochure-from-prompt")
 async def generate_brochure(request: BrochureRequest):
@@ -41,11 +44,14 @@ async def generate_brochure(request: BrochureRequest):
         generator = SinglePageBrochureGenerator(hotel_name, location)
         
         # Generate images first
-        generator.generate_images()
+        await generator.generate_images_async(request.force_regenerate, fast=request.fast)
         
         # Generate the brochure
         brochure_path = generator.generate_brochure()
         
+        # The images were saved in the background while the brochure rendered
+        await asyncio.to_thread(generator.assets.flush)
+        
         # Get relative paths for frontend
         brochure_filename = os.path.basename(brochure_path)
         image_paths = {
@@ -0,0 +1,83 @@
+"""End-to-end throughput and latency of the brochure API under concurrent load.
+
+    python models/stand_in_servers.py sd --step_latency lognormal:0.05,0.3 &
+    python models/stand_in_servers.py t5 --latency normal:0.8,0.2 &
+    python api/brochure_api.py &
+    python models/benchmark_brochure_pipeline.py --url http://127.0.0.1:8006 --concurrency 1 4 8
+
+For each concurrency level, that many clients keep submitting brochures for
+the benchmark hotels through POST /generate-brochure and poll
+/task-status/{task_id} until they finish. Against the stand-in servers this
+measures the orchestration (queueing, routing, rendering) rather than the
+models, with no GPU needed. Set SD_CACHE_DIR= on the API so every brochure
+really generates its images, and BROCHURE_MAX_REQUESTS_PER_WINDOW high
+enough for the run.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmark_utils import BENCHMARK_HOTELS, percentile, print_table
+
+
+async def run_brochure(client, hotel_name, location, poll_interval):
+    """Submit one brochure and wait for it; returns (seconds, status)"""
+    start = time.perf_counter()
+    response = await client.post("/generate-brochure", json={"hotel_name": hotel_name, "location": location})
+    if response.status_code != 200:
+        return time.perf_counter() - start, f"http {response.status_code}"
+    task_id = response.json()["task_id"]
+    while True:
+        await asyncio.sleep(poll_interval)
+        status = (await client.get(f"/task-status/{task_id}")).json()["status"]
+        if status != "processing":
+            return time.perf_counter() - start, status
+
+
+async def run_level(url, concurrency, brochures, poll_interval):
+    hotels = [BENCHMARK_HOTELS[i % len(BENCHMARK_HOTELS)] for i in range(brochures)]
+    results = []
+
+    async with httpx.AsyncClient(base_url=url, timeout=60.0) as client:
+        async def worker():
+            while hotels:
+                hotel_name, location, _ = hotels.pop()
+                results.append(await run_brochure(client, hotel_name, location, poll_interval))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    seconds = [s for s, status in results if status == "completed"]
+    failed = len(results) - len(seconds)
+    return [
+        concurrency,
+        len(results),
+        failed,
+        f"{len(seconds) / elapsed:.2f}",
+        f"{percentile(seconds, 50):.2f}",
+        f"{percentile(seconds, 95):.2f}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure brochure API throughput under concurrent load')
+    parser.add_argument('--url', type=str, default="http://127.0.0.1:8006", help='Brochure API base URL')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4], help='Concurrent clients to try')
+    parser.add_argument('--brochures', type=int, default=10, help='Brochures per concurrency level')
+    parser.add_argument('--poll_interval', type=float, default=0.2, help='Seconds between status polls')
+    args = parser.parse_args()
+
+    rows = []
+    for concurrency in args.concurrency:
+        rows.append(asyncio.run(run_level(args.url, concurrency, args.brochures, args.poll_interval)))
+        print(f"concurrency {concurrency} done")
+
+    print()
+    print_table(["clients", "brochures", "failed", "brochures/s", "p50 s", "p95 s"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Title fitting with a font parse per 5px step versus the font cache and binary search.
+
+    python models/benchmark_fonts.py --font C:/Windows/Fonts/arial.ttf
+
+For short and long hotel names, compares the renderer's previous loop, which
+parsed the title font again for every size it tried, with fit_font_size:
+once on a cold cache (first brochure in a process) and once warm. Both must
+pick the same size. The last row times loading the generator's fonts.
+"""
+import argparse
+import os
+import time
+
+from PIL import ImageFont
+
+import fonts
+from benchmark_utils import print_table
+from fonts import fit_font_size, load_font
+from text_layout import font_metrics
+
+PAGE_WIDTH = 1780
+TITLE_SIZE = 140
+HOTEL_NAMES = [
+    "ITC Grand",
+    "Sunset Bay Resort",
+    "The Oberoi Udaivilas Lake Palace Resort",
+    "Royal Himalayan Heritage Retreat and Wellness Spa by the Valley",
+]
+# The sizes SinglePageBrochureGenerator.__init__ loads
+INIT_SIZES = [140, 90, 54, 72, 140, 48, 64, 36, 32, 24]
+
+
+def fit_by_steps(path, text, max_width, size=TITLE_SIZE):
+    """The renderer's previous title fitting: parse the font at every size down from 140.
+
+    Measures with the same advance widths as fit_font_size, so both pick the same size.
+    """
+    while True:
+        font = ImageFont.truetype(path, size)
+        if font_metrics(font).width(text) <= max_width:
+            return size
+        size -= 5
+
+
+def clear_caches():
+    fonts._fonts.clear()
+
+
+def timed(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    default_font = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "Montserrat-Bold.ttf")
+    parser = argparse.ArgumentParser(description='Compare title fitting with and without the font cache')
+    parser.add_argument('--font', type=str, default=default_font, help='TrueType font to fit titles in')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the fastest is reported')
+    args = parser.parse_args()
+    max_width = PAGE_WIDTH - 100
+
+    def cold(text):
+        clear_caches()
+        return fit_font_size(args.font, text, max_width, TITLE_SIZE)
+
+    rows = []
+    for name in HOTEL_NAMES:
+        text = name.upper()
+        steps_ms, steps_size = timed(lambda: fit_by_steps(args.font, text, max_width), args.repeat)
+        cold_ms, cold_size = timed(lambda: cold(text), args.repeat)
+        warm_ms, warm_size = timed(lambda: fit_font_size(args.font, text, max_width, TITLE_SIZE), args.repeat)
+        if not steps_size == cold_size == warm_size:
+            raise SystemExit(f"{name}: sizes differ ({steps_size}, {cold_size}, {warm_size})")
+        probes = (TITLE_SIZE - steps_size) // 5 + 1
+        rows.append([len(text), steps_size, probes, f"{steps_ms:.2f}", f"{cold_ms:.2f}", f"{warm_ms:.3f}"])
+
+    parse_ms, _ = timed(lambda: [ImageFont.truetype(args.font, size) for size in INIT_SIZES], args.repeat)
+    clear_caches()
+    load_font(args.font, TITLE_SIZE)
+    cached_ms, _ = timed(lambda: [load_font(args.font, size) for size in INIT_SIZES], args.repeat)
+    rows.append(["init", "-", len(INIT_SIZES), f"{parse_ms:.2f}", "-", f"{cached_ms:.3f}"])
+
+    print_table(["title chars", "size", "old parses", "old ms", "cold cache ms", "warm cache ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
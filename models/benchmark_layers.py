@@ -0,0 +1,80 @@
+"""Full-bleed brochure rendering with a cold and a warm layer cache.
+
+    python models/benchmark_layers.py --rounds 3
+
+Renders the benchmark hotels with their fallback descriptions and amenities
+over synthetic images, so only the layout is measured. Cold clears the layer
+cache before every brochure, so each one rebuilds its overlay, panels and
+text sprites; warm renders the same hotels again once the cache holds them.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+from PIL import Image
+
+# Import the brochure package from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.benchmark_utils import BENCHMARK_HOTELS, print_table
+from models.generate_single_page_brochure import SinglePageBrochureGenerator
+from models.layer_cache import get_layer_cache
+
+
+def synthetic_image(slot, shade):
+    """A vertical gradient of the slot's size, standing in for a generated image"""
+    ramp = Image.linear_gradient('L').resize((slot.width, slot.height))
+    return Image.merge('RGB', (ramp, ramp.point(lambda v: v * shade // 255), Image.new('L', ramp.size, shade)))
+
+
+def prepare(hotel_name, location):
+    """A generator ready to render: fallback text and synthetic images, nothing generated"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator = SinglePageBrochureGenerator(hotel_name, location)
+        generator.location_type = generator.determine_location_type()
+        generator.get_fallback_description("all")
+        generator.handle_amenities_generation("")
+    for shade, (name, slot) in zip((90, 150, 210), generator.image_slots().items()):
+        image = synthetic_image(slot, shade)
+        generator.assets.add_image(name, b"", image)
+    return generator
+
+
+def render(generators, clear):
+    """Seconds to render every generator's layout, clearing the layer cache before each if clear"""
+    cache = get_layer_cache()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for generator in generators:
+            if clear:
+                cache.clear()
+            generator.generate_full_bleed_layout(generator.width, generator.height)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure brochure rendering with a cold and a warm layer cache')
+    parser.add_argument('--rounds', type=int, default=3, help='Times every benchmark hotel is rendered per cache state')
+    args = parser.parse_args()
+
+    generators = [prepare(hotel_name, location) for hotel_name, location, _ in BENCHMARK_HOTELS] * args.rounds
+    cache = get_layer_cache()
+
+    # One untimed brochure loads the fonts for both runs
+    render(generators[:1], clear=True)
+
+    rows = []
+    for state, clear in (("cold", True), ("warm", False)):
+        seconds = render(generators, clear)
+        summary = cache.summary()
+        rows.append([state, len(generators), f"{len(generators) / seconds:.2f}",
+                     f"{seconds / len(generators) * 1000:.0f}", summary["entries"], summary["mb"]])
+
+    print_table(["cache", "brochures", "brochures/s", "ms/brochure", "layers", "cache MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
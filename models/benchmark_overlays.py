@@ -0,0 +1,103 @@
+"""Row-by-row versus NumPy-vectorized gradient overlays of the brochure renderer.
+
+    python models/benchmark_overlays.py --repeat 5
+
+The row-by-row versions are the renderer's previous implementations, kept
+here as the reference: every overlay is checked to be pixel-identical to
+it before it is timed.
+"""
+import argparse
+import time
+
+from PIL import Image, ImageDraw
+
+from benchmark_utils import print_table
+from overlays import enhanced_gradient, full_bleed_gradient, gradient_background, text_background
+
+PAGE_SIZE = (1780, 2480)
+TEXT_PANEL_SIZE = (1400, 420)
+PRIMARY = (0, 59, 92)
+SECONDARY = (212, 175, 55)
+
+
+def full_bleed_gradient_rows(width, height):
+    gradient = Image.new('RGBA', (width, height))
+    gradient_draw = ImageDraw.Draw(gradient)
+    for y in range(height):
+        alpha = int(80 + (y / height) * 120)
+        gradient_draw.line([(0, y), (width, y)], fill=(0, 0, 0, alpha))
+    return gradient
+
+
+def enhanced_gradient_rows(width, height):
+    gradient = Image.new('RGBA', (width, height))
+    gradient_draw = ImageDraw.Draw(gradient)
+    for y in range(height):
+        if y < height * 0.3:
+            alpha = int(60 + (y / (height * 0.3)) * 80)
+        elif y > height * 0.7:
+            alpha = int(140 + ((y - height * 0.7) / (height * 0.3)) * 115)
+        else:
+            alpha = 140
+        gradient_draw.line([(0, y), (width, y)], fill=(0, 0, 0, alpha))
+    return gradient
+
+
+def text_background_rows(width, height, opacity=180):
+    bg = Image.new('RGBA', (width, height), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(bg)
+    for y in range(height):
+        alpha = int(opacity * (1 - abs(y - height/2)/(height/2) * 0.2))
+        draw.line([(0, y), (width, y)], fill=(255, 255, 255, alpha))
+    draw.rectangle([0, 0, width-1, height-1], outline=(255, 255, 255, 100))
+    return bg
+
+
+def gradient_background_rows(width, height, primary, secondary):
+    background = Image.new('RGB', (width, height), primary)
+    overlay = Image.new('RGB', (width, height), secondary)
+    mask = Image.new('L', (width, height))
+    mask_data = []
+    for y in range(height):
+        mask_data.extend([int(255 * (1 - y/height))] * width)
+    mask.putdata(mask_data)
+    background.paste(overlay, (0, 0), mask)
+    return background
+
+
+CASES = [
+    ("full_bleed_gradient", full_bleed_gradient_rows, full_bleed_gradient, PAGE_SIZE),
+    ("enhanced_gradient", enhanced_gradient_rows, enhanced_gradient, PAGE_SIZE),
+    ("text_background", lambda w, h: text_background_rows(w, h, 150), lambda w, h: text_background(w, h, 150), TEXT_PANEL_SIZE),
+    ("gradient_background", lambda w, h: gradient_background_rows(w, h, PRIMARY, SECONDARY),
+     lambda w, h: gradient_background(w, h, PRIMARY, SECONDARY), PAGE_SIZE),
+]
+
+
+def best_ms(fn, size, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*size)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare row-by-row and vectorized overlay generation')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per implementation; the fastest is reported')
+    args = parser.parse_args()
+
+    rows = []
+    for name, rows_fn, vectorized_fn, size in CASES:
+        if rows_fn(*size).tobytes() != vectorized_fn(*size).tobytes():
+            raise SystemExit(f"{name}: vectorized output differs from the row-by-row reference")
+        rows_ms = best_ms(rows_fn, size, args.repeat)
+        vectorized_ms = best_ms(vectorized_fn, size, args.repeat)
+        rows.append([name, f"{size[0]}x{size[1]}", f"{rows_ms:.1f}", f"{vectorized_ms:.1f}", f"{rows_ms / vectorized_ms:.1f}x"])
+
+    print_table(["overlay", "size", "rows ms", "vectorized ms", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Brochure PDFs from the raster page versus the vector page: render time and file size.
+
+    python models/benchmark_pdf.py --rounds 3
+
+Renders the benchmark hotels with their fallback text over noisy synthetic
+photos at the sizes Stable Diffusion returns for each slot, and times the
+layout plus PDF encoding for each backend. The raster page is the previous
+output, the whole page as one bitmap; the vector page is shown with JPEG
+photos at BROCHURE_PDF_JPEG_QUALITY and with lossless photos.
+"""
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image
+
+# Import the brochure package from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.benchmark_layers import prepare
+from models.benchmark_utils import BENCHMARK_HOTELS, print_table
+from models.page_backends import BROCHURE_PDF_JPEG_QUALITY, RasterPage, VectorPage
+
+BACKENDS = [
+    ("raster", lambda width, height: RasterPage(width, height)),
+    (f"vector, JPEG {BROCHURE_PDF_JPEG_QUALITY}", lambda width, height: VectorPage(width, height)),
+    ("vector, lossless", lambda width, height: VectorPage(width, height, jpeg_quality=0)),
+]
+
+
+def photo_like(slot, seed):
+    """Noise over a gradient at the slot's SD size, about as hard to compress as a photo"""
+    width, height = slot.sd_size()
+    noise = Image.effect_noise((width, height), 40 + seed % 20)
+    ramp = Image.linear_gradient('L').resize((width, height))
+    return Image.merge('RGB', (noise, Image.blend(noise, ramp, 0.6), ramp))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare render time and size of raster and vector brochure PDFs')
+    parser.add_argument('--rounds', type=int, default=3, help='Times every benchmark hotel is rendered per backend')
+    args = parser.parse_args()
+
+    generators = [prepare(hotel_name, location) for hotel_name, location, _ in BENCHMARK_HOTELS]
+    for seed, generator in enumerate(generators):
+        for name, slot in generator.image_slots().items():
+            generator.assets.add_image(name, b"", photo_like(slot, seed))
+
+    rows = []
+    for label, new_page in BACKENDS:
+        # One untimed brochure warms the font and layer caches
+        generators[0].generate_full_bleed_layout(generators[0].width, generators[0].height, new_page(1780, 2480)).pdf()
+        seconds, sizes = [], []
+        for _ in range(args.rounds):
+            for generator in generators:
+                start = time.perf_counter()
+                page = generator.generate_full_bleed_layout(generator.width, generator.height, new_page(generator.width, generator.height))
+                pdf = page.pdf()
+                seconds.append(time.perf_counter() - start)
+                sizes.append(len(pdf))
+        rows.append([label, len(seconds), f"{sum(seconds) / len(seconds) * 1000:.0f}",
+                     f"{sum(sizes) / len(sizes) / 1024:.0f}"])
+
+    print_table(["backend", "brochures", "ms/brochure", "KB/brochure"], rows)
+
+
+if __name__ == "__main__":
+    main()
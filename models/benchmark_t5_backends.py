@@ -0,0 +1,126 @@
+"""Compare the eager, torch.compile and ONNX Runtime T5 backends on the brochure prompt set.
+
+Each backend runs in its own process so load time and peak RSS are measured cleanly:
+
+    python models/benchmark_t5_backends.py --model_path E:/MegaProject/Text/flan-t5-base
+
+Reports load time (including compilation or ONNX export on first use),
+single-prompt latency, batched throughput, peak RSS and how many seeded
+generations match the first backend exactly.
+"""
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmark_utils import brochure_prompts, percentile, print_table
+
+
+def run_worker(model_path, backend_name, onnx_dir, max_length, batch_size):
+    """Benchmark one backend in this process and print the results as JSON"""
+    from t5_generation import GenerationParams, generate_batch
+    from t5_model import load_backend, peak_rss_mb
+
+    prompts = brochure_prompts()
+
+    start = time.perf_counter()
+    backend, tokenizer, _ = load_backend(model_path, backend_name, onnx_dir=onnx_dir)
+    load_seconds = time.perf_counter() - start
+
+    # Warm-up, which is also when torch.compile does its work
+    start = time.perf_counter()
+    generate_batch(backend, tokenizer, [GenerationParams(prompts[0], max_length=16)])
+    warmup_seconds = time.perf_counter() - start
+
+    latencies = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        generate_batch(backend, tokenizer, [GenerationParams(prompt, max_length=max_length)])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, len(prompts), batch_size):
+        generate_batch(backend, tokenizer, [GenerationParams(p, max_length=max_length) for p in prompts[i:i + batch_size]])
+    throughput = len(prompts) / (time.perf_counter() - start)
+
+    # Same seeds on every backend: identical sampling semantics should give identical text
+    seeded_outputs = generate_batch(
+        backend, tokenizer, [GenerationParams(p, max_length=max_length, seed=i) for i, p in enumerate(prompts)]
+    )
+
+    print(json.dumps({
+        "backend": backend_name,
+        "load_seconds": load_seconds,
+        "warmup_seconds": warmup_seconds,
+        "p50_latency": percentile(latencies, 50),
+        "p95_latency": percentile(latencies, 95),
+        "throughput": throughput,
+        "peak_rss_mb": peak_rss_mb(),
+        "seeded_outputs": seeded_outputs,
+    }))
+
+
+def run_backend(args, backend):
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker",
+        "--model_path", args.model_path,
+        "--backends", backend,
+        "--max_length", str(args.max_length),
+        "--batch_size", str(args.batch_size),
+    ]
+    if args.onnx_dir:
+        command.extend(["--onnx_dir", args.onnx_dir])
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr)
+        raise RuntimeError(f"{backend} benchmark failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare T5 inference backends on CPU')
+    parser.add_argument('--model_path', type=str, default=os.getenv("T5_MODEL_PATH", "E:/MegaProject/Text/flan-t5-base"), help='Model directory')
+    parser.add_argument('--backends', type=str, nargs='+', default=["eager", "compiled", "onnx"], help='Backends to compare, reference first')
+    parser.add_argument('--onnx_dir', type=str, default=None, help='Exported ONNX graphs (default: <model_path>/onnx, exported if missing)')
+    parser.add_argument('--max_length', type=int, default=150, help='max_length used for every generation')
+    parser.add_argument('--batch_size', type=int, default=8, help='Batch size for the throughput run')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.model_path, args.backends[0], args.onnx_dir, args.max_length, args.batch_size)
+        return
+
+    results = []
+    for backend in args.backends:
+        print(f"Benchmarking {backend}...")
+        results.append(run_backend(args, backend))
+
+    reference = results[0]["seeded_outputs"]
+    rows = []
+    for result in results:
+        peak = result["peak_rss_mb"]
+        outputs = result["seeded_outputs"]
+        identical = sum(a == b for a, b in zip(outputs, reference))
+        similarity = sum(difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(outputs, reference)) / len(reference)
+        rows.append([
+            result["backend"],
+            f"{result['load_seconds']:.2f}",
+            f"{result['warmup_seconds']:.2f}",
+            f"{result['p50_latency']:.2f}",
+            f"{result['p95_latency']:.2f}",
+            f"{result['throughput']:.2f}",
+            f"{peak:.0f}" if peak is not None else "n/a",
+            f"{identical}/{len(reference)} ({similarity:.3f})",
+        ])
+
+    print()
+    print_table(["backend", "load s", "warm-up s", "p50 s", "p95 s", "prompts/s", "peak RSS MB",
+                 f"seeded match vs {args.backends[0]}"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Throughput vs. concurrency benchmark for the T5 /generate endpoint.
+
+Start the server with a rate limit high enough for the run, for example:
+
+    T5_MAX_REQUESTS_PER_WINDOW=100000 python models/t5_server.py
+
+then run this script. Repeat with T5_MAX_BATCH_SIZE=1 for the unbatched baseline.
+Every request is sent with "use_cache": false, so the prompts, which repeat,
+are decoded each time instead of being answered from the generation cache or
+joining an identical request in flight.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmark_utils import brochure_prompts, percentile, print_table
+
+
+def timed_request(session, url, prompt, max_length):
+    start = time.perf_counter()
+    response = session.post(url, json={"prompt": prompt, "max_length": max_length, "use_cache": False}, timeout=600)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def run_level(url, concurrency, total_requests, max_length):
+    prompts = brochure_prompts()
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(timed_request, session, url, prompts[i % len(prompts)], max_length)
+            for i in range(total_requests)
+        ]
+        latencies = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    return [
+        concurrency,
+        total_requests,
+        f"{elapsed:.2f}",
+        f"{total_requests / elapsed:.2f}",
+        f"{percentile(latencies, 50):.2f}",
+        f"{percentile(latencies, 95):.2f}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure T5 /generate throughput at increasing concurrency')
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8005/generate', help='T5 /generate endpoint')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='Concurrency levels to test')
+    parser.add_argument('--requests', type=int, default=32, help='Requests sent at each concurrency level')
+    parser.add_argument('--max_length', type=int, default=150, help='max_length sent with every request')
+    args = parser.parse_args()
+
+    # Warm up so the first level doesn't pay one-off costs
+    requests.post(args.url, json={"prompt": brochure_prompts()[0], "max_length": 20, "use_cache": False},
+                  timeout=600).raise_for_status()
+
+    rows = []
+    for concurrency in args.concurrency:
+        print(f"Running concurrency {concurrency}...")
+        rows.append(run_level(args.url, concurrency, args.requests, args.max_length))
+
+    print()
+    print_table(["concurrency", "requests", "seconds", "req/s", "p50 s", "p95 s"], rows)
+
+
+if __name__ == "__main__":
+    main()
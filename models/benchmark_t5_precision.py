@@ -0,0 +1,125 @@
+"""Compare fp32, int8 (dynamic quantization) and bf16 T5 inference on the brochure prompt set.
+
+Each precision runs in its own process so peak RSS is measured cleanly:
+
+    python models/benchmark_t5_precision.py --model_path E:/MegaProject/Text/flan-t5-base
+
+Reports load time, single-prompt latency with the server's sampling settings,
+batched throughput, peak RSS and how close greedy outputs stay to fp32.
+"""
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmark_utils import brochure_prompts, percentile, print_table
+
+
+def run_worker(model_path, precision, max_length, batch_size):
+    """Benchmark one precision in this process and print the results as JSON"""
+    import torch
+    from t5_backends import EagerBackend
+    from t5_generation import GenerationParams, generate_batch, postprocess_text
+    from t5_model import load_model, peak_rss_mb
+
+    prompts = brochure_prompts()
+
+    start = time.perf_counter()
+    model, tokenizer, effective_precision = load_model(model_path, precision)
+    load_seconds = time.perf_counter() - start
+    backend = EagerBackend(model)
+
+    # Warm-up
+    generate_batch(backend, tokenizer, [GenerationParams(prompts[0], max_length=16)])
+
+    latencies = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        generate_batch(backend, tokenizer, [GenerationParams(prompt, max_length=max_length)])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, len(prompts), batch_size):
+        generate_batch(backend, tokenizer, [GenerationParams(p, max_length=max_length) for p in prompts[i:i + batch_size]])
+    throughput = len(prompts) / (time.perf_counter() - start)
+
+    # Greedy decoding makes outputs comparable across precisions
+    greedy_outputs = []
+    for prompt in prompts:
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
+        with torch.no_grad():
+            output = model.generate(**inputs, max_length=max_length, do_sample=False, no_repeat_ngram_size=3)
+        greedy_outputs.append(postprocess_text(tokenizer.decode(output[0], skip_special_tokens=True)))
+
+    print(json.dumps({
+        "precision": effective_precision,
+        "load_seconds": load_seconds,
+        "p50_latency": percentile(latencies, 50),
+        "p95_latency": percentile(latencies, 95),
+        "throughput": throughput,
+        "peak_rss_mb": peak_rss_mb(),
+        "greedy_outputs": greedy_outputs,
+    }))
+
+
+def run_precision(args, precision):
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker",
+        "--model_path", args.model_path,
+        "--precisions", precision,
+        "--max_length", str(args.max_length),
+        "--batch_size", str(args.batch_size),
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr)
+        raise RuntimeError(f"{precision} benchmark failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def similarity(outputs, reference):
+    ratios = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(outputs, reference)]
+    return sum(ratios) / len(ratios)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare T5 inference precisions on CPU')
+    parser.add_argument('--model_path', type=str, default=os.getenv("T5_MODEL_PATH", "E:/MegaProject/Text/flan-t5-base"), help='Model directory')
+    parser.add_argument('--precisions', type=str, nargs='+', default=["fp32", "int8", "bf16"], help='Precisions to compare, fp32 first')
+    parser.add_argument('--max_length', type=int, default=150, help='max_length used for every generation')
+    parser.add_argument('--batch_size', type=int, default=8, help='Batch size for the throughput run')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.model_path, args.precisions[0], args.max_length, args.batch_size)
+        return
+
+    results = []
+    for precision in args.precisions:
+        print(f"Benchmarking {precision}...")
+        results.append(run_precision(args, precision))
+
+    reference = results[0]["greedy_outputs"]
+    rows = []
+    for requested, result in zip(args.precisions, results):
+        peak = result["peak_rss_mb"]
+        rows.append([
+            requested if requested == result["precision"] else f"{requested}->{result['precision']}",
+            f"{result['load_seconds']:.2f}",
+            f"{result['p50_latency']:.2f}",
+            f"{result['p95_latency']:.2f}",
+            f"{result['throughput']:.2f}",
+            f"{peak:.0f}" if peak is not None else "n/a",
+            f"{similarity(result['greedy_outputs'], reference):.3f}",
+        ])
+
+    print()
+    print_table(["precision", "load s", "p50 s", "p95 s", "prompts/s", "peak RSS MB", f"similarity vs {args.precisions[0]}"], rows)
+
+
+if __name__ == "__main__":
+    main()
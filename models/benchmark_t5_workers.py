@@ -0,0 +1,70 @@
+"""Throughput and memory of T5 serving from 1 to N worker processes sharing one copy of the weights.
+
+    python models/benchmark_t5_workers.py --model_path E:/MegaProject/Text/flan-t5-base --max_workers 4
+
+For each worker count the brochure prompts are sent in batches from as many
+threads as there are workers, the way the server's scheduler does. Memory is
+summed over the parent and all workers: RSS counts the shared weights once
+per process, USS (needs psutil) counts only what each process holds privately.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_utils import brochure_prompts, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare T5 throughput and memory across worker process counts')
+    parser.add_argument('--model_path', type=str, default=os.getenv("T5_MODEL_PATH", "E:/MegaProject/Text/flan-t5-base"), help='Model directory')
+    parser.add_argument('--max_workers', type=int, default=4, help='Largest number of worker processes to try')
+    parser.add_argument('--backend', type=str, default="eager", help='Backend each worker runs (eager or compiled)')
+    parser.add_argument('--precision', type=str, default="fp32", help='Precision of the shared model (fp32, int8 or bf16)')
+    parser.add_argument('--threads', type=int, default=None, help='torch threads per worker (default: its share of the cores)')
+    parser.add_argument('--max_length', type=int, default=150, help='max_length used for every generation')
+    parser.add_argument('--batch_size', type=int, default=4, help='Prompts per batch')
+    parser.add_argument('--repeat', type=int, default=2, help='How many times to run the prompt set per worker count')
+    args = parser.parse_args()
+
+    from t5_generation import GenerationParams
+    from t5_model import load_model
+    from t5_workers import WorkerPool, available_cores
+
+    prompts = brochure_prompts() * args.repeat
+    batches = [
+        [GenerationParams(p, max_length=args.max_length) for p in prompts[i:i + args.batch_size]]
+        for i in range(0, len(prompts), args.batch_size)
+    ]
+    quantize = args.precision == "int8"
+    model, tokenizer, _ = load_model(args.model_path, "fp32" if quantize else args.precision)
+    print(f"{len(available_cores())} cores available")
+
+    rows = []
+    for num_workers in range(1, args.max_workers + 1):
+        print(f"Benchmarking {num_workers} worker(s)...")
+        pool = WorkerPool(model, tokenizer, args.backend, num_workers=num_workers,
+                          num_threads=args.threads, quantize=quantize)
+        try:
+            pool.start()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                list(executor.map(pool.run_batch, batches))
+            elapsed = time.perf_counter() - start
+            rss, uss = pool.memory_mb()
+        finally:
+            pool.shutdown()
+
+        rows.append([
+            num_workers,
+            f"{len(prompts) / elapsed:.2f}",
+            f"{rss:.0f}" if rss is not None else "n/a",
+            f"{uss:.0f}" if uss is not None else "n/a",
+        ])
+
+    print()
+    print_table(["workers", "prompts/s", "total RSS MB", "total USS MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Shared prompt set and reporting helpers for the benchmark scripts"""
+import math
+
+# Hotels covering every location type SinglePageBrochureGenerator distinguishes
+BENCHMARK_HOTELS = [
+    ("Sunset Bay Resort", "Maldives", "beach"),
+    ("Snow Peak Lodge", "Manali", "himalayan"),
+    ("Alpine Crest Hotel", "Swiss Alps", "mountain"),
+    ("Metropolitan Grand", "Mumbai", "city"),
+    ("Royal Palm Retreat", "Udaipur", "resort"),
+]
+
+
+def brochure_prompts():
+    """The four description prompts generate_descriptions sends, for every benchmark hotel"""
+    prompts = []
+    for hotel_name, location, location_type in BENCHMARK_HOTELS:
+        prompts.extend([
+            f"Generate a brief description of {hotel_name} in {location}, highlighting its main features and surroundings",
+            f"Describe the luxury accommodations at {hotel_name} in {location}, focusing on room features and views",
+            f"Describe the dining experience at {hotel_name} in {location}. Focus on: 1) Local cuisine specialties from {location}, 2) Signature dishes, 3) Restaurant atmosphere and views. Make it specific to the location's culinary culture.",
+            f"List exactly 6 ultra-luxury amenities for {hotel_name} in {location}. Focus on unique features that match this {location_type} location. Each amenity should be specific to {location} and its culture. Format as simple list.",
+        ])
+    return prompts
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def print_table(headers, rows):
+    """Print rows as a fixed-width table"""
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(row, widths)))
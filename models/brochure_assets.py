@@ -0,0 +1,68 @@
+"""In-memory hand-off of generated images and text from the generation stages to the renderer"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from .image_cache import write_atomic
+    from .sd_client import open_image
+except ImportError:  # Imported from the models directory
+    from image_cache import write_atomic
+    from sd_client import open_image
+
+logger = logging.getLogger(__name__)
+
+# Disk writes run here so neither the event loop nor the renderer waits for them
+_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="asset-writer")
+
+
+def write_behind(fn, *args):
+    """Run a disk write on the background writer and return its Future"""
+    return _writer.submit(fn, *args)
+
+
+class AssetBundle:
+    """Everything one brochure is rendered from: decoded images, their PNG bytes and the generated text.
+
+    The generation stages add to it and the renderer reads from it, so
+    nothing has to round-trip through the filesystem in between. Saving the
+    images is optional and happens in the background (`persist`); call
+    `flush` before anything else needs to read the files.
+    """
+
+    def __init__(self, hotel_name, location):
+        self.hotel_name = hotel_name
+        self.location = location
+        self.images = {}  # name -> PIL image, decoded lazily from `data`
+        self.data = {}  # name -> PNG bytes as generated
+        self.paths = {}  # name -> file the image is (being) saved to
+        self.descriptions = {}
+        self.amenities = None
+        self._pending = []
+
+    def add_image(self, name, data, image=None):
+        self.data[name] = data
+        self.images[name] = image if image is not None else open_image(data)
+
+    def image(self, name):
+        """The decoded image for name, or None if it wasn't generated"""
+        return self.images.get(name)
+
+    def persist(self, output_dir, prefix):
+        """Start saving every image as `{output_dir}/{prefix}_{name}.png` in the background"""
+        os.makedirs(output_dir, exist_ok=True)
+        for name, data in self.data.items():
+            path = os.path.join(output_dir, f"{prefix}_{name}.png").replace('\\', '/')
+            self.paths[name] = path
+            self._pending.append(write_behind(write_atomic, path, data))
+        return dict(self.paths)
+
+    def flush(self):
+        """Block until background saves have finished; raises the first write error"""
+        pending, self._pending = self._pending, []
+        wait(pending)
+        for future in pending:
+            error = future.exception()
+            if error is not None:
+                logger.error(f"Could not save brochure asset: {str(error)}")
+                raise error
@@ -0,0 +1,77 @@
+"""Pre-generate the image bank that fast mode serves brochures from.
+
+    python models/build_image_bank.py --types beach city --styles luxury modern
+
+Generates the exterior, room and restaurant images for every location type
+and hotel style, sized for the full-bleed layout, with the same prompts a
+live request would use. Combinations already in the bank are skipped unless
+--force. Run it off-peak; requests sent with "fast": true then get the
+closest banked images without calling Stable Diffusion.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Import the brochure package from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.generate_single_page_brochure import full_bleed_image_slots
+from models.image_bank import BANK_LOCATIONS, BANK_STYLES, IMAGE_BANK_DIR, ImageBank, bank_subject
+from models.sd_client import SDClient
+from models.test_image_generation import generate_hotel_images, hotel_image_payloads
+
+
+async def build(bank, types, styles, force):
+    slots = full_bleed_image_slots()
+    names = list(slots)
+    combinations = [
+        (location_type, style) for location_type in types for style in styles
+        if force or not all(bank.has(name, location_type, style) for name in names)
+    ]
+    print(f"Generating {len(combinations)} of {len(types) * len(styles)} location type and style combinations")
+
+    async def generate(client, location_type, style):
+        hotel_name, location = bank_subject(location_type, style)
+        payloads = hotel_image_payloads(hotel_name, location, slots)
+        results = await generate_hotel_images(hotel_name, location, output_dir=None, client=client,
+                                              force_regenerate=force, slots=slots)
+        return location_type, style, payloads, results
+
+    start = time.perf_counter()
+    failed = 0
+    # The client spreads the combinations over every SD backend at once
+    async with SDClient() as client:
+        for done in asyncio.as_completed([generate(client, t, s) for t, s in combinations]):
+            location_type, style, payloads, results = await done
+            for name, result in results.items():
+                if not result.ok:
+                    failed += 1
+                    print(f"  {location_type}/{style} {name}: failed ({result.error})")
+                    continue
+                bank.add(name, location_type, style, payloads[name]["prompt"], result.data)
+            # Save after every combination so an interrupted run keeps what it generated
+            bank.save()
+            print(f"  {location_type}/{style} done")
+
+    print(f"Image bank has {len(bank.entries)} images in {bank.bank_dir} "
+          f"({time.perf_counter() - start:.1f}s, {failed} failed)")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-generate the image bank for fast brochures')
+    parser.add_argument('--bank_dir', type=str, default=IMAGE_BANK_DIR or "image_bank", help='Image bank directory')
+    parser.add_argument('--types', nargs='+', default=list(BANK_LOCATIONS), choices=list(BANK_LOCATIONS), help='Location types to generate')
+    parser.add_argument('--styles', nargs='+', default=list(BANK_STYLES), help='Hotel styles to generate')
+    parser.add_argument('--force', action='store_true', help='Regenerate combinations already in the bank')
+    args = parser.parse_args()
+
+    bank = ImageBank(args.bank_dir)
+    failed = asyncio.run(build(bank, args.types, args.styles, args.force))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Process-wide cache of loaded TrueType fonts, fitting text to a width, and finding font files"""
+import os
+import sys
+import threading
+from functools import lru_cache
+
+from PIL import ImageFont
+
+try:
+    from .text_layout import font_metrics
+except ImportError:  # Imported from the models directory
+    from text_layout import font_metrics
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+_fonts = {}  # (path, size) -> FreeTypeFont
+_fonts_lock = threading.Lock()
+
+
+def load_font(path, size):
+    """The font at path in size, parsed once per process.
+
+    FreeTypeFont objects are read-only once loaded, so every generator and
+    thread can share them. A font that fails to load is not cached and
+    raises again on the next call.
+    """
+    key = (path, size)
+    font = _fonts.get(key)
+    if font is None:
+        with _fonts_lock:
+            font = _fonts.get(key)
+            if font is None:
+                font = _fonts[key] = ImageFont.truetype(path, size)
+    return font
+
+
+def text_width(path, size, text):
+    """Width of text on one line in the cached font, measured as text_layout places it"""
+    return font_metrics(load_font(path, size)).width(text)
+
+
+def fit_font_size(path, text, max_width, max_size, min_size=5, step=5):
+    """Largest size out of max_size, max_size - step, ... whose text is no wider than max_width.
+
+    Widths are advance widths, the ones layout_text centres and wraps with,
+    so text fitted here is never placed wider than max_width.
+
+    Binary search over the sizes: text width grows with the font size, so a
+    long title needs a handful of measurements instead of one per step.
+    Returns min_size if even that is too wide.
+    """
+    sizes = list(range(max_size, min_size - 1, -step))
+    # Most titles fit at full size
+    if text_width(path, sizes[0], text) <= max_width:
+        return sizes[0]
+    # First (largest) size that fits; the smallest when none does
+    low, high = 1, len(sizes) - 1
+    while low < high:
+        middle = (low + high) // 2
+        if text_width(path, sizes[middle], text) <= max_width:
+            high = middle
+        else:
+            low = middle + 1
+    return sizes[high]
+
+
+def system_font_dirs():
+    """The directories ImageFont.truetype searches for a font given by bare file name"""
+    home = os.path.expanduser("~")
+    if sys.platform == "win32":
+        return [os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts")]
+    if sys.platform == "darwin":
+        return ["/Library/Fonts", "/System/Library/Fonts", os.path.join(home, "Library", "Fonts")]
+    data_dirs = [os.environ.get("XDG_DATA_HOME") or os.path.join(home, ".local", "share")]
+    data_dirs += (os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share").split(":")
+    return [os.path.join(data_dir, "fonts") for data_dir in data_dirs]
+
+
+@lru_cache(maxsize=64)
+def font_file(path):
+    """The file a font path given to load_font is read from, or None if it can't be found.
+
+    A path that isn't a file (e.g. "arial.ttf") is looked up by name in fonts/
+    and then in the system font directories, as ImageFont.truetype does.
+    """
+    if os.path.isfile(path):
+        return os.path.abspath(path)
+    name = os.path.basename(path)
+    for font_dir in [FONT_DIR] + system_font_dirs():
+        for root, _, files in os.walk(font_dir):
+            if name in files:
+                return os.path.join(root, name)
+    return None
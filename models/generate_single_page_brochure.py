@@ -1,21 +1,32 @@
-from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
 import os
 import random
-from .test_image_generation import test_image_generation
+from .brochure_assets import AssetBundle
+from .fonts import fit_font_size, load_font
+from .image_slots import ImageSlot
+from .layer_cache import page_overlay, text_panel
+from .overlays import enhanced_gradient, gradient_background
+from .page_backends import BROCHURE_PDF_BACKEND, new_page
+from .text_layout import font_metrics, layout_text
+from .test_image_generation import generate_hotel_images
 import math
 import requests
 import time
-from collections import deque
-import textwrap
-from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
-import io
+import asyncio
 
-# Rate limiting setup
-RATE_LIMIT_WINDOW = 3600  # 1 hour in seconds
-MAX_REQUESTS_PER_WINDOW = 100
-request_timestamps = deque()
+PAGE_WIDTH = 1780
+PAGE_HEIGHT = 2480
+
+def full_bleed_image_slots(width=PAGE_WIDTH, height=PAGE_HEIGHT):
+    """Where the full-bleed layout draws each generated image, {name: ImageSlot}"""
+    image_width = (width - 480) // 2  # Increased margin between images from 360 to 480
+    image_height = int(image_width * 0.6)  # Maintain aspect ratio
+    return {
+        'exterior': ImageSlot('exterior', width, height),  # Full-bleed background
+        'room': ImageSlot('room', image_width, image_height),
+        'restaurant': ImageSlot('restaurant', image_width, image_height)
+    }
 
 class SinglePageBrochureGenerator:
     def __init__(self, hotel_name, location, layout='full_bleed'):
@@ -28,11 +39,13 @@ class SinglePageBrochureGenerator:
         self.hotel_name = hotel_name.strip()
         self.location = location
         self.layout = 'full_bleed'  # Always use full_bleed layout
-        self.width = 1780
-        self.height = 2480
+        self.width = PAGE_WIDTH
+        self.height = PAGE_HEIGHT
         
-        # Initialize descriptions dictionary
-        self.descriptions = {}
+        # Images and text generated for this brochure, handed to the renderer in memory
+        self.assets = AssetBundle(self.hotel_name, self.location)
+        # Preview and final images share seeds so the final keeps the preview's composition
+        self.image_seeds = {name: random.randint(0, 2**32 - 1) for name in ('exterior', 'room', 'restaurant')}
         
         # Define fallback descriptions
         self.fallback_descriptions = {
@@ -65,16 +78,16 @@ class SinglePageBrochureGenerator:
         
         # Load fonts with adjusted sizes
         try:
-            self.font_title = ImageFont.truetype("fonts/Montserrat-Bold.ttf", 140)
-            self.font_heading = ImageFont.truetype("fonts/Montserrat-Bold.ttf", 90)
-            self.font_text = ImageFont.truetype("fonts/Montserrat-Regular.ttf", 54)
-            self.font_small = ImageFont.truetype("fonts/Montserrat-Regular.ttf", 72)  # Increased to 72px
+            self.font_title = load_font("fonts/Montserrat-Bold.ttf", 140)
+            self.font_heading = load_font("fonts/Montserrat-Bold.ttf", 90)
+            self.font_text = load_font("fonts/Montserrat-Regular.ttf", 54)
+            self.font_small = load_font("fonts/Montserrat-Regular.ttf", 72)  # Increased to 72px
         except Exception as e:
             print("Using system fonts as fallback...")
-            self.font_title = ImageFont.truetype("arial.ttf", 140)
-            self.font_heading = ImageFont.truetype("arial.ttf", 90)
-            self.font_text = ImageFont.truetype("arial.ttf", 54)
-            self.font_small = ImageFont.truetype("arial.ttf", 72)  # Increased to 72px
+            self.font_title = load_font("arial.ttf", 140)
+            self.font_heading = load_font("arial.ttf", 90)
+            self.font_text = load_font("arial.ttf", 54)
+            self.font_small = load_font("arial.ttf", 72)  # Increased to 72px
         
         # Define colors
         self.colors = {
@@ -95,12 +108,13 @@ class SinglePageBrochureGenerator:
         
         # Initialize fonts with dynamic sizing
         print("Using system fonts as fallback...")
-        self.font_title = ImageFont.truetype(self.system_fonts['title'], 140)  # Will be resized dynamically
-        self.font_subtitle = ImageFont.truetype(self.system_fonts['subtitle'], 48)
-        self.font_heading = ImageFont.truetype(self.system_fonts['heading'], 64)
-        self.font_text = ImageFont.truetype(self.system_fonts['text'], 36)
-        self.font_decorative = ImageFont.truetype(self.system_fonts['decorative'], 32)
-        self.font_small = ImageFont.truetype(self.system_fonts['small'], 24)
+        # Loaded once per process and shared between generators
+        self.font_title = load_font(self.system_fonts['title'], 140)  # Will be resized dynamically
+        self.font_subtitle = load_font(self.system_fonts['subtitle'], 48)
+        self.font_heading = load_font(self.system_fonts['heading'], 64)
+        self.font_text = load_font(self.system_fonts['text'], 36)
+        self.font_decorative = load_font(self.system_fonts['decorative'], 32)
+        self.font_small = load_font(self.system_fonts['small'], 24)
         
         # Create directories if they don't exist
         for directory in ['generated_images', 'generated_brochures']:
@@ -292,20 +306,29 @@ class SinglePageBrochureGenerator:
         }
 
         try:
-            for key, prompt in prompts.items():
+            # All four prompts go to the T5 server in one request and one batched forward pass
+            generated_texts = {}
+            try:
+                response = requests.post(
+                    "http://127.0.0.1:8005/generate-batch",
+                    json={"prompts": prompts, "max_length": 150}
+                )
+                if response.status_code == 200:
+                    generated_texts = response.json()["generated_texts"]
+                else:
+                    print(f"Error generating descriptions: {response.status_code}")
+            except Exception as e:
+                print(f"Error generating descriptions: {str(e)}")
+
+            for key in prompts:
                 try:
-                    response = requests.post(
-                        "http://127.0.0.1:8005/generate",
-                        json={"prompt": prompt, "max_length": 150}
-                    )
-                    if response.status_code == 200:
-                        generated_text = response.json()["generated_text"].strip()
+                    if key in generated_texts:
+                        generated_text = generated_texts[key].strip()
                         if key == "amenities":
                             self.handle_amenities_generation(generated_text)
                         else:
                             self.descriptions[key] = generated_text
                     else:
-                        print(f"Error generating {key} description: {response.status_code}")
                         if key == "amenities":
                             self.amenities = self.fallback_amenities[self.location_type]
                         else:
@@ -361,17 +384,7 @@ class SinglePageBrochureGenerator:
         }
         
     def create_gradient_background(self, width, height):
-        background = Image.new('RGB', (width, height), self.colors['primary'])
-        overlay = Image.new('RGB', (width, height), self.colors['secondary'])
-        mask = Image.new('L', (width, height))
-        mask_data = []
-        
-        for y in range(height):
-            mask_data.extend([int(255 * (1 - y/height))] * width)
-        mask.putdata(mask_data)
-        
-        background.paste(overlay, (0, 0), mask)
-        return background
+        return gradient_background(width, height, self.colors['primary'], self.colors['secondary'])
 
     def draw_decorative_corner(self, draw, x, y, size, color):
         line_width = 2
@@ -379,40 +392,11 @@ class SinglePageBrochureGenerator:
         draw.line([(x, y), (x, y + size)], fill=color, width=line_width)
 
     def add_text_to_image(self, draw, text, position, font, color=(20, 20, 20), max_width=40, add_bg=True, align='left'):
-        if not text:
+        if not text or not text.split():
             return position[1]  # Return current y position if no text
-            
-        # Split text into words and create lines
-        words = text.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            # Try adding the word to the current line
-            test_line = ' '.join(current_line + [word])
-            # Use getbbox instead of getsize for better accuracy
-            bbox = font.getbbox(test_line)
-            line_width = bbox[2] - bbox[0]  # Right - Left = Width
-            
-            # If adding the word exceeds max_width, start a new line
-            if line_width > max_width * 20:  # Multiply by 20 for better text wrapping
-                if current_line:  # Only add non-empty lines
-                    lines.append(' '.join(current_line))
-                current_line = [word]
-            else:
-                current_line.append(word)
         
-        # Add the last line
-        if current_line:
-            lines.append(' '.join(current_line))
-        
-        if not lines:  # If no lines were created
-            return position[1]
-            
-        # Calculate dimensions for background
-        line_spacing = font.size * 1.5
-        text_height = len(lines) * line_spacing
-        max_line_width = max([font.getbbox(line)[2] for line in lines])
+        # Wrap at max_width * 20 pixels for better text wrapping
+        block = layout_text(text, font, max_width=max_width * 20, line_height=font.size * 1.5, align=align)
         
         # Add semi-transparent background if requested
         if add_bg:
@@ -420,34 +404,23 @@ class SinglePageBrochureGenerator:
             bg_bbox = [
                 position[0] - padding,
                 position[1] - padding,
-                position[0] + max_line_width + padding,
-                position[1] + text_height + padding
+                position[0] + block.width + padding,
+                position[1] + block.height + padding
             ]
             draw.rectangle(bg_bbox, fill=(0, 0, 0, 128))
         
-        # Draw text lines
-        y = position[1]
-        for line in lines:
-            if align == 'center':
-                line_width = font.getbbox(line)[2]
-                x = position[0] + (max_line_width - line_width) // 2
-            else:
-                x = position[0]
-            draw.text((x, y), line, font=font, fill=color)
-            y += line_spacing
-        
-        return y  # Return the bottom position of the text
+        block.draw(draw, position, font, color)
+        return position[1] + block.height  # Return the bottom position of the text
 
     def add_amenities_section(self, draw, start_x, start_y, width):
         # Add amenities title with elegant styling and extra line spacing
         amenities_title = "LUXURY AMENITIES"
-        title_bbox = self.font_heading.getbbox(amenities_title)
-        title_width = title_bbox[2] - title_bbox[0]
-        title_x = start_x + (width - title_width) // 2  # Center align
+        title_block = layout_text(amenities_title, self.font_heading)
+        title_x = start_x + (width - title_block.width) // 2  # Center align
         self.add_text_to_image(draw, amenities_title, (title_x, start_y), self.font_heading, add_bg=False, color=self.colors['primary'])
         
         # Start position for amenities grid with extra line spacing
-        grid_y = start_y + title_bbox[3] - title_bbox[1] + 120  # Increased from 80 to 120 for more spacing
+        grid_y = start_y + title_block.height + 120  # Increased from 80 to 120 for more spacing
         
         # Calculate grid layout for amenities
         amenities_per_row = 2  # Two columns
@@ -465,8 +438,7 @@ class SinglePageBrochureGenerator:
             y = grid_y + row * row_height
             
             # Get text size for centering within column
-            amenity_bbox = self.font_text.getbbox(amenity)
-            amenity_width = amenity_bbox[2] - amenity_bbox[0]
+            amenity_width = font_metrics(self.font_text).width(amenity)
             
             # Center text within column
             x = start_x + col * col_width + (col_width - amenity_width) // 2
@@ -482,7 +454,7 @@ class SinglePageBrochureGenerator:
     def add_pricing_section(self, draw, start_x, start_y, width):
         # Add pricing title
         pricing_title = "ACCOMMODATIONS"
-        title_width = self.font_heading.getbbox(pricing_title)[2]
+        title_width = font_metrics(self.font_heading).width(pricing_title)
         title_x = (width - title_width) // 2
         self.add_text_to_image(draw, pricing_title, (title_x, start_y), self.font_heading, add_bg=False, color=self.colors['primary'])
         
@@ -492,7 +464,7 @@ class SinglePageBrochureGenerator:
         for room_type, price in self.pricing.items():
             # Add room type
             room_text = f"{room_type}"
-            room_width = self.font_text.getbbox(room_text)[2]
+            room_width = font_metrics(self.font_text).width(room_text)
             room_x = center_x - room_width - 20
             self.add_text_to_image(draw, room_text, (room_x, current_y), self.font_text, add_bg=False, color=self.colors['primary'])
             
@@ -506,36 +478,27 @@ class SinglePageBrochureGenerator:
 
     def add_social_media(self, draw, x, y, color):
         social_text = " | ".join([f"{platform}: {handle}" for platform, handle in self.social_media.items()])
-        social_width = self.font_small.getbbox(social_text)[2]
+        social_width = font_metrics(self.font_small).width(social_text)
         social_x = (x - social_width) // 2
         self.add_text_to_image(draw, social_text, (social_x, y), self.font_small, add_bg=False, color=color)
 
-    def create_text_background(self, draw, text, font, x, y, padding_x=40, padding_y=20, wrap_width=None, max_width=None):
-        """Create a dynamically sized background for text based on its content"""
-        if wrap_width:
-            text = textwrap.fill(text, width=wrap_width)
-        
-        # Calculate text dimensions for each line
-        lines = text.split('\n')
-        line_heights = [font.getbbox(line)[3] - font.getbbox(line)[1] for line in lines]
-        line_widths = [font.getbbox(line)[2] - font.getbbox(line)[0] for line in lines]
-        
-        # Total height is sum of line heights
-        text_height = sum(line_heights)
-        # Width is the maximum line width
-        text_width = max(line_widths)
+    def create_text_background(self, text, font, padding_x=40, padding_y=20, max_width=None, align='left'):
+        """Lay out text to fit max_width including padding, and size a background to it.
+
+        Returns ((bg_width, bg_height), block); draw the block at (padding_x, padding_y) within the background.
+        """
+        block = layout_text(text, font, max_width=max_width - 2 * padding_x if max_width else None, align=align)
         
         # Create background with padding
-        bg_width = min(text_width + (padding_x * 2), max_width) if max_width else text_width + (padding_x * 2)
-        bg_height = text_height + (padding_y * 2)
+        bg_width = block.width + (padding_x * 2)
+        if max_width:
+            bg_width = min(bg_width, max_width)
+        bg_height = block.height + (padding_y * 2)
         
-        # Create and paste background
-        background = Image.new('RGBA', (bg_width, bg_height), (255, 255, 255, 180))
-        
-        return background, text, (x, y, bg_width, bg_height)
+        return (bg_width, bg_height), block
 
-    def generate_brochure(self):
-        """Generate the brochure"""
+    def generate_brochure(self, suffix=""):
+        """Generate the brochure; `suffix` is appended to the file name (e.g. '_preview')"""
         width = self.width
         height = self.height
         
@@ -556,7 +519,7 @@ class SinglePageBrochureGenerator:
         elif self.layout == 'classic':
             brochure = self.generate_classic_layout(width, height)
         elif self.layout == 'full_bleed':
-            brochure = self.generate_full_bleed_layout(width, height)
+            brochure = self.render_page()
         else:
             print("Invalid layout. Please choose from 'default', 'modern', 'classic', or 'full_bleed'.")
             return None
@@ -566,24 +529,17 @@ class SinglePageBrochureGenerator:
             # Create a URL-safe filename by replacing spaces and special characters
             safe_hotel_name = self.hotel_name.replace(' ', '_').replace("'", '').replace('"', '').replace(',', '').replace('&', 'and')
             safe_hotel_name = ''.join(c for c in safe_hotel_name if c.isalnum() or c == '_')
-            brochure_path = f'generated_brochures/{safe_hotel_name}_{self.layout}_brochure.pdf'
-            
-            # Convert PIL Image to PDF
-            img_byte_arr = io.BytesIO()
-            brochure.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
+            brochure_path = f'generated_brochures/{safe_hotel_name}_{self.layout}_brochure{suffix}.pdf'
             
             # Try to save the PDF
             try:
-                c = canvas.Canvas(brochure_path, pagesize=(width, height))
-                c.drawImage(ImageReader(io.BytesIO(img_byte_arr)), 0, 0, width, height)
-                c.save()
+                brochure.save(brochure_path)
                 print(f"\nBrochure saved as: {brochure_path}")
             except Exception as e:
                 # If saving to PDF fails, try saving as PNG instead
-                fallback_path = f'generated_brochures/{safe_hotel_name}_{self.layout}_brochure.png'
-                brochure.save(fallback_path, 'PNG')
-                print(f"\nCould not save as PDF due to permissions. Saved as PNG instead: {fallback_path}")
+                fallback_path = f'generated_brochures/{safe_hotel_name}_{self.layout}_brochure{suffix}.png'
+                self.render_page('raster').image.save(fallback_path, 'PNG')
+                print(f"\nCould not save as PDF ({str(e)}). Saved as PNG instead: {fallback_path}")
             
             return brochure_path
             
@@ -591,26 +547,57 @@ class SinglePageBrochureGenerator:
             print(f"Error saving brochure: {str(e)}")
             return None
         
-    def generate_full_bleed_layout(self, width, height):
-        # Create a new image with a white background
-        image = Image.new('RGBA', (self.width, self.height), 'white')
-        draw = ImageDraw.Draw(image)
+    @property
+    def descriptions(self):
+        return self.assets.descriptions
+
+    @descriptions.setter
+    def descriptions(self, value):
+        self.assets.descriptions = value
+
+    @property
+    def amenities(self):
+        return self.assets.amenities
+
+    @amenities.setter
+    def amenities(self, value):
+        self.assets.amenities = value
+
+    def image_slots(self):
+        """Where the layout draws each generated image, {name: ImageSlot}"""
+        return full_bleed_image_slots(self.width, self.height)
+
+    def load_image(self, name, path):
+        """The image generate_images kept in memory, else the file at path, else None"""
+        image = self.assets.image(name)
+        if image is not None:
+            return image
+        if os.path.exists(path):
+            return Image.open(path)
+        return None
+
+    def render_page(self, backend=BROCHURE_PDF_BACKEND):
+        """The full-bleed layout drawn on a `backend` page; a vector page that fails falls back to raster"""
+        if backend == 'vector':
+            try:
+                return self.generate_full_bleed_layout(self.width, self.height, new_page('vector', self.width, self.height))
+            except Exception as e:
+                print(f"Vector PDF layout failed, falling back to raster: {str(e)}")
+        return self.generate_full_bleed_layout(self.width, self.height, new_page('raster', self.width, self.height))
+
+    def generate_full_bleed_layout(self, width, height, page=None):
+        """Draw the full-bleed layout on page (a new raster page by default) and return it"""
+        if page is None:
+            page = new_page('raster', self.width, self.height)
+        slots = self.image_slots()
         
         # Add the main image as background
-        if os.path.exists(self.exterior_image_path):
-            bg_image = Image.open(self.exterior_image_path)
-            bg_image = bg_image.resize((self.width, self.height), Image.Resampling.LANCZOS)
-            image.paste(bg_image, (0, 0))
+        bg_image = self.load_image('exterior', self.exterior_image_path)
+        if bg_image is not None:
+            page.photo(bg_image, slots['exterior'], (0, 0))
             
             # Add a darker gradient overlay for better text readability
-            gradient = Image.new('RGBA', (self.width, self.height))
-            gradient_draw = ImageDraw.Draw(gradient)
-            for y in range(self.height):
-                alpha = int(80 + (y / self.height) * 120)  # Increased opacity
-                gradient_draw.line([(0, y), (self.width, y)], 
-                                 fill=(0, 0, 0, alpha))
-            image = Image.alpha_composite(image.convert('RGBA'), gradient)
-            draw = ImageDraw.Draw(image)
+            page.overlay(page_overlay(self.width, self.height))
         
         # Add hotel name with adjusted spacing
         name_y = self.height // 8  # Moved up higher
@@ -632,28 +619,18 @@ class SinglePageBrochureGenerator:
             
         name_text = display_name.upper()
         
-        # Adjust font size for title to fit width
-        font_size = 140
-        while True:
-            self.font_title = ImageFont.truetype(self.system_fonts['title'], font_size)
-            name_bbox = self.font_title.getbbox(name_text)
-            if name_bbox[2] - name_bbox[0] <= self.width - 100:  # Leave 50px margin on each side
-                break
-            font_size -= 5
-        
-        name_bbox = self.font_title.getbbox(name_text)
-        name_width = name_bbox[2] - name_bbox[0]
-        name_height = name_bbox[3] - name_bbox[1]
+        # Largest title size (in 5px steps) whose advance width fits, found by binary search
+        font_size = fit_font_size(self.system_fonts['title'], name_text, self.width - 100, 140)  # Leave 50px margin on each side
+        self.font_title = load_font(self.system_fonts['title'], font_size)
+        
+        name_width, name_height = layout_text(name_text, self.font_title).size
         name_x = (self.width - name_width) // 2
         
         # Add semi-transparent background for title
         title_padding = 80
-        title_bg = Image.new('RGBA', (name_width + 2*title_padding, name_height + 2*title_padding), (255, 255, 255, 180))
-        image.paste(title_bg, (name_x - title_padding, name_y - title_padding), title_bg)
+        page.panel(name_width + 2*title_padding, name_height + 2*title_padding, (name_x - title_padding, name_y - title_padding))
         
-        draw.text((name_x, name_y), name_text, 
-                 font=self.font_title, 
-                 fill=(20, 20, 20))
+        page.text((name_x, name_y), name_text, self.font_title)
         
         # Add location with adjusted spacing
         location_text = self.location.upper()
@@ -664,18 +641,16 @@ class SinglePageBrochureGenerator:
         
         # Only proceed with location if we have text
         if location_text:
-            location_bbox = self.font_heading.getbbox(location_text)
-            location_width = location_bbox[2] - location_bbox[0]
+            location_width, location_height = layout_text(location_text, self.font_heading).size
             location_x = (self.width - location_width) // 2
             location_y = name_y + name_height + 60  # Reduced spacing between title and location
             
             # Create background for location
-            loc_bg = Image.new('RGBA', (location_width + 160, location_bbox[3] + 40), (255, 255, 255, 180))
-            image.paste(loc_bg, (location_x - 80, location_y - 10), loc_bg)
-            draw.text((location_x, location_y), location_text, font=self.font_heading, fill=(20, 20, 20))
+            page.panel(location_width + 160, location_height + 20, (location_x - 80, location_y - 10))
+            page.text((location_x, location_y), location_text, self.font_heading)
             
             # Adjust description position based on location
-            desc_y = location_y + location_bbox[3] + 60  # Reduced spacing between location and description
+            desc_y = location_y + location_height + 60  # Reduced spacing between location and description
         else:
             # If no location, put description closer to title
             desc_y = name_y + name_height + 90
@@ -685,15 +660,12 @@ class SinglePageBrochureGenerator:
         max_desc_width = int(self.width * 0.6)
         
         # Create enhanced background for description
-        desc_bg, wrapped_desc, (_, _, bg_width, bg_height) = self.create_text_background(
-            draw,
+        desc_padding_x, desc_padding_y = 60, 45
+        (bg_width, bg_height), desc_block = self.create_text_background(
             desc_text,
             self.font_text,
-            0,
-            desc_y,
-            padding_x=60,
-            padding_y=45,
-            wrap_width=40,
+            padding_x=desc_padding_x,
+            padding_y=desc_padding_y,
             max_width=max_desc_width
         )
         
@@ -705,45 +677,39 @@ class SinglePageBrochureGenerator:
             bg_height,
             opacity=150
         )
-        image.paste(enhanced_desc_bg, (desc_x, desc_y - 20), enhanced_desc_bg)
-        
-        # Calculate text position and add with glow
-        text_bbox = self.font_text.getbbox(wrapped_desc.split('\n')[0])
-        text_y = desc_y + (bg_height - (text_bbox[3] - text_bbox[1])) // 2 - 20
-        
-        self.add_text_with_glow(
-            draw,
-            wrapped_desc,
-            (desc_x + 60, text_y),
-            self.font_text,
-            (20, 20, 20)
-        )
+        page.layer(enhanced_desc_bg, (desc_x, desc_y - 20))
+        
+        # Add the text with glow inside the background's padding
+        text_x = desc_x + desc_padding_x
+        text_y = desc_y - 20 + desc_padding_y
+        for line in desc_block.lines:
+            page.glow_text(
+                (text_x + line.x, text_y + line.y),
+                line.text,
+                self.font_text,
+                (20, 20, 20)
+            )
 
         # Add room and restaurant images with proper spacing
-        image_width = (self.width - 480) // 2  # Increased margin between images from 360 to 480
-        image_height = int(image_width * 0.6)  # Maintain aspect ratio
+        image_width, image_height = slots['room'].size
         
         # Room section
         room_x = 180
         room_y = desc_y + bg_height + 120
         
-        if os.path.exists(self.room_image_path):
-            room_image = Image.open(self.room_image_path)
-            room_image = room_image.resize((image_width, image_height), Image.Resampling.LANCZOS)
-            image.paste(room_image, (room_x, room_y))
+        room_image = self.load_image('room', self.room_image_path)
+        if room_image is not None:
+            page.photo(room_image, slots['room'], (room_x, room_y))
             
             # Add room description with dynamic background
             room_desc = self.descriptions.get('room', 'Luxurious rooms with stunning ocean views.')
-            room_desc_bg, wrapped_room_desc, (_, _, room_bg_width, room_bg_height) = self.create_text_background(
-                draw,
+            (room_bg_width, room_bg_height), room_desc_block = self.create_text_background(
                 room_desc,
                 self.font_small,
-                0,
-                0,
                 padding_x=60,  # Increased padding for larger font
                 padding_y=40,  # Increased padding for larger font
-                wrap_width=20,  # Adjusted wrap width for larger font
-                max_width=image_width
+                max_width=image_width,
+                align='center'
             )
             
             # Center the background under the image
@@ -751,15 +717,10 @@ class SinglePageBrochureGenerator:
             room_desc_x = room_x + (image_width - room_bg_width) // 2
             
             # Paste background
-            image.paste(room_desc_bg, (room_desc_x, room_desc_y), room_desc_bg)
+            page.panel(room_bg_width, room_bg_height, (room_desc_x, room_desc_y))
             
             # Draw text centered within background
-            text_x = room_desc_x + 40
-            text_y = room_desc_y + 25
-            draw.multiline_text((text_x, text_y), wrapped_room_desc,
-                              font=self.font_small,
-                              fill=(20, 20, 20),
-                              align='center')
+            page.block(room_desc_block, (room_desc_x + 60, room_desc_y + 40), self.font_small)
             
             room_desc_height = room_bg_height
         
@@ -767,26 +728,22 @@ class SinglePageBrochureGenerator:
         rest_x = self.width - image_width - 180
         rest_y = room_y
         
-        if os.path.exists(self.restaurant_image_path):
-            rest_image = Image.open(self.restaurant_image_path)
-            rest_image = rest_image.resize((image_width, image_height), Image.Resampling.LANCZOS)
-            image.paste(rest_image, (rest_x, rest_y))
+        rest_image = self.load_image('restaurant', self.restaurant_image_path)
+        if rest_image is not None:
+            page.photo(rest_image, slots['restaurant'], (rest_x, rest_y))
             
             # Add restaurant description with dynamic background
             rest_desc = self.descriptions.get('dining')
             if not rest_desc or rest_desc.lower() == self.hotel_name.lower():
                 rest_desc = "Experience world-class dining with local specialties and international cuisine in our signature restaurant."
             
-            rest_desc_bg, wrapped_rest_desc, (_, _, rest_bg_width, rest_bg_height) = self.create_text_background(
-                draw,
+            (rest_bg_width, rest_bg_height), rest_desc_block = self.create_text_background(
                 rest_desc,
                 self.font_small,
-                0,
-                0,
                 padding_x=60,  # Increased padding for larger font
                 padding_y=40,  # Increased padding for larger font
-                wrap_width=20,  # Adjusted wrap width for larger font
-                max_width=image_width
+                max_width=image_width,
+                align='center'
             )
             
             # Center the background under the image
@@ -794,15 +751,10 @@ class SinglePageBrochureGenerator:
             rest_desc_x = rest_x + (image_width - rest_bg_width) // 2
             
             # Paste background
-            image.paste(rest_desc_bg, (rest_desc_x, rest_desc_y), rest_desc_bg)
+            page.panel(rest_bg_width, rest_bg_height, (rest_desc_x, rest_desc_y))
             
             # Draw text centered within background
-            text_x = rest_desc_x + 40
-            text_y = rest_desc_y + 25
-            draw.multiline_text((text_x, text_y), wrapped_rest_desc,
-                              font=self.font_small,
-                              fill=(20, 20, 20),
-                              align='center')
+            page.block(rest_desc_block, (rest_desc_x + 60, rest_desc_y + 40), self.font_small)
             
             rest_desc_height = rest_bg_height
         
@@ -817,17 +769,15 @@ class SinglePageBrochureGenerator:
         # Draw amenities title
         amenities_title = "LUXURY AMENITIES"
         title_font = self.font_heading
-        title_bbox = title_font.getbbox(amenities_title)
-        title_width = title_bbox[2] - title_bbox[0]
+        title_width, title_height = layout_text(amenities_title, title_font).size
         title_x = (self.width - title_width) // 2
         
         # Create background for amenities title
-        title_bg = Image.new('RGBA', (title_width + 160, title_bbox[3] + 40), (255, 255, 255, 180))
-        image.paste(title_bg, (title_x - 80, amenities_y - 10), title_bg)
-        draw.text((title_x, amenities_y), amenities_title, font=title_font, fill=(20, 20, 20))
+        page.panel(title_width + 160, title_height + 20, (title_x - 80, amenities_y - 10))
+        page.text((title_x, amenities_y), amenities_title, title_font)
         
         # Adjust amenities layout
-        amenities_start_y = amenities_y + title_bbox[3] + 30
+        amenities_start_y = amenities_y + title_height + 30
         
         # Use the amenities generated by T5 instead of hardcoded list
         if not hasattr(self, 'amenities') or not self.amenities:
@@ -844,113 +794,108 @@ class SinglePageBrochureGenerator:
         amenity_height = 60
         amenity_width = (amenities_width - 60) // 2
         amenity_padding = 20
-        
-        # Create and place amenity boxes in two columns
-        for i, amenity in enumerate(self.amenities):
-            is_right = i % 2
-            row = i // 2
-            
-            # Calculate position
-            x = amenities_x + (amenity_width + 60) * is_right
-            y = amenities_start_y + (amenity_height + 20) * row
-            
-            # Create background
-            amenity_bg = Image.new('RGBA', (amenity_width, amenity_height), (255, 255, 255, 180))
-            image.paste(amenity_bg, (x, y), amenity_bg)
+        checkbox_size = 24
+        text_offset = amenity_padding + checkbox_size + 15
+        
+        # Create and place amenity boxes in two columns; a row grows if an amenity wraps
+        y = amenities_start_y
+        for row_start in range(0, len(self.amenities), 2):
+            row_amenities = self.amenities[row_start:row_start + 2]
+            blocks = [
+                layout_text(amenity, self.font_text, max_width=amenity_width - text_offset - amenity_padding)
+                for amenity in row_amenities
+            ]
+            row_height = max(amenity_height, max(block.height for block in blocks) + 20)
             
-            # Draw checkbox
-            checkbox_size = 24
-            checkbox_x = x + amenity_padding
-            checkbox_y = y + (amenity_height - checkbox_size) // 2
-            checkbox = Image.new('RGBA', (checkbox_size, checkbox_size), (255, 255, 255, 0))
-            checkbox_draw = ImageDraw.Draw(checkbox)
-            checkbox_draw.rectangle([0, 0, checkbox_size-1, checkbox_size-1], outline=(20, 20, 20), width=2)
-            image.paste(checkbox, (checkbox_x, checkbox_y), checkbox)
+            for is_right, block in enumerate(blocks):
+                # Calculate position
+                x = amenities_x + (amenity_width + 60) * is_right
+                
+                # Create background
+                page.panel(amenity_width, row_height, (x, y))
+                
+                # Draw checkbox
+                checkbox_x = x + amenity_padding
+                checkbox_y = y + (row_height - checkbox_size) // 2
+                page.checkbox(checkbox_size, (checkbox_x, checkbox_y))
+                
+                # Draw text
+                text_y = y + (row_height - block.height) // 2
+                page.block(block, (x + text_offset, text_y), self.font_text)
             
-            # Draw text
-            text_x = checkbox_x + checkbox_size + 15
-            text_y = y + (amenity_height - title_bbox[3]) // 2
-            draw.text((text_x, text_y), amenity, font=self.font_text, fill=(20, 20, 20))
+            y += row_height + 20
         
         # Add contact information at the bottom
         contact_y = self.height - 100
         contact_text = f"RESERVATIONS: +1 (800) 123-4567  •  {self.contact_email}"
-        contact_bbox = self.font_decorative.getbbox(contact_text)
-        contact_width = contact_bbox[2] - contact_bbox[0]
+        contact_width, contact_height = layout_text(contact_text, self.font_decorative).size
         contact_x = (self.width - contact_width) // 2
         
         # Add contact background
         contact_padding = 20
-        contact_bg = Image.new('RGBA', (contact_width + 2*contact_padding, contact_bbox[3] - contact_bbox[1] + 2*contact_padding), (255, 255, 255, 180))
-        image.paste(contact_bg, (contact_x - contact_padding, contact_y - contact_padding), contact_bg)
-        
-        draw.text((contact_x, contact_y), contact_text,
-                 font=self.font_decorative, fill=(20, 20, 20))
+        page.panel(contact_width + 2*contact_padding, contact_height + 2*contact_padding, (contact_x - contact_padding, contact_y - contact_padding))
         
-        # Save the brochure
-        os.makedirs('generated_brochures', exist_ok=True)
-        brochure_path = f'generated_brochures/{self.hotel_name}_{self.layout}_brochure.pdf'
+        page.text((contact_x, contact_y), contact_text, self.font_decorative)
         
-        # Convert PIL Image to PDF
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_byte_arr = img_byte_arr.getvalue()
-        
-        # Create PDF
-        c = canvas.Canvas(brochure_path, pagesize=(self.width, self.height))
-        c.drawImage(ImageReader(io.BytesIO(img_byte_arr)), 0, 0, self.width, self.height)
-        c.save()
-        
-        print(f"\nBrochure saved as: {brochure_path}")
-        return image
+        return page
         
     def calculate_amenities_height(self, amenities):
         """Calculate total height needed for amenities section"""
         amenities_per_row = 2
         row_height = 100
         num_rows = (len(amenities) + amenities_per_row - 1) // amenities_per_row
-        title_height = self.font_heading.getbbox("TEST")[3]  # Get approximate title height
+        title_height = font_metrics(self.font_heading).line_height
         return title_height + (num_rows * row_height) + 60  # Add padding
 
-    def generate_images(self):
+    def generate_images(self, force_regenerate=False, persist=True, phase=None, on_progress=None, fast=False):
         """Generate images using Stable Diffusion"""
+        asyncio.run(self.generate_images_async(force_regenerate, persist, phase, on_progress, fast))
+
+    async def generate_images_async(self, force_regenerate=False, persist=True, phase=None, on_progress=None,
+                                    fast=False):
+        """Generate the exterior, room and restaurant images concurrently into the asset bundle.
+
+        Cached images are reused unless force_regenerate. With persist, the
+        images are also saved to generated_images in the background; call
+        `self.assets.flush()` before serving the files. `phase` ('preview' or
+        'final') selects the quick preview or the final images of two-phase
+        generation; the final images replace the preview's in the bundle.
+        `on_progress(name, progress, eta)` is called as SD samples each image.
+        With `fast`, the closest pre-generated images for this location type
+        are used where the image bank has them, without calling SD.
+        """
         try:
             print("\nStarting image generation...")
             print(f"Hotel name: {self.hotel_name}")
             print(f"Location: {self.location}")
             
-            # Generate images
-            success = test_image_generation(
+            # Generate images; one failure doesn't stop the other requests
+            results = await generate_hotel_images(
                 hotel_name=self.hotel_name,
-                location=self.location
+                location=self.location,
+                output_dir=None,
+                force_regenerate=force_regenerate,
+                slots=self.image_slots(),
+                phase=phase,
+                seeds=self.image_seeds if phase is not None else None,
+                on_progress=on_progress,
+                fast=fast,
+                location_type=self.determine_location_type()
             )
             
-            if not success:
-                raise Exception("Image generation failed")
+            failed_images = [name for name, result in results.items() if not result.ok]
+            if failed_images:
+                raise Exception(f"Failed to generate images: {', '.join(failed_images)}")
             
-            # Verify all required images exist
-            required_images = [self.exterior_image_path, self.room_image_path, self.restaurant_image_path]
-            print("\nVerifying generated images:")
-            print(f"Looking for images in {os.path.abspath('generated_images')}")
-            print(f"Directory contents:")
-            for f in os.listdir('generated_images'):
-                print(f"  {f}")
+            # The PNG headers were checked on arrival; hand the in-memory images to the renderer
+            print("\nGenerated images:")
+            for name, result in results.items():
+                source = "from cache" if result.cached else f"in {result.seconds:.1f}s"
+                print(f"  {name}: {result.image.width}x{result.image.height}, {len(result.data)} bytes, {source}")
+                self.assets.add_image(name, result.data, result.image)
             
-            for img_path in required_images:
-                print(f"\nChecking {img_path}:")
-                if not os.path.exists(img_path):
-                    print(f"  File not found")
-                    raise Exception(f"Image not found: {img_path}")
-                try:
-                    # Try to open the image to verify it's valid
-                    print(f"  File exists, verifying...")
-                    with Image.open(img_path) as img:
-                        img.verify()
-                    print(f"  File is valid")
-                    print(f"  File size: {os.path.getsize(img_path)} bytes")
-                except Exception as e:
-                    print(f"  File verification failed: {str(e)}")
-                    raise Exception(f"Invalid image file {img_path}: {str(e)}")
+            if persist:
+                self.assets.persist('generated_images', self.hotel_name.replace(' ', '_'))
             
             print("Image generation and verification completed successfully")
                 
@@ -975,20 +920,7 @@ class SinglePageBrochureGenerator:
 
     def create_enhanced_gradient(self, width, height):
         """Create an enhanced gradient overlay"""
-        gradient = Image.new('RGBA', (width, height))
-        gradient_draw = ImageDraw.Draw(gradient)
-        
-        for y in range(height):
-            # Create a more dynamic gradient with multiple color stops
-            if y < height * 0.3:  # Top 30%
-                alpha = int(60 + (y / (height * 0.3)) * 80)
-            elif y > height * 0.7:  # Bottom 30%
-                alpha = int(140 + ((y - height * 0.7) / (height * 0.3)) * 115)
-            else:  # Middle section
-                alpha = 140
-            gradient_draw.line([(0, y), (width, y)], fill=(0, 0, 0, alpha))
-        
-        return gradient
+        return enhanced_gradient(width, height)
 
     def add_vignette(self, image):
         """Add a subtle vignette effect to the image"""
@@ -1004,34 +936,9 @@ class SinglePageBrochureGenerator:
         
         return Image.alpha_composite(image.convert('RGBA'), vignette)
 
-    def add_text_with_glow(self, draw, text, position, font, color):
-        """Add text with a subtle glow effect"""
-        x, y = position
-        # Create glow effect
-        for offset in range(3, 0, -1):
-            alpha = int(50 / offset)
-            draw.text((x-offset, y-offset), text, font=font, fill=(*color, alpha))
-            draw.text((x+offset, y-offset), text, font=font, fill=(*color, alpha))
-            draw.text((x-offset, y+offset), text, font=font, fill=(*color, alpha))
-            draw.text((x+offset, y+offset), text, font=font, fill=(*color, alpha))
-        # Draw main text
-        draw.text(position, text, font=font, fill=color)
-
     def create_enhanced_text_background(self, width, height, opacity=180):
         """Create an enhanced background for text with subtle gradient and border"""
-        bg = Image.new('RGBA', (width, height), (255, 255, 255, 0))
-        draw = ImageDraw.Draw(bg)
-        
-        # Add subtle gradient
-        for y in range(height):
-            alpha = int(opacity * (1 - abs(y - height/2)/(height/2) * 0.2))
-            draw.line([(0, y), (width, y)], fill=(255, 255, 255, alpha))
-        
-        # Add border
-        border_color = (255, 255, 255, 100)
-        draw.rectangle([0, 0, width-1, height-1], outline=border_color)
-        
-        return bg
+        return text_panel(width, height, opacity)
 
 def main():
     # Parse command line arguments
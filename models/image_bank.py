@@ -0,0 +1,176 @@
+"""Images generated ahead of time per location type and style, served by prompt similarity in fast mode"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+try:
+    from .image_cache import write_atomic
+except ImportError:  # Imported from the models directory
+    from image_cache import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Image bank configuration
+IMAGE_BANK_DIR = os.getenv("IMAGE_BANK_DIR", "image_bank")  # Empty disables fast mode
+IMAGE_BANK_MIN_SIMILARITY = float(os.getenv("IMAGE_BANK_MIN_SIMILARITY", "0.3"))  # Closer than this or fast mode calls SD
+INDEX_FILE = "index.json"
+
+# What build_image_bank.py generates: a stand-in location for each location type, in each hotel style
+BANK_LOCATIONS = {
+    "beach": "Goa",
+    "himalayan": "Manali",
+    "mountain": "the Alps",
+    "city": "Mumbai",
+    "resort": "a private island"
+}
+BANK_STYLES = ("luxury", "boutique", "modern", "heritage")
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def bank_subject(location_type, style):
+    """(hotel_name, location) the bank's prompts for one location type and style are written for"""
+    return f"a {style} hotel", BANK_LOCATIONS[location_type]
+
+
+def prompt_terms(text):
+    """Words and adjacent word pairs of a prompt"""
+    words = WORD_PATTERN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class ImageBank:
+    """Banked images found by the TF-IDF similarity of the prompts they were generated from.
+
+    All prompts come from the same templates, so inverse document frequency
+    weighs the words that tell entries apart (hotel style, location) over the
+    shared boilerplate. A lookup only considers entries for the same image
+    and location type, and returns None when none of them is close enough.
+    """
+
+    def __init__(self, bank_dir=IMAGE_BANK_DIR, min_similarity=IMAGE_BANK_MIN_SIMILARITY):
+        self.bank_dir = bank_dir
+        self.min_similarity = min_similarity
+        self.entries = []  # {name, location_type, style, location, prompt, file}
+        self.stats = {"hits": 0, "misses": 0}
+        self._idf = {}
+        self._vectors = []
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.bank_dir, INDEX_FILE)) as f:
+                self.entries = json.load(f)["entries"]
+        except FileNotFoundError:
+            self.entries = []
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read image bank index in {self.bank_dir}: {str(e)}")
+            self.entries = []
+        self._reindex()
+        logger.info(f"Image bank: {len(self.entries)} images in {self.bank_dir}")
+
+    def _reindex(self):
+        document_frequency = Counter()
+        for entry in self.entries:
+            document_frequency.update(set(prompt_terms(entry["prompt"])))
+        documents = len(self.entries)
+        self._idf = {term: math.log((1 + documents) / (1 + count)) + 1 for term, count in document_frequency.items()}
+        self._vectors = [self.embed(entry["prompt"]) for entry in self.entries]
+
+    def embed(self, text):
+        """L2-normalised TF-IDF vector of a prompt, as {term: weight}"""
+        # Terms no banked prompt uses match nothing, but still count against the similarity
+        unseen = math.log(1 + len(self.entries)) + 1
+        vector = {term: count * self._idf.get(term, unseen) for term, count in Counter(prompt_terms(text)).items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def match(self, name, prompt, location_type=None):
+        """(entry, similarity) of the banked image closest to prompt, or None if none is close enough.
+
+        Only images banked for the hotel's location type are considered; with
+        none of that type the slot misses, rather than getting e.g. a beach
+        exterior for a mountain hotel.
+        """
+        same_type = [
+            i for i, entry in enumerate(self.entries)
+            if entry["name"] == name and entry["location_type"] == location_type
+        ]
+        query = self.embed(prompt)
+        best, best_similarity = None, 0.0
+        for i in same_type:
+            vector = self._vectors[i]
+            similarity = sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+            if similarity > best_similarity:
+                best, best_similarity = i, similarity
+
+        found = best is not None and best_similarity >= self.min_similarity
+        with self._lock:
+            self.stats["hits" if found else "misses"] += 1
+        return (self.entries[best], best_similarity) if found else None
+
+    def path(self, entry):
+        return os.path.join(self.bank_dir, entry["file"])
+
+    def read(self, entry):
+        """PNG bytes of a banked image, or None if its file is gone"""
+        try:
+            with open(self.path(entry), "rb") as f:
+                return f.read()
+        except OSError as e:
+            logger.warning(f"Could not read banked image {entry['file']}: {str(e)}")
+            return None
+
+    def has(self, name, location_type, style):
+        return any(
+            (entry["name"], entry["location_type"], entry["style"]) == (name, location_type, style)
+            for entry in self.entries
+        )
+
+    def add(self, name, location_type, style, prompt, data):
+        """Store one image, replacing any for the same name, location type and style; `save` publishes it"""
+        os.makedirs(self.bank_dir, exist_ok=True)
+        entry = {
+            "name": name,
+            "location_type": location_type,
+            "style": style,
+            "location": BANK_LOCATIONS.get(location_type),
+            "prompt": prompt,
+            "file": f"{location_type}_{style}_{name}.png"
+        }
+        write_atomic(self.path(entry), data)
+        self.entries = [
+            existing for existing in self.entries
+            if (existing["name"], existing["location_type"], existing["style"]) != (name, location_type, style)
+        ] + [entry]
+
+    def save(self):
+        """Write the index and rebuild the similarity vectors"""
+        data = json.dumps({"entries": self.entries}, indent=2).encode("utf-8")
+        write_atomic(os.path.join(self.bank_dir, INDEX_FILE), data)
+        self._reindex()
+
+    def summary(self):
+        """Counters and size, for health endpoints"""
+        with self._lock:
+            return dict(self.stats, entries=len(self.entries))
+
+
+_bank = None
+_bank_lock = threading.Lock()
+
+
+def get_image_bank():
+    """The process-wide image bank, or None when IMAGE_BANK_DIR is empty"""
+    global _bank
+    if not IMAGE_BANK_DIR:
+        return None
+    with _bank_lock:
+        if _bank is None:
+            _bank = ImageBank()
+        return _bank
@@ -0,0 +1,181 @@
+"""Content-addressed, size-capped disk cache for Stable Diffusion images"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Image cache configuration
+SD_CACHE_DIR = os.getenv("SD_CACHE_DIR", "image_cache")  # Empty disables the cache
+SD_CACHE_MAX_MB = float(os.getenv("SD_CACHE_MAX_MB", "512"))
+
+# The txt2img settings that determine the image; anything else in the payload doesn't
+KEY_FIELDS = ("prompt", "negative_prompt", "sampler_name", "steps", "width", "height", "cfg_scale", "seed")
+# Second-pass settings, part of the key only for payloads that enable it
+HIRES_FIELDS = ("enable_hr", "hr_resize_x", "hr_resize_y", "hr_upscaler", "hr_second_pass_steps", "denoising_strength")
+
+
+def image_cache_key(payload, upscale=None):
+    """Hash of the prompt, negative prompt, sampler, steps, size, cfg scale and seed.
+
+    `upscale` ((upscaler, factor)) keys an image that was upscaled after generation.
+    """
+    fields = {field: payload.get(field) for field in KEY_FIELDS}
+    if payload.get("enable_hr"):
+        fields.update((field, payload.get(field)) for field in HIRES_FIELDS)
+    fields["prompt"] = " ".join((fields["prompt"] or "").split())
+    fields["negative_prompt"] = " ".join((fields["negative_prompt"] or "").split())
+    if upscale is not None:
+        fields["upscale"] = list(upscale)
+    data = json.dumps(fields, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def write_atomic(path, data):
+    """Write bytes to a temporary file next to `path` and rename it into place"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ImageCache:
+    """PNG files named by their key, evicted least recently used first once over `max_bytes`.
+
+    Entries are written to a temporary file and renamed into place, so a
+    reader never sees half an image. Recency survives restarts through the
+    files' modification times, which `get` refreshes.
+    """
+
+    def __init__(self, cache_dir=SD_CACHE_DIR, max_bytes=int(SD_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "writes": 0, "evictions": 0}
+        self._entries = OrderedDict()  # key -> file size, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".png"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._bytes += size
+        # The budget may have shrunk since the files were written
+        self._evict()
+        logger.info(f"Image cache: {len(self._entries)} images ({self._bytes / (1024 * 1024):.1f} MB) in {self.cache_dir}")
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    @property
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else None
+
+    def summary(self):
+        """Counters plus hit rate and current size, for health endpoints"""
+        with self._lock:
+            return dict(self.stats, hit_rate=self.hit_rate, entries=len(self._entries),
+                        bytes=self._bytes, max_bytes=self.max_bytes)
+
+    def get(self, key):
+        """Path of the cached image for key, or None"""
+        with self._lock:
+            if key not in self._entries:
+                self.stats["misses"] += 1
+                return None
+            path = self.path(key)
+            try:
+                os.utime(path)
+            except OSError:
+                self._forget(key)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return path
+
+    def bypass(self):
+        """Count a lookup skipped on purpose (force_regenerate)"""
+        with self._lock:
+            self.stats["bypassed"] += 1
+
+    def read(self, key):
+        """PNG bytes of the cached image for key, or None"""
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                self._forget(key)
+            return None
+
+    def put(self, key, data):
+        """Store PNG bytes under key and return its path, or None if they couldn't be written"""
+        path = self.path(key)
+        try:
+            write_atomic(path, data)
+        except OSError as e:
+            logger.warning(f"Could not write image cache entry {key}: {str(e)}")
+            return None
+        size = len(data)
+
+        with self._lock:
+            self._forget(key, delete=False)
+            self._entries[key] = size
+            self._bytes += size
+            self.stats["writes"] += 1
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            self._forget(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _forget(self, key, delete=True):
+        size = self._entries.pop(key, None)
+        if size is None:
+            return
+        self._bytes -= size
+        if delete:
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """The process-wide image cache, or None when SD_CACHE_DIR is empty"""
+    global _cache
+    if not SD_CACHE_DIR:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageCache()
+        return _cache
@@ -0,0 +1,68 @@
+"""Image slots a brochure layout draws into, and the Stable Diffusion sizes that fill them"""
+import math
+import os
+
+from PIL import Image, ImageOps
+
+# Image sizing configuration
+SD_PIXEL_BUDGET = int(os.getenv("SD_PIXEL_BUDGET", str(768 * 512)))  # Most pixels SD is asked to render per image
+SD_UPSCALER = os.getenv("SD_UPSCALER", "")  # SD extras upscaler (e.g. "R-ESRGAN 4x+"); empty leaves resizing to the renderer
+SD_SIZE_MULTIPLE = 8  # SD latents are 1/8 of the image size
+SD_MIN_SIDE = 256
+MIN_UPSCALE = 1.25  # Below this the renderer's resize is good enough
+MAX_UPSCALE = 4.0
+
+
+def round_to_multiple(value, multiple=SD_SIZE_MULTIPLE):
+    return max(multiple, int(round(value / multiple)) * multiple)
+
+
+class ImageSlot:
+    """A width x height box in the rendered page that one generated image fills.
+
+    `sd_size` keeps the slot's aspect ratio but never asks SD for more pixels
+    than the slot shows or than `max_pixels`, so no diffusion work goes into
+    pixels that are cropped or downscaled away.
+    """
+
+    def __init__(self, name, width, height, max_pixels=SD_PIXEL_BUDGET):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.max_pixels = max_pixels
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def aspect(self):
+        return self.width / self.height
+
+    def sd_size(self):
+        """(width, height) to request from SD, in multiples of 8"""
+        pixels = min(self.width * self.height, self.max_pixels)
+        width = math.sqrt(pixels * self.aspect)
+        height = width / self.aspect
+        # Very thin slots would fall below what SD can render sensibly
+        scale = max(1.0, SD_MIN_SIDE / min(width, height))
+        return round_to_multiple(width * scale), round_to_multiple(height * scale)
+
+    def upscale_factor(self):
+        """How much an image of sd_size() has to grow to cover the slot"""
+        sd_width, sd_height = self.sd_size()
+        return max(self.width / sd_width, self.height / sd_height)
+
+    def upscale(self):
+        """Factor for the separate upscaling stage, or None when SD_UPSCALER is off or it isn't worth it"""
+        if not SD_UPSCALER:
+            return None
+        factor = self.upscale_factor()
+        if factor < MIN_UPSCALE:
+            return None
+        return min(MAX_UPSCALE, math.ceil(factor * 4) / 4)
+
+
+def fit_to_slot(image, slot):
+    """Center-crop `image` to the slot's aspect ratio and resize it to fill the slot"""
+    return ImageOps.fit(image, slot.size, Image.Resampling.LANCZOS)
@@ -0,0 +1,142 @@
+"""Pre-rendered brochure layers (overlays, panels, checkboxes and text masks), kept in a bounded process-wide cache"""
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw
+
+try:
+    from .overlays import full_bleed_gradient, text_background
+except ImportError:  # Imported from the models directory
+    from overlays import full_bleed_gradient, text_background
+
+# Layer cache configuration
+LAYER_CACHE_MAX_MB = float(os.getenv("LAYER_CACHE_MAX_MB", "256"))  # Pixel memory kept for layers; 0 disables
+
+
+class LayerCache:
+    """Layers keyed by element type, size and style, least recently used evicted first.
+
+    Layers are shared between brochures and threads, so callers only paste
+    or composite them and never draw on them.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._layers = OrderedDict()  # key -> image
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """The layer cached under key, built with build() on a miss"""
+        with self._lock:
+            layer = self._layers.get(key)
+            if layer is not None:
+                self._layers.move_to_end(key)
+                self.hits += 1
+                return layer
+            self.misses += 1
+        # Built outside the lock; two threads may build the same layer once each
+        layer = build()
+        size = layer_bytes(layer)
+        if size > self.max_bytes:
+            return layer
+        with self._lock:
+            if key not in self._layers:
+                self._layers[key] = layer
+                self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._layers.popitem(last=False)
+                self.bytes -= layer_bytes(evicted)
+        return layer
+
+    def clear(self):
+        with self._lock:
+            self._layers.clear()
+            self.bytes = 0
+
+    def summary(self):
+        with self._lock:
+            return {
+                "entries": len(self._layers),
+                "mb": round(self.bytes / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def layer_bytes(layer):
+    return layer.width * layer.height * len(layer.getbands())
+
+
+_cache = LayerCache(int(LAYER_CACHE_MAX_MB * 1024 * 1024))
+
+
+def get_layer_cache():
+    """The process-wide layer cache"""
+    return _cache
+
+
+def page_overlay(width, height):
+    """full_bleed_gradient for a page of this size"""
+    return _cache.get(("page_overlay", width, height), lambda: full_bleed_gradient(width, height))
+
+
+def panel(width, height, fill=(255, 255, 255, 180)):
+    """Flat translucent panel"""
+    return _cache.get(("panel", width, height, fill), lambda: Image.new('RGBA', (width, height), fill))
+
+
+def text_panel(width, height, opacity=180):
+    """text_background of this size and opacity"""
+    return _cache.get(("text_panel", width, height, opacity), lambda: text_background(width, height, opacity))
+
+
+def checkbox(size, outline=(20, 20, 20), line_width=2):
+    """Empty square checkbox on a transparent tile"""
+    def build():
+        box = Image.new('RGBA', (size, size), (255, 255, 255, 0))
+        ImageDraw.Draw(box).rectangle([0, 0, size - 1, size - 1], outline=outline, width=line_width)
+        return box
+    return _cache.get(("checkbox", size, outline, line_width), build)
+
+
+def text_sprite(text, font):
+    """(mask, (dx, dy)): the coverage of text in font, as an 'L' tile.
+
+    draw.bitmap((x + dx, y + dy), mask, fill=fill) gives the same pixels as
+    draw.text((x, y), text, font=font, fill=fill); it is how draw.text inks
+    the glyphs once they are rasterised.
+    """
+    def build():
+        left, top, right, bottom = font.getbbox(text)
+        dx, dy = min(left, 0), min(top, 0)
+        mask = Image.new('L', (max(right - dx, 1), max(bottom - dy, 1)), 0)
+        ImageDraw.Draw(mask).text((-dx, -dy), text, font=font, fill=255)
+        mask.info['offset'] = (dx, dy)
+        return mask
+    mask = _cache.get(("text", font.path, font.size, text), build)
+    return mask, mask.info['offset']
+
+
+def paste_layer(image, layer, position):
+    """Paste a cached layer onto image through its own alpha"""
+    image.paste(layer, position, layer)
+
+
+def draw_text(draw, position, text, font, fill=(20, 20, 20)):
+    """draw.text for one line, inked from its cached sprite"""
+    if not text:
+        return
+    mask, (dx, dy) = text_sprite(text, font)
+    draw.bitmap((position[0] + dx, position[1] + dy), mask, fill=fill)
+
+
+def draw_block(draw, block, position, font, fill=(20, 20, 20)):
+    """TextBlock.draw from cached line sprites"""
+    x, y = position
+    for line in block.lines:
+        draw_text(draw, (x + line.x, y + line.y), line.text, font, fill)
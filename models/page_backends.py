@@ -0,0 +1,228 @@
+"""Pages the brochure layout draws on: one PIL bitmap (raster) or native reportlab PDF content (vector)"""
+import io
+import os
+import threading
+
+from PIL import Image, ImageDraw
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
+
+try:
+    from .fonts import font_file
+    from .image_slots import fit_to_slot
+    from .layer_cache import checkbox, draw_text, panel, paste_layer, text_sprite
+except ImportError:  # Imported from the models directory
+    from fonts import font_file
+    from image_slots import fit_to_slot
+    from layer_cache import checkbox, draw_text, panel, paste_layer, text_sprite
+
+# PDF output configuration
+BROCHURE_PDF_BACKEND = os.getenv("BROCHURE_PDF_BACKEND", "vector")  # "vector" or "raster" (the whole page as one bitmap)
+BROCHURE_PDF_JPEG_QUALITY = int(os.getenv("BROCHURE_PDF_JPEG_QUALITY", "90"))  # Photos in vector PDFs; 0 embeds them losslessly
+
+PANEL_FILL = (255, 255, 255, 180)
+TEXT_COLOR = (20, 20, 20)
+GLOW_SPREAD = 3  # Offsets of the glow passes, 1 to this many pixels
+
+
+class Page:
+    """A width x height page, in pixels (PDF points); positions are top-left corners, y down"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def block(self, block, position, font, fill=TEXT_COLOR):
+        """Draw a text_layout.TextBlock"""
+        x, y = position
+        for line in block.lines:
+            self.text((x + line.x, y + line.y), line.text, font, fill)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.pdf())
+
+
+class RasterPage(Page):
+    """Draws into one RGBA image, placed in the PDF as a single bitmap"""
+
+    def __init__(self, width, height):
+        super().__init__(width, height)
+        self.image = Image.new('RGBA', (width, height), 'white')
+        self.draw = ImageDraw.Draw(self.image)
+
+    def photo(self, image, slot, position):
+        """Fill the slot at position with image, center-cropped"""
+        self.image.paste(fit_to_slot(image, slot), position)
+
+    def overlay(self, layer):
+        """Composite a page-sized vertical alpha ramp over everything drawn so far"""
+        self.image = Image.alpha_composite(self.image, layer)
+        self.draw = ImageDraw.Draw(self.image)
+
+    def layer(self, layer, position):
+        """Paste an RGBA tile through its alpha"""
+        paste_layer(self.image, layer, position)
+
+    def panel(self, width, height, position, fill=PANEL_FILL):
+        paste_layer(self.image, panel(width, height, fill), position)
+
+    def checkbox(self, size, position):
+        paste_layer(self.image, checkbox(size, TEXT_COLOR), position)
+
+    def text(self, position, text, font, fill=TEXT_COLOR):
+        draw_text(self.draw, position, text, font, fill)
+
+    def glow_text(self, position, text, font, color):
+        """Text over faint copies of itself offset diagonally"""
+        x, y = position
+        for offset in range(GLOW_SPREAD, 0, -1):
+            alpha = int(50 / offset)
+            for dx, dy in ((-offset, -offset), (offset, -offset), (-offset, offset), (offset, offset)):
+                draw_text(self.draw, (x + dx, y + dy), text, font, (*color, alpha))
+        draw_text(self.draw, position, text, font, color)
+
+    def pdf(self):
+        image_bytes = io.BytesIO()
+        self.image.save(image_bytes, format='PNG')
+        image_bytes.seek(0)
+        output = io.BytesIO()
+        c = canvas.Canvas(output, pagesize=(self.width, self.height))
+        c.drawImage(ImageReader(image_bytes), 0, 0, self.width, self.height)
+        c.save()
+        return output.getvalue()
+
+
+_pdf_fonts = {}  # font file -> name registered with reportlab, None if it can't be embedded
+_pdf_fonts_lock = threading.Lock()
+
+
+def pdf_font(font):
+    """The reportlab font name embedding font's TrueType file, or None if there is none"""
+    path = font_file(font.path) if isinstance(font.path, str) else None  # Fonts loaded from memory have no file
+    if path is None:
+        return None
+    with _pdf_fonts_lock:
+        if path not in _pdf_fonts:
+            name = f"Brochure{len(_pdf_fonts)}-{os.path.splitext(os.path.basename(path))[0]}"
+            try:
+                pdfmetrics.registerFont(TTFont(name, path))
+            except Exception as e:
+                print(f"Could not embed {path} in PDFs, its text will be rasterized: {str(e)}")
+                name = None
+            _pdf_fonts[path] = name
+        return _pdf_fonts[path]
+
+
+def crop_to_aspect(image, aspect):
+    """Center crop of image with the given width / height ratio, at the image's own resolution"""
+    width, height = image.size
+    if width / height > aspect:
+        crop = round(height * aspect)
+        left = (width - crop) // 2
+        return image.crop((left, 0, left + crop, height))
+    crop = round(width / aspect)
+    top = (height - crop) // 2
+    return image.crop((0, top, width, top + crop))
+
+
+class VectorPage(Page):
+    """Draws with reportlab: photos as image XObjects at their native resolution, text as PDF text
+    in its embedded TrueType font, and panels and checkboxes as paths.
+
+    Effects PDF paths can't express, the alpha ramps, the glow and text in a
+    font that can't be embedded, are placed as small raster tiles instead.
+    """
+
+    def __init__(self, width, height, jpeg_quality=BROCHURE_PDF_JPEG_QUALITY):
+        super().__init__(width, height)
+        self.jpeg_quality = jpeg_quality
+        self.output = io.BytesIO()
+        self.canvas = canvas.Canvas(self.output, pagesize=(width, height))
+
+    def _image(self, image, position, size, mask=None):
+        x, y = position
+        width, height = size
+        self.canvas.drawImage(image, x, self.height - y - height, width, height, mask=mask)
+
+    def _fill(self, color):
+        alpha = color[3] / 255 if len(color) > 3 else 1
+        self.canvas.setFillColorRGB(color[0] / 255, color[1] / 255, color[2] / 255, alpha=alpha)
+
+    def photo(self, image, slot, position):
+        image = crop_to_aspect(image, slot.aspect)
+        if self.jpeg_quality:
+            data = io.BytesIO()
+            image.convert('RGB').save(data, format='JPEG', quality=self.jpeg_quality)
+            data.seek(0)
+            image = data
+        self._image(ImageReader(image), position, slot.size)
+
+    def overlay(self, layer):
+        # Overlays are vertical ramps (see overlays.py), so one column stretched across the page is the same picture
+        column = layer.crop((0, 0, 1, layer.height))
+        self._image(ImageReader(column), (0, 0), (self.width, self.height), mask='auto')
+
+    def layer(self, layer, position):
+        self._image(ImageReader(layer), position, layer.size, mask='auto')
+
+    def panel(self, width, height, position, fill=PANEL_FILL):
+        x, y = position
+        self._fill(fill)
+        self.canvas.rect(x, self.height - y - height, width, height, stroke=0, fill=1)
+
+    def checkbox(self, size, position, line_width=2):
+        # Stroked inside the box, like ImageDraw.rectangle's outline
+        x, y = position
+        inset = line_width / 2
+        self.canvas.setStrokeColorRGB(*(c / 255 for c in TEXT_COLOR))
+        self.canvas.setLineWidth(line_width)
+        self.canvas.rect(x + inset, self.height - y - size + inset, size - line_width, size - line_width, stroke=1, fill=0)
+
+    def text(self, position, text, font, fill=TEXT_COLOR):
+        if not text:
+            return
+        name = pdf_font(font)
+        if name is None:
+            self._text_tile(position, text, font, fill)
+            return
+        x, y = position
+        ascent, _ = font.getmetrics()
+        self._fill(fill)
+        self.canvas.setFont(name, font.size)
+        self.canvas.drawString(x, self.height - y - ascent, text)
+
+    def _text_tile(self, position, text, font, fill):
+        mask, (dx, dy) = text_sprite(text, font)
+        tile = Image.new('RGBA', mask.size, fill)
+        tile.putalpha(mask if len(fill) < 4 else mask.point(lambda v: v * fill[3] // 255))
+        self._image(ImageReader(tile), (position[0] + dx, position[1] + dy), tile.size, mask='auto')
+
+    def glow_text(self, position, text, font, color):
+        """The glow as a raster tile under the text, so the text itself is selectable once"""
+        mask, (dx, dy) = text_sprite(text, font)
+        # On an RGBA page Pillow inks the colour by glyph coverage alone, so RasterPage's faint
+        # passes come out at full strength; the halo's coverage is the union of the offset glyphs
+        coverage = Image.new('L', (mask.width + 2 * GLOW_SPREAD, mask.height + 2 * GLOW_SPREAD), 0)
+        draw = ImageDraw.Draw(coverage)
+        for offset in range(GLOW_SPREAD, 0, -1):
+            for ox, oy in ((-offset, -offset), (offset, -offset), (-offset, offset), (offset, offset)):
+                draw.bitmap((GLOW_SPREAD + ox, GLOW_SPREAD + oy), mask, fill=255)
+        halo = Image.new('RGBA', coverage.size, color)
+        halo.putalpha(coverage)
+        x, y = position
+        self._image(ImageReader(halo), (x + dx - GLOW_SPREAD, y + dy - GLOW_SPREAD), halo.size, mask='auto')
+        self.text(position, text, font, color)
+
+    def pdf(self):
+        self.canvas.showPage()
+        self.canvas.save()
+        return self.output.getvalue()
+
+
+def new_page(backend, width, height):
+    if backend == 'vector':
+        return VectorPage(width, height)
+    return RasterPage(width, height)
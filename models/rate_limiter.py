@@ -0,0 +1,133 @@
+"""Per-client token-bucket rate limiting shared by every process on the host.
+
+Buckets live in a small SQLite file, so several uvicorn workers (or the T5
+server and the brochure API side by side) enforce one limit per client
+instead of one per process. Each check reads and writes a single row.
+"""
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.getenv("RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), "megaproject_rate_limits.sqlite3"))
+BUSY_TIMEOUT = float(os.getenv("RATE_LIMIT_BUSY_TIMEOUT", "0.5"))  # Seconds to wait for another process's write lock
+PRUNE_EVERY = 1000  # Checks between sweeps of idle buckets
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a client has no tokens left; retry_after is in whole seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limit exceeded. Please try again in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class RateLimiterUnavailable(Exception):
+    """Raised when the bucket database stays locked by other processes past BUSY_TIMEOUT"""
+
+    def __init__(self, retry_after=1):
+        super().__init__(f"Rate limiter busy. Please try again in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token bucket per client: `max_requests` burst, refilled evenly over `window` seconds.
+
+    `scope` names the limit, so different services can share one database
+    file without sharing buckets. Pass db_path=":memory:" for a limiter
+    private to this process.
+
+    acquire blocks on SQLite for up to BUSY_TIMEOUT; call it from async code
+    through asyncio.to_thread so the event loop keeps running meanwhile.
+    """
+
+    def __init__(self, scope, max_requests, window, db_path=None):
+        if max_requests < 1:
+            raise ValueError("max_requests must be at least 1")
+        self.scope = scope
+        self.capacity = float(max_requests)
+        self.window = window
+        self.refill_rate = max_requests / window  # Tokens per second
+        self.db_path = db_path or DEFAULT_DB_PATH
+        self._lock = threading.Lock()
+        self._checks = 0
+
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        if self.db_path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "scope TEXT NOT NULL, client TEXT NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL, "
+            "PRIMARY KEY (scope, client))"
+        )
+
+    def acquire(self, client="global", cost=1):
+        """Take `cost` tokens from the client's bucket, or raise RateLimitExceeded.
+
+        Raises RateLimiterUnavailable if the database stays locked.
+        """
+        try:
+            tokens, allowed = self._take(client, cost)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Rate limit database unavailable: {str(e)}")
+            raise RateLimiterUnavailable() from e
+
+        if not allowed:
+            raise RateLimitExceeded(max(1, math.ceil((cost - tokens) / self.refill_rate)))
+
+    def _take(self, client, cost):
+        """(tokens left, whether cost was taken) after refilling and charging the client's bucket"""
+        with self._lock:
+            # Wall-clock time, since the buckets are shared with other processes
+            now = time.time()
+            # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT tokens, updated FROM buckets WHERE scope = ? AND client = ?",
+                    (self.scope, client)
+                ).fetchone()
+                if row is None:
+                    tokens = self.capacity
+                else:
+                    tokens = min(self.capacity, row[0] + max(0.0, now - row[1]) * self.refill_rate)
+
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (scope, client, tokens, updated) VALUES (?, ?, ?, ?)",
+                    (self.scope, client, tokens, now)
+                )
+
+                self._checks += 1
+                if self._checks % PRUNE_EVERY == 0:
+                    # Buckets idle for a whole window are full again, the same as having no row
+                    self._db.execute(
+                        "DELETE FROM buckets WHERE scope = ? AND updated < ?",
+                        (self.scope, now - self.window)
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return tokens, allowed
+
+    def reset(self, client=None):
+        """Refill one client's bucket, or every bucket in this scope"""
+        with self._lock:
+            if client is None:
+                self._db.execute("DELETE FROM buckets WHERE scope = ?", (self.scope,))
+            else:
+                self._db.execute("DELETE FROM buckets WHERE scope = ? AND client = ?", (self.scope, client))
+
+
+def client_id(request):
+    """Identify the caller of a FastAPI/Starlette request by its address"""
+    return request.client.host if request.client is not None else "unknown"
@@ -0,0 +1,350 @@
+"""Async client for the Stable Diffusion (AUTOMATIC1111) txt2img API.
+
+One pooled httpx connection pool serves every call, and a semaphore per
+backend caps how many txt2img requests it gets at once, so a brochure's
+three images can be requested together without overloading the GPUs.
+With several backends (SD_URLS), each request goes to the one the backend
+pool expects to finish it soonest, fails over to another backend when one
+is down, and can be hedged to a second backend when it runs slow.
+"""
+import asyncio
+import base64
+import io
+import logging
+import os
+import time
+
+import httpx
+from PIL import Image
+
+try:
+    from .sd_pool import get_pool
+except ImportError:  # Imported from the models directory
+    from sd_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+# Stable Diffusion API configuration
+SD_MAX_CONCURRENCY = int(os.getenv("SD_MAX_CONCURRENCY", "3"))  # txt2img calls in flight per backend
+SD_TIMEOUT = float(os.getenv("SD_TIMEOUT", "300"))  # 5 minute timeout per image
+SD_HEDGE_AFTER = float(os.getenv("SD_HEDGE_AFTER", "0"))  # Seconds before a slow request is also sent to a second backend (0 disables)
+TXT2IMG_PATH = "/sdapi/v1/txt2img"
+EXTRAS_PATH = "/sdapi/v1/extra-single-image"
+PROGRESS_PATH = "/sdapi/v1/progress"
+INTERRUPT_PATH = "/sdapi/v1/interrupt"
+SD_PROGRESS_INTERVAL = float(os.getenv("SD_PROGRESS_INTERVAL", "1.0"))  # Least time between progress polls of one backend
+
+
+class SDError(Exception):
+    """Raised when the Stable Diffusion API fails or returns no image"""
+
+
+class SDBackendError(SDError):
+    """A backend was unreachable, timed out or failed; another backend may still succeed"""
+
+
+class ImageResult:
+    """Outcome of one named txt2img job: the PNG bytes and a lazily decoded image, or the error that stopped it"""
+
+    def __init__(self, name, data=None, error=None, seconds=None, cached=False):
+        self.name = name
+        self.data = data  # PNG bytes exactly as SD encoded them
+        self.image = open_image(data) if data is not None else None
+        self.error = error
+        self.seconds = seconds
+        self.cached = cached  # Served from the image cache without calling SD
+        self.path = None  # Set once the image has been saved
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def png_size(data):
+    """(width, height) from a PNG's IHDR chunk; raises SDError if the bytes aren't a PNG"""
+    if len(data) < 24 or not data.startswith(PNG_SIGNATURE) or data[12:16] != b"IHDR":
+        raise SDError("Stable Diffusion response is not a PNG image")
+    return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+
+
+def decode_image_data(image_data):
+    """PNG bytes from a base64 SD image, with or without a data URL prefix; only the header is checked"""
+    if ',' in image_data[:100]:
+        image_data = image_data.split(',', 1)[1]
+    data = base64.b64decode(image_data)
+    png_size(data)
+    return data
+
+
+def open_image(data):
+    """PIL handle over in-memory PNG bytes; pixels are decoded on first use"""
+    return Image.open(io.BytesIO(data))
+
+
+def decode_image(image_data):
+    """Decode a base64 image from an SD response into a loaded PIL Image"""
+    image = open_image(decode_image_data(image_data))
+    image.load()
+    return image
+
+
+class _ProgressWatch:
+    """Progress listeners of the requests in flight on one backend, oldest first"""
+
+    def __init__(self):
+        self.listeners = []
+        self.task = None
+
+
+class SDClient:
+    """Pooled async txt2img client over one or more SD backends.
+
+    Use as `async with SDClient() as client:`; at most `max_concurrency`
+    requests per backend are in flight at a time, the rest wait their turn.
+    Routing and health state live in the shared backend pool (see sd_pool),
+    so they carry over from one client to the next.
+    """
+
+    def __init__(self, urls=None, max_concurrency=SD_MAX_CONCURRENCY, timeout=SD_TIMEOUT,
+                 hedge_after=SD_HEDGE_AFTER, pool=None):
+        if isinstance(urls, str):
+            urls = [urls]
+        self.pool = pool or get_pool(urls)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        # One semaphore per backend, taken once the pool has routed a request there
+        self._slots = {backend.url: asyncio.Semaphore(max_concurrency) for backend in self.pool.backends}
+        slots = max_concurrency * len(self.pool)
+        self._watches = {}  # backend url -> _ProgressWatch
+        self._interrupts = set()  # Interrupt calls to backends that lost a hedge
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=slots, max_keepalive_connections=slots)
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        for watch in self._watches.values():
+            watch.task.cancel()
+        await asyncio.gather(*self._interrupts, return_exceptions=True)
+        await self._client.aclose()
+
+    async def txt2img(self, payload):
+        """Run one txt2img request and return the first image as a PIL Image"""
+        image_data = await self._route(TXT2IMG_PATH, payload)
+        # Decoding a large PNG takes a while; keep it off the event loop
+        return await asyncio.to_thread(decode_image, image_data)
+
+    async def txt2img_bytes(self, payload, on_progress=None):
+        """Run one txt2img request and return the first image as the PNG bytes SD sent.
+
+        While it runs, `on_progress(progress, eta)` gets the backend's sampling
+        progress (0 to 1) and estimated seconds left, polled at most every
+        SD_PROGRESS_INTERVAL seconds per backend.
+        """
+        image_data = await self._route(TXT2IMG_PATH, payload, on_progress=on_progress)
+        return await asyncio.to_thread(decode_image_data, image_data)
+
+    async def upscale(self, data, factor, upscaler):
+        """Upscale PNG bytes by `factor` with one of SD's extras upscalers and return the new PNG bytes"""
+        payload = {
+            "image": base64.b64encode(data).decode("ascii"),
+            "upscaling_resize": factor,
+            "upscaler_1": upscaler
+        }
+        # Upscaling takes a fraction of a txt2img call; keep it out of the latency estimate
+        image_data = await self._route(EXTRAS_PATH, payload, timed=False)
+        return await asyncio.to_thread(decode_image_data, image_data)
+
+    async def _route(self, path, payload, timed=True, on_progress=None):
+        """Try backends, best first, until one returns an image or none are left"""
+        tried = set()
+        last_error = None
+        while True:
+            backend = self.pool.acquire(exclude=tried)
+            if backend is None:
+                if last_error is not None:
+                    raise last_error
+                raise SDError("No healthy Stable Diffusion backend available")
+            tried.add(backend.url)
+            try:
+                return await self._hedged(backend, path, payload, tried, timed, on_progress)
+            except SDBackendError as e:
+                last_error = e
+                logger.warning(f"{str(e)}, trying another backend")
+
+    async def _hedged(self, backend, path, payload, tried, timed, on_progress):
+        """Send to `backend`; if it hasn't answered after hedge_after seconds, race a second backend"""
+        first = asyncio.create_task(self._post(backend, path, payload, timed, on_progress))
+        started = {first: (backend, time.perf_counter())}
+        tasks = {first}
+        won = False
+        try:
+            if self.hedge_after > 0 and len(self.pool) > 1:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+                if not done:
+                    second = self.pool.acquire(exclude=tried)
+                    if second is not None:
+                        tried.add(second.url)
+                        self.pool.hedges += 1
+                        logger.info(f"{path} on {backend.url} is slow, hedging to {second.url}")
+                        hedge = asyncio.create_task(self._post(second, path, payload, timed, on_progress))
+                        started[hedge] = (second, time.perf_counter())
+                        tasks.add(hedge)
+
+            errors = []
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        won = True
+                        if task is not first:
+                            self.pool.hedge_wins += 1
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            if won:
+                for task in tasks:
+                    self._lost_hedge(*started[task])
+            for task in tasks:
+                task.cancel()
+            # Let the losers report back to the pool before returning
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _lost_hedge(self, backend, started):
+        """Tell the pool a backend was outrun, and stop it working on a request nobody waits for"""
+        # SD's interrupt stops whatever job the backend is running, so only send it when that is ours
+        if backend.in_flight == 1:
+            task = asyncio.create_task(self._interrupt(backend))
+            self._interrupts.add(task)
+            task.add_done_callback(self._interrupts.discard)
+        self.pool.record_slow(backend, time.perf_counter() - started)
+
+    async def _interrupt(self, backend):
+        try:
+            await self._client.post(backend.url + INTERRUPT_PATH, timeout=SD_PROGRESS_INTERVAL * 5)
+        except httpx.HTTPError as e:
+            logger.debug(f"Could not interrupt {backend.url}: {str(e)}")
+
+    async def _post(self, backend, path, payload, timed=True, on_progress=None):
+        """One call to one backend, once it has a free slot; returns the base64 image and reports the outcome to the pool"""
+        ok, seconds = None, None
+        try:
+            async with self._slots[backend.url]:
+                # The latency clock starts once the request is sent, not while it waits for a slot
+                start = time.perf_counter()
+                if on_progress is not None:
+                    self._watch_progress(backend, on_progress)
+                try:
+                    image_data = await self._send(backend, path, payload)
+                finally:
+                    if on_progress is not None:
+                        self._watches[backend.url].listeners.remove(on_progress)
+            ok = True
+            if timed:
+                seconds = time.perf_counter() - start
+            return image_data
+        except SDBackendError:
+            ok = False
+            raise
+        except SDError:
+            # The request itself was rejected; every backend would do the same
+            ok = True
+            raise
+        finally:
+            self.pool.release(backend, ok, seconds)
+
+    async def _send(self, backend, path, payload):
+        """POST payload to one backend and return the base64 image it answered with"""
+        try:
+            response = await self._client.post(backend.url + path, json=payload)
+        except httpx.ConnectError as e:
+            raise SDBackendError(f"Could not connect to Stable Diffusion API at {backend.url}") from e
+        except httpx.TimeoutException as e:
+            raise SDBackendError(f"Stable Diffusion API at {backend.url} timed out after {self.timeout:g}s") from e
+        except httpx.HTTPError as e:
+            raise SDBackendError(f"Stable Diffusion API at {backend.url} failed: {str(e)}") from e
+
+        if response.status_code >= 500:
+            raise SDBackendError(f"Stable Diffusion API at {backend.url} returned {response.status_code}: {response.text[:500]}")
+        if response.status_code != 200:
+            raise SDError(f"Stable Diffusion API returned {response.status_code}: {response.text[:500]}")
+        try:
+            body = response.json()
+            # txt2img answers with a list of images, the extras endpoint with one
+            images = body.get('images') or ([body['image']] if body.get('image') else None)
+        except ValueError:
+            images = None
+        if not images:
+            raise SDBackendError(f"No images in Stable Diffusion response from {backend.url}")
+        return images[0]
+
+    def _watch_progress(self, backend, on_progress):
+        watch = self._watches.get(backend.url)
+        if watch is None or watch.task.done():
+            watch = self._watches[backend.url] = _ProgressWatch()
+            watch.task = asyncio.create_task(self._poll_progress(backend, watch))
+        watch.listeners.append(on_progress)
+
+    async def _poll_progress(self, backend, watch):
+        """Poll a backend's progress until none of its requests here want it any more"""
+        # Give short requests the chance to finish before the first poll
+        await asyncio.sleep(SD_PROGRESS_INTERVAL)
+        while watch.listeners:
+            progress = await self._backend_progress(backend)
+            # SD samples one job at a time, in order of arrival; the oldest request here is the one running
+            if progress is not None and watch.listeners:
+                watch.listeners[0](*progress)
+            await asyncio.sleep(SD_PROGRESS_INTERVAL)
+
+    async def _backend_progress(self, backend):
+        """(progress, eta seconds) of the job the backend is running, reusing a recent answer; None if unavailable"""
+        now = time.monotonic()
+        if backend.progress_at is not None and now - backend.progress_at < SD_PROGRESS_INTERVAL:
+            return backend.progress
+        backend.progress_at = now
+        try:
+            response = await self._client.get(backend.url + PROGRESS_PATH, params={"skip_current_image": "true"},
+                                              timeout=SD_PROGRESS_INTERVAL * 5)
+            body = response.json()
+            backend.progress = (float(body.get("progress") or 0.0), body.get("eta_relative"))
+        except (httpx.HTTPError, ValueError, AttributeError) as e:
+            logger.debug(f"Could not read progress from {backend.url}: {str(e)}")
+            backend.progress = None
+        return backend.progress
+
+    async def generate(self, jobs, on_progress=None):
+        """Run named txt2img payloads concurrently and return {name: ImageResult}.
+
+        A failed job is recorded in its result and doesn't cancel the others.
+        `on_progress(name, progress, eta)` reports each job's sampling progress.
+        """
+        async def run(name, payload):
+            start = time.perf_counter()
+            report = None
+            if on_progress is not None:
+                def report(progress, eta):
+                    on_progress(name, progress, eta)
+            try:
+                data = await self.txt2img_bytes(payload, report)
+            except Exception as e:
+                logger.error(f"Error generating {name} image: {str(e)}")
+                return ImageResult(name, error=e, seconds=time.perf_counter() - start)
+            seconds = time.perf_counter() - start
+            if report is not None:
+                report(1.0, 0.0)
+            logger.info(f"Generated {name} image in {seconds:.1f}s")
+            return ImageResult(name, data=data, seconds=seconds)
+
+        results = await asyncio.gather(*(run(name, payload) for name, payload in jobs.items()))
+        return {result.name: result for result in results}
@@ -0,0 +1,179 @@
+"""Health and load tracking for a pool of Stable Diffusion backends.
+
+Each backend keeps its in-flight count, an EWMA of its txt2img latency and a
+circuit breaker: after `failure_threshold` consecutive failures it is skipped
+for `reset_after` seconds, then a single probe request decides whether it
+comes back. The state is plain Python guarded by a lock, so it outlives any
+one event loop or HTTP client and is shared by every SDClient in the process.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Backend pool configuration
+SD_URLS = [
+    url.strip().rstrip('/')
+    for url in os.getenv("SD_URLS", os.getenv("SD_URL", "http://127.0.0.1:7861")).split(',')
+    if url.strip()
+]
+SD_FAILURE_THRESHOLD = int(os.getenv("SD_FAILURE_THRESHOLD", "3"))  # Consecutive failures before a backend is skipped
+SD_CIRCUIT_RESET = float(os.getenv("SD_CIRCUIT_RESET", "30"))  # Seconds before a skipped backend gets a probe request
+EWMA_ALPHA = 0.3  # Weight of the newest latency sample
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class Backend:
+    """One SD instance and what the pool knows about it"""
+
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0
+        self.ewma_seconds = None
+        self.requests = 0
+        self.failures = 0
+        self.hedges_lost = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = None
+        self.progress = None  # Last /sdapi/v1/progress answer, shared by every client polling this backend
+        self.progress_at = None
+
+    def expected_seconds(self, default):
+        """Estimated time until a new request sent here would finish"""
+        return (self.in_flight + 1) * (self.ewma_seconds if self.ewma_seconds is not None else default)
+
+
+class BackendPool:
+    """Routes each request to the healthy backend expected to finish it soonest.
+
+    `acquire` picks a backend and counts the request against it; every
+    acquire must be matched by one `release`, with `ok` saying whether the
+    backend did its job and `seconds` its latency when it did.
+    """
+
+    def __init__(self, urls, failure_threshold=SD_FAILURE_THRESHOLD, reset_after=SD_CIRCUIT_RESET):
+        if not urls:
+            raise ValueError("At least one Stable Diffusion URL is required")
+        self.backends = [Backend(url.rstrip('/')) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.backends)
+
+    def acquire(self, exclude=()):
+        """Reserve the best available backend not in `exclude`, or None if there is none"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for backend in self.backends:
+                if backend.url in exclude:
+                    continue
+                if backend.state == CLOSED:
+                    candidates.append(backend)
+                # Once reset_after has passed, an open backend may take one probe request
+                elif backend.state == OPEN and now - backend.opened_at >= self.reset_after and backend.in_flight == 0:
+                    candidates.append(backend)
+            if not candidates:
+                return None
+
+            known = [b.ewma_seconds for b in self.backends if b.ewma_seconds is not None]
+            # Backends without a latency yet are assumed to be as fast as the average
+            default = sum(known) / len(known) if known else 1.0
+            backend = min(candidates, key=lambda b: (b.expected_seconds(default), b.requests))
+            if backend.state == OPEN:
+                backend.state = HALF_OPEN
+                logger.info(f"Probing Stable Diffusion backend {backend.url}")
+            backend.in_flight += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend, ok=True, seconds=None):
+        with self._lock:
+            backend.in_flight -= 1
+            if ok is None:
+                # Abandoned (e.g. a losing hedge), says nothing about the backend's health
+                if backend.state == HALF_OPEN:
+                    backend.state = OPEN
+                    backend.opened_at = time.monotonic() - self.reset_after
+                return
+            if ok:
+                if seconds is not None:
+                    if backend.ewma_seconds is None:
+                        backend.ewma_seconds = seconds
+                    else:
+                        backend.ewma_seconds = (1 - EWMA_ALPHA) * backend.ewma_seconds + EWMA_ALPHA * seconds
+                if backend.state != CLOSED:
+                    logger.info(f"Stable Diffusion backend {backend.url} recovered")
+                backend.state = CLOSED
+                backend.consecutive_failures = 0
+                return
+
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            if backend.state == HALF_OPEN or backend.consecutive_failures >= self.failure_threshold:
+                if backend.state != OPEN:
+                    logger.warning(f"Stable Diffusion backend {backend.url} failed {backend.consecutive_failures} time(s) in a row, skipping it for {self.reset_after:g}s")
+                backend.state = OPEN
+                backend.opened_at = time.monotonic()
+
+    def record_slow(self, backend, seconds):
+        """A request had run `seconds` on backend when another backend answered it first.
+
+        It would have taken at least that long, so the latency estimate only
+        moves up; and the loss counts towards the breaker like a failure, as a
+        backend that keeps losing hedges without finishing anything in between
+        is as good as down.
+        """
+        with self._lock:
+            if backend.ewma_seconds is None:
+                backend.ewma_seconds = seconds
+            elif seconds > backend.ewma_seconds:
+                backend.ewma_seconds = (1 - EWMA_ALPHA) * backend.ewma_seconds + EWMA_ALPHA * seconds
+            backend.hedges_lost += 1
+            backend.consecutive_failures += 1
+            if backend.state == HALF_OPEN or backend.consecutive_failures >= self.failure_threshold:
+                if backend.state != OPEN:
+                    logger.warning(f"Stable Diffusion backend {backend.url} lost {backend.consecutive_failures} request(s) in a row, skipping it for {self.reset_after:g}s")
+                backend.state = OPEN
+                backend.opened_at = time.monotonic()
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "backends": [
+                    {
+                        "url": b.url,
+                        "state": b.state,
+                        "in_flight": b.in_flight,
+                        "ewma_seconds": round(b.ewma_seconds, 3) if b.ewma_seconds is not None else None,
+                        "requests": b.requests,
+                        "failures": b.failures,
+                        "hedges_lost": b.hedges_lost
+                    }
+                    for b in self.backends
+                ],
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(urls=None):
+    """The process-wide pool for `urls` (default SD_URLS), so health carries over between clients"""
+    key = tuple(url.rstrip('/') for url in (urls or SD_URLS))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = BackendPool(list(key))
+        return _pools[key]
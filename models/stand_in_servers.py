@@ -0,0 +1,374 @@
+"""Stand-in Stable Diffusion and T5 servers for running and benchmarking the brochure pipeline without the models.
+
+    python models/stand_in_servers.py sd --port 7861 --step_latency lognormal:0.05,0.3 --concurrency 1
+    python models/stand_in_servers.py t5 --port 8005 --latency normal:0.8,0.2 --error_rate 0.01
+
+The SD server implements /sdapi/v1/txt2img, /sdapi/v1/progress and
+/sdapi/v1/extra-single-image. The T5 server implements /generate,
+/generate-batch, /health and /ready. Both answer with synthetic images and
+text that depend only on the request, so repeated runs are comparable.
+Latency is drawn from a distribution given as `kind:params`:
+
+    fixed:SECONDS  uniform:LOW,HIGH  normal:MEAN,STD  lognormal:MEDIAN,SIGMA
+
+SD latency is per sampling step at 512x512 and scales with the steps and
+pixels a request asks for, like the real sampler; the hires fix's second
+pass counts at its target size. --concurrency caps the requests worked on at
+once (the WebUI runs one) and the rest queue. --error_rate answers that share
+of requests with a 500 once their work is done, the way an out-of-memory
+failure would. Start the brochure API against them with SD_URLS pointing at
+the SD stand-in; the brochure generator expects T5 on port 8005.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import time
+from typing import Dict, Optional, Union
+
+from fastapi import FastAPI, HTTPException
+from PIL import Image
+from pydantic import BaseModel
+
+BASE_PIXELS = 512 * 512
+
+
+class Latency:
+    """A latency distribution parsed from `kind:params`, sampled in seconds"""
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+    def __init__(self, spec):
+        kind, _, params = spec.partition(":")
+        try:
+            values = [float(value) for value in params.split(",")]
+        except ValueError:
+            raise ValueError(f"Bad latency parameters in {spec!r}")
+        if kind not in self.KINDS or len(values) != self.KINDS[kind]:
+            raise ValueError(f"Unknown latency {spec!r}, expected one of fixed:S, uniform:LOW,HIGH, normal:MEAN,STD, lognormal:MEDIAN,SIGMA")
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng):
+        if self.kind == "fixed":
+            seconds = self.values[0]
+        elif self.kind == "uniform":
+            seconds = rng.uniform(*self.values)
+        elif self.kind == "normal":
+            seconds = rng.gauss(*self.values)
+        else:
+            median, sigma = self.values
+            seconds = rng.lognormvariate(math.log(median), sigma)
+        return max(0.0, seconds)
+
+
+def request_digest(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).digest()
+
+
+def synthetic_png(width, height, digest):
+    """A vertical two-colour gradient, the colours taken from digest"""
+    top = Image.new("RGB", (width, height), tuple(digest[0:3]))
+    bottom = Image.new("RGB", (width, height), tuple(digest[3:6]))
+    mask = Image.linear_gradient("L").resize((width, height))
+    buffer = io.BytesIO()
+    Image.composite(bottom, top, mask).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FailureInjector:
+    """Seeded randomness shared by a stand-in's latency and failure draws"""
+
+    def __init__(self, error_rate, seed):
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+
+    def should_fail(self):
+        self.requests += 1
+        failed = self.rng.random() < self.error_rate
+        self.failures += failed
+        return failed
+
+
+def create_sd_app(step_latency=Latency("fixed:0.05"), upscale_latency=Latency("fixed:0.5"), concurrency=1,
+                  error_rate=0.0, seed=0):
+    """FastAPI app standing in for the AUTOMATIC1111 WebUI API"""
+    app = FastAPI(title="Stand-in Stable Diffusion API")
+    injector = FailureInjector(error_rate, seed)
+    running = []  # Jobs being sampled, oldest first: {"start", "seconds", "steps"}
+    state = {"queued": 0, "slots": None}
+
+    async def run_job(seconds, steps):
+        # Created lazily so the semaphore belongs to the server's event loop
+        if state["slots"] is None:
+            state["slots"] = asyncio.Semaphore(concurrency)
+        failed = injector.should_fail()
+        state["queued"] += 1
+        admitted = False
+        try:
+            async with state["slots"]:
+                state["queued"] -= 1
+                admitted = True
+                job = {"start": time.monotonic(), "seconds": seconds, "steps": steps}
+                running.append(job)
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    running.remove(job)
+        finally:
+            # The client gave up while the request was still queued
+            if not admitted:
+                state["queued"] -= 1
+        if failed:
+            raise HTTPException(status_code=500, detail="Injected failure")
+
+    @app.post("/sdapi/v1/txt2img")
+    async def txt2img(payload: dict):
+        width, height = int(payload.get("width", 512)), int(payload.get("height", 512))
+        steps = int(payload.get("steps", 20))
+        step_seconds = step_latency.sample(injector.rng)
+        seconds = step_seconds * steps * width * height / BASE_PIXELS
+        if payload.get("enable_hr"):
+            width = int(payload.get("hr_resize_x") or width * payload.get("hr_scale", 2))
+            height = int(payload.get("hr_resize_y") or height * payload.get("hr_scale", 2))
+            hr_steps = int(payload.get("hr_second_pass_steps") or steps)
+            seconds += step_seconds * hr_steps * width * height / BASE_PIXELS
+            steps += hr_steps
+        await run_job(seconds, steps)
+
+        image_seed = payload.get("seed")
+        if image_seed is None or image_seed == -1:
+            image_seed = int.from_bytes(request_digest(payload.get("prompt"))[:4], "little")
+        digest = request_digest(payload.get("prompt"), payload.get("negative_prompt"), image_seed)
+        data = await asyncio.to_thread(synthetic_png, width, height, digest)
+        return {
+            "images": [base64.b64encode(data).decode("ascii")],
+            "parameters": payload,
+            "info": json.dumps({"seed": image_seed, "width": width, "height": height, "stand_in": True})
+        }
+
+    @app.post("/sdapi/v1/extra-single-image")
+    async def extra_single_image(payload: dict):
+        try:
+            image = Image.open(io.BytesIO(base64.b64decode(payload["image"])))
+            image.load()
+        except (KeyError, ValueError, OSError) as e:
+            raise HTTPException(status_code=422, detail=f"Invalid image: {str(e)}")
+        factor = float(payload.get("upscaling_resize", 2))
+        await run_job(upscale_latency.sample(injector.rng), 1)
+
+        def resize():
+            buffer = io.BytesIO()
+            image.resize((round(image.width * factor), round(image.height * factor))).save(buffer, format="PNG")
+            return buffer.getvalue()
+
+        data = await asyncio.to_thread(resize)
+        return {"image": base64.b64encode(data).decode("ascii"), "html_info": ""}
+
+    @app.get("/sdapi/v1/progress")
+    async def progress(skip_current_image: bool = False):
+        if not running:
+            return {"progress": 0.0, "eta_relative": 0.0, "state": {"job_count": state["queued"]}, "current_image": None}
+        job = running[0]
+        elapsed = time.monotonic() - job["start"]
+        done = min(1.0, elapsed / job["seconds"]) if job["seconds"] else 1.0
+        return {
+            "progress": done,
+            "eta_relative": max(0.0, job["seconds"] - elapsed),
+            "state": {
+                "job_count": len(running) + state["queued"],
+                "sampling_step": int(done * job["steps"]),
+                "sampling_steps": job["steps"]
+            },
+            "current_image": None
+        }
+
+    @app.get("/stand-in/stats")
+    async def stats():
+        return {"requests": injector.requests, "failures": injector.failures, "running": len(running),
+                "queued": state["queued"]}
+
+    return app
+
+
+class GenerationRequest(BaseModel):
+    prompt: str
+    max_length: Optional[int] = 100
+
+
+class BatchPrompt(BaseModel):
+    prompt: str
+    max_length: Optional[int] = None
+
+
+class BatchGenerationRequest(BaseModel):
+    prompts: Dict[str, Union[str, BatchPrompt]]
+    max_length: Optional[int] = 100
+
+
+# Amenity lines that pass SinglePageBrochureGenerator's checks for each location type
+AMENITIES = {
+    "beach": [
+        "Private beach cabanas with butler service",
+        "Sunset cruises along the coastal waters",
+        "Oceanfront infinity pool with swim-up bar",
+        "Guided snorkelling in the clear blue sea",
+        "Beachside spa pavilions with ocean views",
+        "Candlelit dinners at the water's edge"
+    ],
+    "himalayan": [
+        "Guided treks to Himalayan peak viewpoints",
+        "Traditional hot stone spa rituals",
+        "Valley-view yoga and meditation retreats",
+        "Adventure paragliding over the valley",
+        "Nature trails through cedar forests",
+        "Traditional local cuisine tasting evenings"
+    ],
+    "mountain": [
+        "Guided hiking trails through the valley",
+        "Heated infinity pool with mountain views",
+        "Sunrise yoga on the peak terrace",
+        "Adventure rock climbing with expert guides",
+        "Nature walks through alpine meadows",
+        "Fireside lounge overlooking the valley"
+    ],
+    "city": [
+        "Rooftop bar with city skyline views",
+        "Modern business lounge and meeting suites",
+        "Urban spa with thermal suites",
+        "Chauffeured metropolitan tours",
+        "Modern fitness centre with personal trainers",
+        "City food walks with local chefs"
+    ],
+    "resort": [
+        "Private villas with plunge pools",
+        "Full-service spa and wellness centre",
+        "Championship golf course",
+        "Personal butler for every suite",
+        "Curated excursions with private guides",
+        "Award-winning signature restaurant"
+    ]
+}
+
+SENTENCES = [
+    "{subject} pairs effortless elegance with warm, personal service.",
+    "Every detail at {subject} has been considered, from the bespoke furnishings to the views.",
+    "Guests at {subject} enjoy spacious interiors, fine linens and thoughtful modern comforts.",
+    "{subject} celebrates the flavours and character of its surroundings.",
+    "Unhurried mornings and memorable evenings define a stay at {subject}.",
+    "Light-filled spaces at {subject} open onto carefully tended gardens and terraces."
+]
+
+SUBJECT_PATTERN = re.compile(r"(?:of|at|for) (.+?) in ([^,.]+)")
+LOCATION_TYPE_PATTERN = re.compile(r"match this (\w+) location")
+
+
+def synthetic_text(prompt, max_length=100):
+    """Brochure-like text chosen by a hash of the prompt; amenity prompts get a numbered list"""
+    digest = request_digest(prompt)
+    location_type = LOCATION_TYPE_PATTERN.search(prompt)
+    if "amenities" in prompt.lower():
+        amenities = AMENITIES.get(location_type.group(1) if location_type else "resort", AMENITIES["resort"])
+        return "\n".join(f"{i}. {amenity}" for i, amenity in enumerate(amenities, 1))
+
+    subject = SUBJECT_PATTERN.search(prompt)
+    subject = f"{subject.group(1)} in {subject.group(2)}" if subject else "The hotel"
+    sentences = [SENTENCES[(digest[i] + i) % len(SENTENCES)] for i in range(3)]
+    text = " ".join(sentence.format(subject=subject) for sentence in dict.fromkeys(sentences))
+    # max_length counts tokens; about four characters each
+    return text[:max(1, max_length or 100) * 4]
+
+
+def create_t5_app(latency=Latency("fixed:0.5"), concurrency=1, error_rate=0.0, batch_cost=0.25, seed=0):
+    """FastAPI app standing in for t5_server.py"""
+    app = FastAPI(title="Stand-in T5 API")
+    injector = FailureInjector(error_rate, seed)
+    state = {"slots": None, "in_flight": 0}
+
+    async def run(prompts):
+        if state["slots"] is None:
+            state["slots"] = asyncio.Semaphore(concurrency)
+        failed = injector.should_fail()
+        # A batch decodes together: each extra prompt adds batch_cost of one generation
+        seconds = latency.sample(injector.rng) * (1 + batch_cost * (len(prompts) - 1))
+        async with state["slots"]:
+            state["in_flight"] += 1
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                state["in_flight"] -= 1
+        if failed:
+            raise HTTPException(status_code=500, detail="Text generation failed: injected failure")
+        return [synthetic_text(prompt, max_length) for prompt, max_length in prompts]
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "model": "ready", "stand_in": True, "in_flight": state["in_flight"],
+                "requests": injector.requests, "failures": injector.failures}
+
+    @app.get("/ready")
+    async def ready():
+        return {"status": "ready", "backend": "stand-in"}
+
+    @app.post("/generate")
+    async def generate(request: GenerationRequest):
+        return {"generated_text": (await run([(request.prompt, request.max_length)]))[0]}
+
+    @app.post("/generate-batch")
+    async def generate_batch(request: BatchGenerationRequest):
+        if not request.prompts:
+            raise HTTPException(status_code=400, detail="At least one prompt is required")
+        names = list(request.prompts)
+        prompts = []
+        for name in names:
+            item = request.prompts[name]
+            if isinstance(item, str):
+                prompts.append((item, request.max_length))
+            else:
+                prompts.append((item.prompt, item.max_length or request.max_length))
+        return {"generated_texts": dict(zip(names, await run(prompts)))}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a stand-in Stable Diffusion or T5 server')
+    subparsers = parser.add_subparsers(dest='server', required=True)
+
+    sd = subparsers.add_parser('sd', help='Stand-in for the Stable Diffusion WebUI API')
+    sd.add_argument('--port', type=int, default=7861, help='Port to listen on')
+    sd.add_argument('--step_latency', type=Latency, default=Latency("fixed:0.05"), help='Seconds per sampling step at 512x512')
+    sd.add_argument('--upscale_latency', type=Latency, default=Latency("fixed:0.5"), help='Seconds per extras upscale')
+    sd.add_argument('--concurrency', type=int, default=1, help='Requests worked on at once; the rest queue')
+
+    t5 = subparsers.add_parser('t5', help='Stand-in for t5_server.py')
+    t5.add_argument('--port', type=int, default=8005, help='Port to listen on')
+    t5.add_argument('--latency', type=Latency, default=Latency("fixed:0.5"), help='Seconds per generation')
+    t5.add_argument('--concurrency', type=int, default=1, help='Generations worked on at once; the rest queue')
+    t5.add_argument('--batch_cost', type=float, default=0.25, help='Extra time per additional prompt in a batch, relative to one generation')
+
+    for subparser in (sd, t5):
+        subparser.add_argument('--host', type=str, default="127.0.0.1", help='Interface to listen on')
+        subparser.add_argument('--error_rate', type=float, default=0.0, help='Share of requests answered with a 500')
+        subparser.add_argument('--seed', type=int, default=0, help='Seed for the latency and failure draws')
+    args = parser.parse_args()
+
+    if args.server == "sd":
+        app = create_sd_app(args.step_latency, args.upscale_latency, args.concurrency, args.error_rate, args.seed)
+    else:
+        app = create_t5_app(args.latency, args.concurrency, args.error_rate, args.batch_cost, args.seed)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""Inference backends behind /generate: eager PyTorch, torch.compile and ONNX Runtime.
+
+Every backend decodes with the same sampling semantics: no-repeat n-grams,
+then the per-row temperature/top-k/top-p warper passed in by generate_batch,
+then multinomial sampling, stopping at EOS or max_length.
+"""
+import argparse
+import inspect
+import json
+import logging
+import os
+
+import torch
+from transformers import LogitsProcessorList, NoRepeatNGramLogitsProcessor
+
+from t5_generation import NO_REPEAT_NGRAM_SIZE
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("eager", "compiled", "onnx")
+ONNX_CONFIG_FILE = "onnx_config.json"
+ONNX_OPSET = 14
+
+
+class EagerBackend:
+    """Plain `model.generate` in eager PyTorch"""
+
+    name = "eager"
+
+    def __init__(self, model):
+        self.model = model
+
+    def generate(self, input_ids, attention_mask, max_length, logits_processor, stopping_criteria=None, streamer=None):
+        return self.model.generate(
+            input_ids=input_ids.to(self.model.device),
+            attention_mask=attention_mask.to(self.model.device),
+            max_length=max_length,
+            do_sample=True,  # Enable sampling
+            # Built-in warpers are disabled, logits_processor applies them per row
+            temperature=1.0,
+            top_k=0,
+            top_p=1.0,
+            logits_processor=logits_processor,
+            stopping_criteria=stopping_criteria,
+            num_return_sequences=1,
+            no_repeat_ngram_size=NO_REPEAT_NGRAM_SIZE,
+            streamer=streamer
+        )
+
+
+class CompiledBackend(EagerBackend):
+    """`model.generate` with the forward pass compiled by torch.compile.
+
+    Compilation happens on the first call, so keep the warm-up generation on
+    when serving with this backend.
+    """
+
+    name = "compiled"
+
+    def __init__(self, model):
+        super().__init__(model)
+        # dynamic=True keeps growing decoder lengths and batch sizes from triggering recompiles
+        self.model.forward = torch.compile(self.model.forward, dynamic=True)
+
+
+class _EncoderWrapper(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.get_encoder()
+
+    def forward(self, input_ids, attention_mask):
+        return self.encoder(input_ids=input_ids, attention_mask=attention_mask, return_dict=True).last_hidden_state
+
+
+def _flatten_past(past_key_values):
+    if hasattr(past_key_values, "to_legacy_cache"):
+        past_key_values = past_key_values.to_legacy_cache()
+    elif hasattr(past_key_values, "self_attention_cache"):  # Cache objects without the legacy conversion
+        past_key_values = [
+            (self_layer.keys, self_layer.values, cross_layer.keys, cross_layer.values)
+            for self_layer, cross_layer in zip(past_key_values.self_attention_cache.layers,
+                                               past_key_values.cross_attention_cache.layers)
+        ]
+    return tuple(tensor for layer in past_key_values for tensor in layer)
+
+
+def _unflatten_past(flat_past):
+    # Per layer: self-attention key/value, then cross-attention key/value
+    past = tuple(tuple(flat_past[i:i + 4]) for i in range(0, len(flat_past), 4))
+    try:
+        from transformers import EncoderDecoderCache
+    except ImportError:  # transformers releases that still take tuples
+        return past
+    if hasattr(EncoderDecoderCache, "from_legacy_cache"):
+        return EncoderDecoderCache.from_legacy_cache(past)
+    return EncoderDecoderCache(past)
+
+
+class _DecoderInitWrapper(torch.nn.Module):
+    """First decoding step: computes the cross-attention cache from the encoder output"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, decoder_input_ids, encoder_attention_mask, encoder_hidden_states):
+        outputs = self.model(
+            encoder_outputs=(encoder_hidden_states,),
+            attention_mask=encoder_attention_mask,
+            decoder_input_ids=decoder_input_ids,
+            use_cache=True,
+            return_dict=True
+        )
+        return (outputs.logits[:, -1, :],) + _flatten_past(outputs.past_key_values)
+
+
+class _DecoderWithPastWrapper(torch.nn.Module):
+    """Later decoding steps: one new token per row on top of the cached keys and values"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, decoder_input_ids, encoder_attention_mask, encoder_hidden_states, *flat_past):
+        outputs = self.model(
+            encoder_outputs=(encoder_hidden_states,),
+            attention_mask=encoder_attention_mask,
+            decoder_input_ids=decoder_input_ids,
+            past_key_values=_unflatten_past(flat_past),
+            use_cache=True,
+            return_dict=True
+        )
+        # Cross-attention keys/values never change, only the self-attention ones are returned
+        present = _flatten_past(outputs.past_key_values)
+        return (outputs.logits[:, -1, :],) + tuple(
+            tensor for i, tensor in enumerate(present) if i % 4 < 2
+        )
+
+
+def _past_names(num_layers, prefix):
+    names = []
+    for layer in range(num_layers):
+        names.extend([
+            f"{prefix}.{layer}.self.key", f"{prefix}.{layer}.self.value",
+            f"{prefix}.{layer}.cross.key", f"{prefix}.{layer}.cross.value",
+        ])
+    return names
+
+
+def _onnx_export(module, args, path, input_names, output_names, dynamic_axes):
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False  # The TorchScript exporter handles the data-dependent cache shapes
+    torch.onnx.export(
+        module,
+        args,
+        path,
+        input_names=input_names,
+        output_names=output_names,
+        dynamic_axes=dynamic_axes,
+        opset_version=ONNX_OPSET,
+        do_constant_folding=True,
+        **kwargs
+    )
+
+
+def export_onnx(model, output_dir):
+    """Export encoder, first-step decoder and cached-step decoder graphs for ONNX Runtime"""
+    os.makedirs(output_dir, exist_ok=True)
+    model = model.eval()
+    config = model.config
+    num_layers = config.num_decoder_layers
+
+    # Two rows of different length so the exported graphs see a padded batch
+    eos, pad = config.eos_token_id, config.pad_token_id
+    input_ids = torch.tensor([[3, 4, eos], [3, eos, pad]])
+    attention_mask = torch.tensor([[1, 1, 1], [1, 1, 0]])
+    decoder_input_ids = torch.full((2, 1), config.decoder_start_token_id)
+
+    with torch.no_grad():
+        encoder = _EncoderWrapper(model).eval()
+        encoder_hidden_states = encoder(input_ids, attention_mask)
+        logger.info("Exporting encoder...")
+        _onnx_export(
+            encoder,
+            (input_ids, attention_mask),
+            os.path.join(output_dir, "encoder.onnx"),
+            ["input_ids", "attention_mask"],
+            ["encoder_hidden_states"],
+            {
+                "input_ids": {0: "batch", 1: "encoder_length"},
+                "attention_mask": {0: "batch", 1: "encoder_length"},
+                "encoder_hidden_states": {0: "batch", 1: "encoder_length"},
+            }
+        )
+
+        decoder_init = _DecoderInitWrapper(model).eval()
+        init_outputs = decoder_init(decoder_input_ids, attention_mask, encoder_hidden_states)
+        present_names = _past_names(num_layers, "present")
+        past_axes = {}
+        for name in present_names:
+            past_axes[name] = {0: "batch", 2: "encoder_length" if ".cross." in name else "decoder_length"}
+        logger.info("Exporting first-step decoder...")
+        _onnx_export(
+            decoder_init,
+            (decoder_input_ids, attention_mask, encoder_hidden_states),
+            os.path.join(output_dir, "decoder_init.onnx"),
+            ["decoder_input_ids", "encoder_attention_mask", "encoder_hidden_states"],
+            ["logits"] + present_names,
+            dict({
+                "decoder_input_ids": {0: "batch"},
+                "encoder_attention_mask": {0: "batch", 1: "encoder_length"},
+                "encoder_hidden_states": {0: "batch", 1: "encoder_length"},
+                "logits": {0: "batch"},
+            }, **past_axes)
+        )
+
+        decoder_with_past = _DecoderWithPastWrapper(model).eval()
+        past_names = _past_names(num_layers, "past")
+        self_present_names = [name for i, name in enumerate(present_names) if i % 4 < 2]
+        past_axes = {}
+        for name in past_names:
+            past_axes[name] = {0: "batch", 2: "encoder_length" if ".cross." in name else "past_length"}
+        for name in self_present_names:
+            past_axes[name] = {0: "batch", 2: "decoder_length"}
+        logger.info("Exporting cached-step decoder...")
+        _onnx_export(
+            decoder_with_past,
+            (decoder_input_ids, attention_mask, encoder_hidden_states) + tuple(init_outputs[1:]),
+            os.path.join(output_dir, "decoder_with_past.onnx"),
+            ["decoder_input_ids", "encoder_attention_mask", "encoder_hidden_states"] + past_names,
+            ["logits"] + self_present_names,
+            dict({
+                "decoder_input_ids": {0: "batch"},
+                "encoder_attention_mask": {0: "batch", 1: "encoder_length"},
+                "encoder_hidden_states": {0: "batch", 1: "encoder_length"},
+                "logits": {0: "batch"},
+            }, **past_axes)
+        )
+
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w") as f:
+        json.dump({
+            "num_layers": num_layers,
+            "decoder_start_token_id": config.decoder_start_token_id,
+            "pad_token_id": config.pad_token_id,
+            "eos_token_id": config.eos_token_id,
+        }, f, indent=2)
+    logger.info(f"ONNX graphs written to {output_dir}")
+
+
+class OnnxBackend:
+    """Encoder/decoder graphs on ONNX Runtime's CPU provider with a KV-cached sampling loop"""
+
+    name = "onnx"
+
+    def __init__(self, onnx_dir, num_threads=None):
+        import onnxruntime
+
+        with open(os.path.join(onnx_dir, ONNX_CONFIG_FILE)) as f:
+            config = json.load(f)
+        self.num_layers = config["num_layers"]
+        self.decoder_start_token_id = config["decoder_start_token_id"]
+        self.pad_token_id = config["pad_token_id"]
+        self.eos_token_id = config["eos_token_id"]
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        def session(name):
+            return onnxruntime.InferenceSession(
+                os.path.join(onnx_dir, name), options, providers=["CPUExecutionProvider"]
+            )
+
+        self.encoder = session("encoder.onnx")
+        self.decoder_init = session("decoder_init.onnx")
+        self.decoder_with_past = session("decoder_with_past.onnx")
+        self.past_names = _past_names(self.num_layers, "past")
+
+    def generate(self, input_ids, attention_mask, max_length, logits_processor, stopping_criteria=None, streamer=None):
+        # Same order as model.generate: built-in processors first, then the ones passed in
+        processors = LogitsProcessorList([NoRepeatNGramLogitsProcessor(NO_REPEAT_NGRAM_SIZE)] + list(logits_processor))
+        attention_mask_np = attention_mask.numpy()
+        encoder_hidden_states = self.encoder.run(None, {
+            "input_ids": input_ids.numpy(),
+            "attention_mask": attention_mask_np,
+        })[0]
+
+        batch_size = input_ids.shape[0]
+        decoder_input_ids = torch.full((batch_size, 1), self.decoder_start_token_id, dtype=torch.long)
+        unfinished = torch.ones(batch_size, dtype=torch.long)
+        self_past = None
+        cross_past = None
+        if streamer is not None:
+            streamer.put(decoder_input_ids)
+
+        while decoder_input_ids.shape[1] < max_length:
+            feeds = {
+                "decoder_input_ids": decoder_input_ids[:, -1:].numpy(),
+                "encoder_attention_mask": attention_mask_np,
+                "encoder_hidden_states": encoder_hidden_states,
+            }
+            if self_past is None:
+                outputs = self.decoder_init.run(None, feeds)
+                present = outputs[1:]
+                self_past = [t for i, t in enumerate(present) if i % 4 < 2]
+                cross_past = [t for i, t in enumerate(present) if i % 4 >= 2]
+            else:
+                for layer in range(self.num_layers):
+                    feeds[self.past_names[4 * layer]] = self_past[2 * layer]
+                    feeds[self.past_names[4 * layer + 1]] = self_past[2 * layer + 1]
+                    feeds[self.past_names[4 * layer + 2]] = cross_past[2 * layer]
+                    feeds[self.past_names[4 * layer + 3]] = cross_past[2 * layer + 1]
+                outputs = self.decoder_with_past.run(None, feeds)
+                self_past = outputs[1:]
+
+            scores = processors(decoder_input_ids, torch.from_numpy(outputs[0]).float())
+            probs = torch.nn.functional.softmax(scores, dim=-1)
+            next_tokens = torch.multinomial(probs, num_samples=1).squeeze(1)
+            # Finished rows keep emitting padding
+            next_tokens = next_tokens * unfinished + self.pad_token_id * (1 - unfinished)
+            decoder_input_ids = torch.cat([decoder_input_ids, next_tokens[:, None]], dim=-1)
+            unfinished = unfinished * (next_tokens != self.eos_token_id).long()
+            if streamer is not None:
+                streamer.put(next_tokens)
+
+            if unfinished.max() == 0:
+                break
+            if stopping_criteria is not None and stopping_criteria(decoder_input_ids, scores):
+                break
+
+        if streamer is not None:
+            streamer.end()
+        return decoder_input_ids
+
+
+def create_backend(name, model=None, onnx_dir=None):
+    """Build the backend called name; eager and compiled wrap model, onnx loads graphs from onnx_dir"""
+    if name == "eager":
+        return EagerBackend(model)
+    if name == "compiled":
+        return CompiledBackend(model)
+    if name == "onnx":
+        return OnnxBackend(onnx_dir)
+    raise ValueError(f"Unknown backend {name!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the T5 model to ONNX for the onnx inference backend')
+    parser.add_argument('--model_path', type=str, default=os.getenv("T5_MODEL_PATH", "E:/MegaProject/Text/flan-t5-base"), help='Model directory')
+    parser.add_argument('--output_dir', type=str, default=None, help='Where to write the graphs (default: <model_path>/onnx)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from transformers import AutoModelForSeq2SeqLM
+    model = AutoModelForSeq2SeqLM.from_pretrained(args.model_path)
+    export_onnx(model, args.output_dir or os.path.join(args.model_path, "onnx"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Micro-batching scheduler that groups concurrent /generate calls into padded batches"""
+import asyncio
+import logging
+import math
+import threading
+from collections import deque
+
+from t5_executor import DeadlineExceededError, InferenceExecutor, QueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    def __init__(self, request, future, enqueued_at, key, deadline):
+        self.request = request
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.key = key
+        self.deadline = deadline
+
+
+def max_length_key(request):
+    """Requests are compatible when they decode to the same max_length"""
+    return request.max_length
+
+
+class MicroBatchScheduler:
+    """Collect requests for a short window and run compatible ones as one batch.
+
+    `run_batch(requests, cancel_event)` receives a list of requests and must
+    return one result per request, in order. `cancel_event` is set once every
+    caller in the batch has gone away, so a long decode can stop early. Up to
+    `max_concurrent_batches` batches run at once on the inference executor
+    (one unless inference is spread over worker processes), so while they are
+    decoding, new arrivals queue up and form the next batch.
+
+    At most `max_queue_depth` requests wait at once; beyond that `submit`
+    raises QueueFullError so the caller can shed load instead of piling up.
+    """
+
+    def __init__(self, run_batch, window_ms=10, max_batch_size=8, batch_key=max_length_key,
+                 max_queue_depth=64, executor=None, max_concurrent_batches=1):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_concurrent_batches < 1:
+            raise ValueError("max_concurrent_batches must be at least 1")
+        self.run_batch = run_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.batch_key = batch_key
+        self.max_queue_depth = max_queue_depth
+        self.max_concurrent_batches = max_concurrent_batches
+        self.executor = executor or InferenceExecutor(max_workers=max_concurrent_batches)
+        self.stats = {"batches": 0, "requests": 0, "max_batch_size_seen": 0, "shed": 0, "expired": 0}
+        self._queue = deque()
+        self._wakeup = None
+        self._worker = None
+        self._slots = None
+        self._running = set()
+        self._avg_batch_seconds = None
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    async def start(self):
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"Micro-batching enabled: window={self.window * 1000:.0f}ms, max_batch_size={self.max_batch_size}, max_queue_depth={self.max_queue_depth}")
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._running):
+            task.cancel()
+        while self._queue:
+            pending = self._queue.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Scheduler stopped"))
+        self.executor.shutdown()
+
+    async def submit(self, request, timeout=None):
+        """Queue a request and wait for its result.
+
+        Raises QueueFullError if the queue is at capacity and
+        DeadlineExceededError if decoding hasn't started within `timeout` seconds.
+        """
+        group = await self._enqueue([request], None, timeout)
+        return await group[0].future
+
+    async def submit_many(self, requests, timeout=None):
+        """Queue requests that must be decoded together and wait for all results.
+
+        The requests share a batch key of their own, so they go through
+        `run_batch` as one batch (split only if there are more than
+        max_batch_size of them) even when their max_length differs.
+        """
+        group = await self._enqueue(requests, ("group", object()), timeout)
+        try:
+            return await asyncio.gather(*(p.future for p in group))
+        except asyncio.CancelledError:
+            for pending in group:
+                pending.future.cancel()
+            raise
+
+    def retry_after(self):
+        """Seconds until the current queue has likely drained, for Retry-After headers"""
+        batch_seconds = self._avg_batch_seconds or 1.0
+        batches_ahead = math.ceil(len(self._queue) / self.max_batch_size) + 1
+        return max(1, math.ceil(batch_seconds * batches_ahead / self.max_concurrent_batches))
+
+    async def _enqueue(self, requests, group_key, timeout):
+        if self._worker is None:
+            await self.start()
+        if len(self._queue) + len(requests) > self.max_queue_depth:
+            self.stats["shed"] += len(requests)
+            raise QueueFullError(self.retry_after())
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        deadline = now + timeout if timeout else None
+        group = [
+            _PendingRequest(r, loop.create_future(), now, group_key or self.batch_key(r), deadline)
+            for r in requests
+        ]
+        self._queue.extend(group)
+        self._wakeup.set()
+        return group
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Wait for a free slot first, so requests arriving meanwhile join the next batch
+            await self._slots.acquire()
+            try:
+                # Give concurrent callers until the oldest request's window closes to join the batch
+                remaining = self._queue[0].enqueued_at + self.window - loop.time() if self._queue else 0
+                while remaining > 0 and len(self._queue) < self.max_batch_size:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    remaining = self._queue[0].enqueued_at + self.window - loop.time()
+
+                batch = self._take_batch(loop.time())
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["requests"] += len(batch)
+            self.stats["max_batch_size_seen"] = max(self.stats["max_batch_size_seen"], len(batch))
+            logger.info(f"Running batch of {len(batch)} request(s), {len(self._queue)} still queued")
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            # Stop decoding early once nobody is waiting for this batch any more
+            cancel_event = threading.Event()
+
+            def cancel_if_abandoned(_):
+                if all(p.future.done() for p in batch):
+                    cancel_event.set()
+
+            for pending in batch:
+                pending.future.add_done_callback(cancel_if_abandoned)
+
+            started = loop.time()
+            try:
+                results = await self.executor.run(self.run_batch, [p.request for p in batch], cancel_event)
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                return
+            finally:
+                elapsed = loop.time() - started
+                if self._avg_batch_seconds is None:
+                    self._avg_batch_seconds = elapsed
+                else:
+                    self._avg_batch_seconds = 0.8 * self._avg_batch_seconds + 0.2 * elapsed
+
+            for pending, result in zip(batch, results):
+                if not pending.future.done():
+                    pending.future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def _take_batch(self, now):
+        """Remove the oldest request plus queued requests compatible with it, up to max_batch_size"""
+        batch = []
+        remaining = deque()
+        key = None
+        while self._queue:
+            pending = self._queue.popleft()
+            # Callers that went away while queued don't need a slot in the batch
+            if pending.future.done():
+                continue
+            if pending.deadline is not None and now > pending.deadline:
+                self.stats["expired"] += 1
+                pending.future.set_exception(DeadlineExceededError("Request deadline passed before inference started"))
+                continue
+            if key is None:
+                key = pending.key
+            if len(batch) < self.max_batch_size and pending.key == key:
+                batch.append(pending)
+            else:
+                remaining.append(pending)
+        self._queue = remaining
+        return batch
@@ -0,0 +1,306 @@
+"""Content-addressed cache for T5 generations with in-flight request coalescing"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+
+from t5_generation import preprocess_prompt
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(request):
+    """Hash of the normalized prompt, the generation parameters and the seed"""
+    normalized_prompt = " ".join(preprocess_prompt(request.prompt).split())
+    payload = json.dumps({
+        "prompt": normalized_prompt,
+        "max_length": request.max_length,
+        "temperature": request.temperature,
+        "top_p": request.top_p,
+        "seed": getattr(request, "seed", None),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _InFlight:
+    """A generation that callers with the same key can wait on"""
+
+    def __init__(self, future, producer):
+        self.future = future
+        self.producer = producer
+        self.waiters = 0
+
+
+class _Producer:
+    """The task generating one or more in-flight entries"""
+
+    def __init__(self):
+        self.task = None
+        self.entries = []
+
+    def release(self):
+        # Nobody is waiting for any of the results any more, stop the generation.
+        # Once every result is out the task is only writing them to disk, let it finish.
+        if (self.task is not None and not self.task.done() and all(e.waiters == 0 for e in self.entries)
+                and not all(e.future.done() for e in self.entries)):
+            self.task.cancel()
+
+
+class GenerationCache:
+    """Two-tier cache of generated texts: an in-memory LRU in front of a size-capped directory.
+
+    Identical prompts that arrive while one is already being generated wait
+    for that generation instead of starting their own.
+    """
+
+    def __init__(self, max_entries=1024, cache_dir=None, max_disk_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0,
+                      "evictions": 0, "disk_evictions": 0}
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()  # key -> file size, least recently used first
+        self._disk_bytes = 0
+        self._inflight = {}
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".txt"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        logger.info(f"Generation cache: {len(self._disk)} entries ({self._disk_bytes} bytes) on disk in {self.cache_dir}")
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def get(self, key):
+        """Return the cached text for key, or None"""
+        text = self._get_memory(key)
+        if text is None and key in self._disk:
+            text = self._disk_loaded(key, self._read_disk_file(key))
+        return text
+
+    async def aget(self, key):
+        """get for the event loop: the disk tier is read in a worker thread"""
+        text = self._get_memory(key)
+        if text is None and key in self._disk:
+            text = self._disk_loaded(key, await asyncio.to_thread(self._read_disk_file, key))
+        return text
+
+    def put(self, key, text):
+        self._remember(key, text)
+        if self.cache_dir:
+            self._remove_disk_files(self._disk_written(key, self._write_disk_file(key, text)))
+
+    async def aput(self, key, text):
+        """put for the event loop: the disk tier is written in a worker thread"""
+        self._remember(key, text)
+        if self.cache_dir:
+            await self._write_disk_entries([(key, text)])
+
+    def _get_memory(self, key):
+        if key not in self._memory:
+            return None
+        self._memory.move_to_end(key)
+        self.stats["hits"] += 1
+        return self._memory[key]
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # The file operations below block and may run in a worker thread, so they
+    # leave the disk index alone; _disk_loaded and _disk_written update it on
+    # the caller's thread.
+
+    def _read_disk_file(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return text
+
+    def _write_disk_file(self, key, text):
+        """Size of the file written for key, or None if it could not be written"""
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            data = text.encode("utf-8")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write generation cache entry {key}: {str(e)}")
+            return None
+        return len(data)
+
+    def _remove_disk_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _disk_loaded(self, key, text):
+        if text is None:
+            # The file is gone
+            self._forget_disk_entry(key)
+            return None
+        if key in self._disk:
+            self._disk.move_to_end(key)
+        self.stats["hits"] += 1
+        self.stats["disk_hits"] += 1
+        self._remember(key, text)
+        return text
+
+    def _disk_written(self, key, size):
+        """Index a written entry, returning the keys evicted to stay under max_disk_bytes"""
+        if size is None:
+            return []
+        self._forget_disk_entry(key)
+        self._disk[key] = size
+        self._disk_bytes += size
+        evicted = []
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            oldest = next(iter(self._disk))
+            self._forget_disk_entry(oldest)
+            evicted.append(oldest)
+            self.stats["disk_evictions"] += 1
+        return evicted
+
+    def _forget_disk_entry(self, key):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    async def _write_disk_entries(self, items):
+        sizes = await asyncio.to_thread(lambda: [self._write_disk_file(key, text) for key, text in items])
+        evicted = []
+        for (key, _), size in zip(items, sizes):
+            evicted += self._disk_written(key, size)
+        if evicted:
+            await asyncio.to_thread(self._remove_disk_files, evicted)
+
+    async def get_or_generate(self, keys, generate):
+        """Return one text per key, generating only what is neither cached nor in flight.
+
+        A key of None bypasses the cache for that item. `generate(indices)` is
+        awaited once with the positions that need a new generation and must
+        return their texts in the same order. If every caller waiting on a
+        generation goes away, the generation is cancelled.
+
+        Keys found only on disk are registered as in flight like the ones to
+        generate, so identical requests still coalesce while the file is read
+        in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        results = [None] * len(keys)
+        entries = [None] * len(keys)
+        producer = _Producer()
+        missing = []
+
+        for i, key in enumerate(keys):
+            if key is not None:
+                text = self._get_memory(key)
+                if text is not None:
+                    results[i] = text
+                    continue
+                if key in self._inflight:
+                    self.stats["coalesced"] += 1
+                    entries[i] = self._inflight[key]
+                    continue
+                if key not in self._disk:
+                    self.stats["misses"] += 1
+            else:
+                self.stats["bypassed"] += 1
+
+            entry = _InFlight(loop.create_future(), producer)
+            producer.entries.append(entry)
+            if key is not None:
+                self._inflight[key] = entry
+            entries[i] = entry
+            missing.append((i, key, entry))
+
+        if missing:
+            producer.task = asyncio.create_task(self._produce(generate, missing))
+
+        waiting = [(i, entry) for i, entry in enumerate(entries) if entry is not None]
+        for _, entry in waiting:
+            entry.waiters += 1
+        try:
+            texts = await asyncio.gather(*(asyncio.shield(entry.future) for _, entry in waiting))
+        finally:
+            for _, entry in waiting:
+                entry.waiters -= 1
+                if entry.waiters == 0:
+                    entry.producer.release()
+
+        for (i, _), text in zip(waiting, texts):
+            results[i] = text
+        return results
+
+    async def _produce(self, generate, missing):
+        try:
+            missing = await self._load_from_disk(missing)
+            texts = await generate([i for i, _, _ in missing]) if missing else []
+        except BaseException as e:
+            for _, key, entry in missing:
+                if key is not None and self._inflight.get(key) is entry:
+                    del self._inflight[key]
+                if not entry.future.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        entry.future.cancel()
+                    else:
+                        entry.future.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+
+        for (_, key, entry), text in zip(missing, texts):
+            if key is not None:
+                self._remember(key, text)
+            self._resolve(key, entry, text)
+
+        # Waiters have their texts already, the disk write doesn't hold them up
+        if self.cache_dir:
+            await self._write_disk_entries([(key, text) for (_, key, _), text in zip(missing, texts) if key is not None])
+
+    async def _load_from_disk(self, missing):
+        """Resolve the entries found on disk, returning the ones still to generate"""
+        on_disk = [(i, key, entry) for i, key, entry in missing if key is not None and key in self._disk]
+        if not on_disk:
+            return missing
+        texts = await asyncio.to_thread(lambda: [self._read_disk_file(key) for _, key, _ in on_disk])
+
+        found = set()
+        for (i, key, entry), text in zip(on_disk, texts):
+            if self._disk_loaded(key, text) is None:
+                self.stats["misses"] += 1
+                continue
+            self._resolve(key, entry, text)
+            found.add(i)
+        return [item for item in missing if item[0] not in found]
+
+    def _resolve(self, key, entry, text):
+        if key is not None and self._inflight.get(key) is entry:
+            del self._inflight[key]
+        if not entry.future.done():
+            entry.future.set_result(text)
@@ -0,0 +1,41 @@
+"""Dedicated thread for T5 inference so model.generate never blocks the asyncio event loop"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue is at capacity and a request is shed"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Inference queue is full, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request is still waiting for inference after its deadline"""
+
+
+class InferenceExecutor:
+    """Single worker thread that runs inference calls one after another.
+
+    One generate call already uses every core through torch's intra-op threads,
+    so running two side by side only makes both slower. Keeping inference on its
+    own thread (instead of the event loop or the shared default executor) leaves
+    the loop free for rate-limit rejections, health probes and new requests.
+    With worker processes, each on its own cores, use one thread per worker.
+    """
+
+    def __init__(self, name="t5-inference", max_workers=1):
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the inference thread and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, fn, *args)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
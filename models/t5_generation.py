@@ -0,0 +1,202 @@
+"""Batched T5 text generation with per-request sampling parameters"""
+import time
+
+import torch
+from transformers import LogitsProcessor, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+
+# transformers' default top_k, applied per row by BatchedSamplingWarper
+TOP_K = 50
+DEFAULT_MAX_LENGTH = 20  # What model.generate falls back to when max_length is not given
+MAX_INPUT_LENGTH = 512
+NO_REPEAT_NGRAM_SIZE = 3  # Avoid repetition
+
+
+class GenerationParams:
+    """Prompt and sampling parameters, for callers that don't go through the HTTP request models.
+
+    A `streamer` (see TextChunkStreamer) receives the tokens of this request as they are decoded.
+    """
+
+    def __init__(self, prompt, max_length=100, temperature=0.6, top_p=0.8, seed=None, streamer=None):
+        self.prompt = prompt
+        self.max_length = max_length
+        self.temperature = temperature
+        self.top_p = top_p
+        self.seed = seed
+        self.streamer = streamer
+
+
+def preprocess_prompt(prompt):
+    """Flatten newlines and bullet points the same way the /generate endpoint always has"""
+    return prompt.replace('\n', ' ').replace('- ', ', ').strip()
+
+
+def postprocess_text(text):
+    """Fix spacing before punctuation and collapse whitespace in generated text"""
+    text = text.replace(" .", ".").replace(" ,", ",")
+    return " ".join(text.split())
+
+
+class BatchedSamplingWarper(LogitsProcessor):
+    """Temperature, top-k and top-p warping with a separate temperature and top_p per batch row.
+
+    `model.generate` only accepts one temperature/top_p for the whole batch, so the
+    built-in warpers are disabled and this processor reproduces them row by row,
+    in the same order transformers applies them (temperature, top-k, top-p).
+    """
+
+    def __init__(self, temperatures, top_ps, top_k=TOP_K):
+        if any(t <= 0 for t in temperatures):
+            raise ValueError(f"temperature must be strictly positive, got {temperatures}")
+        self.temperatures = torch.tensor(temperatures, dtype=torch.float32).unsqueeze(1)
+        self.top_ps = torch.tensor(top_ps, dtype=torch.float32).unsqueeze(1)
+        self.top_k = top_k
+
+    def __call__(self, input_ids, scores):
+        filter_value = -float("inf")
+        # Warp in fp32 even when the model runs in bf16, so top-p sees the same probabilities
+        scores = scores.float() / self.temperatures.to(scores.device)
+
+        # Top-k: keep the k highest scoring tokens of every row
+        if self.top_k:
+            top_k = min(self.top_k, scores.size(-1))
+            kth_score = torch.topk(scores, top_k)[0][..., -1, None]
+            scores = scores.masked_fill(scores < kth_score, filter_value)
+
+        # Top-p: drop the low-probability tail whose cumulative mass is <= 1 - top_p
+        sorted_logits, sorted_indices = torch.sort(scores, descending=False)
+        cumulative_probs = sorted_logits.softmax(dim=-1).cumsum(dim=-1)
+        sorted_indices_to_remove = cumulative_probs <= (1 - self.top_ps.to(scores.device))
+        sorted_indices_to_remove[..., -1:] = False  # Always keep the most likely token
+        indices_to_remove = sorted_indices_to_remove.scatter(1, sorted_indices, sorted_indices_to_remove)
+        return scores.masked_fill(indices_to_remove, filter_value)
+
+
+class TextChunkStreamer(BaseStreamer):
+    """Turns tokens from a single-row decode into chunks of cleaned text.
+
+    Only text up to the last space is passed to `on_text`, because
+    postprocess_text may still rewrite the word being decoded (a following
+    " ." or " ," is glued onto it). The rest is flushed when decoding ends, so
+    the chunks add up to the cleaned text of the whole generation. Runs on the
+    inference thread; `on_text` must be safe to call from there.
+    """
+
+    def __init__(self, tokenizer, on_text):
+        self.tokenizer = tokenizer
+        self.on_text = on_text
+        self.token_ids = []
+        self.text = ""  # Everything passed to on_text so far
+        self.tokens = 0
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+
+    @property
+    def tokens_per_second(self):
+        if self.finished_at is None or self.tokens == 0:
+            return None
+        elapsed = self.finished_at - self.started_at
+        return self.tokens / elapsed if elapsed > 0 else None
+
+    def put(self, value):
+        if self.started_at is None:
+            # The first call carries the decoder start token, not generated output
+            self.started_at = time.perf_counter()
+            return
+        self.token_ids.extend(value.reshape(-1).tolist())
+        self.tokens += value.numel()
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+        text = self._cleaned_text()
+        if text.endswith("\ufffd"):
+            return  # Incomplete multi-byte character, wait for the next token
+        self._emit(text[:text.rfind(" ") + 1])
+
+    def end(self):
+        self._emit(self._cleaned_text())
+        self.finished_at = time.perf_counter()
+
+    def _cleaned_text(self):
+        return postprocess_text(self.tokenizer.decode(self.token_ids, skip_special_tokens=True))
+
+    def _emit(self, text):
+        # Only ever append: if cleanup rewrote text already sent, hold back until the end
+        if len(text) > len(self.text) and text.startswith(self.text):
+            chunk = text[len(self.text):]
+            self.text = text
+            self.on_text(chunk)
+
+
+class CancelledCriteria(StoppingCriteria):
+    """Stop decoding as soon as the given threading.Event is set"""
+
+    def __init__(self, cancel_event):
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.cancel_event.is_set()
+
+
+def generate_batch(backend, tokenizer, requests, cancel_event=None):
+    """Generate text for several requests in one padded call to the inference backend.
+
+    Each request keeps its own max_length, temperature and top_p. The batch is
+    decoded up to the longest max_length and every row is cut back to its own
+    limit, so no row comes back longer than it asked for. Unseeded rows share
+    one random stream, so their sampled tokens depend on the rest of the batch.
+    Requests with a `seed` are decoded on their own, so their output depends on
+    the seed only and not on what else was in the batch. So are requests with
+    a `streamer`, which only follows a single row.
+    Setting `cancel_event` stops the decode at the next step.
+    """
+    results = [None] * len(requests)
+    unseeded = [
+        i for i, r in enumerate(requests)
+        if getattr(r, "seed", None) is None and getattr(r, "streamer", None) is None
+    ]
+    if unseeded:
+        texts = _generate_rows(backend, tokenizer, [requests[i] for i in unseeded], cancel_event)
+        for i, text in zip(unseeded, texts):
+            results[i] = text
+
+    for i, r in enumerate(requests):
+        if results[i] is None:
+            streamer = getattr(r, "streamer", None)
+            if getattr(r, "seed", None) is None:
+                results[i] = _generate_rows(backend, tokenizer, [r], cancel_event, streamer)[0]
+                continue
+            # Fork the RNG so a seeded request doesn't reset the sampling of later ones
+            with torch.random.fork_rng(devices=[]):
+                torch.manual_seed(r.seed)
+                results[i] = _generate_rows(backend, tokenizer, [r], cancel_event, streamer)[0]
+    return results
+
+
+def _generate_rows(backend, tokenizer, requests, cancel_event, streamer=None):
+    max_lengths = [r.max_length or DEFAULT_MAX_LENGTH for r in requests]
+    temperatures = [r.temperature if r.temperature is not None else 1.0 for r in requests]
+    top_ps = [r.top_p if r.top_p is not None else 1.0 for r in requests]
+
+    prompts = [preprocess_prompt(r.prompt) for r in requests]
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True, truncation=True, max_length=MAX_INPUT_LENGTH)
+
+    logits_processor = LogitsProcessorList([BatchedSamplingWarper(temperatures, top_ps)])
+    stopping_criteria = StoppingCriteriaList([CancelledCriteria(cancel_event)]) if cancel_event is not None else None
+
+    with torch.no_grad():
+        outputs = backend.generate(
+            inputs["input_ids"],
+            inputs["attention_mask"],
+            max(max_lengths),
+            logits_processor,
+            stopping_criteria,
+            streamer
+        )
+
+    return [
+        postprocess_text(tokenizer.decode(output[:max_length], skip_special_tokens=True))
+        for output, max_length in zip(outputs, max_lengths)
+    ]
@@ -0,0 +1,233 @@
+"""Background loading of the T5 model so the server can bind its port before the weights are in memory"""
+import logging
+import os
+import sys
+import threading
+import time
+
+import torch
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+from t5_backends import BACKENDS, OnnxBackend, create_backend, export_onnx
+from t5_generation import GenerationParams, generate_batch
+from t5_workers import WorkerPool
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+WARMUP_PROMPT = "Generate a brief description of a luxury hotel"
+PRECISIONS = ("fp32", "int8", "bf16")
+
+
+class ModelNotReadyError(Exception):
+    """Raised when a generation is requested before the model has finished loading"""
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if it can't be measured"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024)
+    return None
+
+
+def bf16_supported():
+    """Whether this CPU has native bfloat16 kernels (AVX512-BF16 / AMX); without them bf16 is slower than fp32"""
+    try:
+        return torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def apply_precision(model, precision):
+    """Convert a loaded fp32 model for CPU inference and return (model, effective precision)"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {', '.join(PRECISIONS)}")
+
+    if precision == "int8":
+        # Dynamic quantization: Linear weights stored as int8, activations quantized on the fly
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif precision == "bf16":
+        if bf16_supported():
+            model = model.to(torch.bfloat16)
+        else:
+            logger.warning("This CPU has no native bfloat16 support, serving the model in fp32")
+            precision = "fp32"
+    return model, precision
+
+
+def load_model(model_path, precision="fp32"):
+    """Load tokenizer and model, memory-mapping safetensors weights when the checkpoint has them.
+
+    Returns (model, tokenizer, precision), where precision is what the model
+    actually runs in after apply_precision.
+    """
+    use_safetensors = os.path.exists(os.path.join(model_path, "model.safetensors"))
+    if not use_safetensors:
+        logger.warning(f"No model.safetensors in {model_path}; loading pickled weights, which reads the whole file into memory")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSeq2SeqLM.from_pretrained(
+        model_path,
+        use_safetensors=use_safetensors,
+        low_cpu_mem_usage=True  # Build the model on the meta device and fill in weights once, no random init copy
+    )
+    model.eval()
+    model, precision = apply_precision(model, precision)
+    logger.info(f"Serving the model in {precision}")
+    return model, tokenizer, precision
+
+
+def load_backend(model_path, backend="eager", precision="fp32", onnx_dir=None):
+    """Load the tokenizer and the named inference backend.
+
+    Returns (backend, tokenizer, precision). The onnx backend exports the
+    graphs to onnx_dir (default <model_path>/onnx) the first time and always
+    runs in fp32.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    if backend != "onnx":
+        model, tokenizer, precision = load_model(model_path, precision)
+        return create_backend(backend, model=model), tokenizer, precision
+
+    if precision != "fp32":
+        logger.warning(f"The onnx backend runs the exported fp32 graphs, ignoring precision {precision}")
+    onnx_dir = ensure_onnx_export(model_path, onnx_dir)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    return OnnxBackend(onnx_dir), tokenizer, "fp32"
+
+
+def ensure_onnx_export(model_path, onnx_dir=None):
+    """Export the ONNX graphs unless onnx_dir (default <model_path>/onnx) already has them; returns onnx_dir"""
+    onnx_dir = onnx_dir or os.path.join(model_path, "onnx")
+    if not os.path.exists(os.path.join(onnx_dir, "decoder_with_past.onnx")):
+        logger.info(f"No ONNX graphs in {onnx_dir}, exporting them from {model_path}...")
+        model, _, _ = load_model(model_path)
+        export_onnx(model, onnx_dir)
+        del model
+    return onnx_dir
+
+
+class ModelLoader:
+    """Loads the model on a background thread and tracks whether it is ready to serve"""
+
+    def __init__(self, model_path, warmup=True, precision="fp32", backend="eager", onnx_dir=None,
+                 workers=1, worker_threads=None):
+        self.model_path = model_path
+        self.warmup = warmup
+        self.precision = precision
+        self.backend_name = backend
+        self.onnx_dir = onnx_dir
+        self.workers = workers
+        self.worker_threads = worker_threads
+        self.state = "not_loaded"
+        self.error = None
+        self.backend = None
+        self.pool = None  # WorkerPool when serving from worker processes
+        self.tokenizer = None
+        self.load_seconds = None
+        self._thread = None
+
+    @property
+    def is_ready(self):
+        return self.state == "ready"
+
+    def start(self):
+        if self._thread is None:
+            self.state = "loading"
+            self._thread = threading.Thread(target=self._load, name="t5-model-loader", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until loading has finished, successfully or not"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.is_ready
+
+    def ensure_ready(self):
+        if not self.is_ready:
+            if self.state == "failed":
+                raise ModelNotReadyError(f"Model failed to load: {self.error}")
+            raise ModelNotReadyError("Model is still loading")
+
+    def run_batch(self, requests, cancel_event=None):
+        """generate_batch on the loaded backend, or on a worker process when there are several"""
+        if self.pool is not None:
+            return self.pool.run_batch(requests, cancel_event)
+        return generate_batch(self.backend, self.tokenizer, requests, cancel_event)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            if self.workers > 1:
+                self._start_workers()
+                self.load_seconds = time.perf_counter() - start
+                self.state = "ready"
+                logger.info(f"{self.workers} workers ready: cold start {self.load_seconds:.2f}s")
+                return
+
+            logger.info(f"Loading model and tokenizer from {self.model_path} ({self.backend_name} backend)...")
+            backend, tokenizer, self.precision = load_backend(
+                self.model_path, self.backend_name, self.precision, self.onnx_dir
+            )
+            loaded = time.perf_counter()
+            logger.info(f"Model and tokenizer loaded in {loaded - start:.2f}s")
+
+            if self.warmup:
+                # One short generation so the first real request doesn't pay for lazy initialisation
+                # (and, with the compiled backend, for compilation)
+                generate_batch(backend, tokenizer, [GenerationParams(WARMUP_PROMPT, max_length=8)])
+                logger.info(f"Warm-up generation took {time.perf_counter() - loaded:.2f}s")
+
+            self.backend, self.tokenizer = backend, tokenizer
+            self.load_seconds = time.perf_counter() - start
+            self.state = "ready"
+
+            peak = peak_rss_mb()
+            peak_text = f"{peak:.0f} MB" if peak is not None else "unavailable"
+            logger.info(f"Model ready: cold start {self.load_seconds:.2f}s, peak RSS {peak_text}")
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            logger.error(f"Error loading model: {str(e)}")
+
+    def _start_workers(self):
+        # The parent loads the weights once; workers share them and build their own backend
+        logger.info(f"Loading model and tokenizer from {self.model_path} for {self.workers} workers ({self.backend_name} backend)...")
+        if self.backend_name == "onnx":
+            model, onnx_dir = None, ensure_onnx_export(self.model_path, self.onnx_dir)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+            self.precision = "fp32"
+        else:
+            if self.backend_name not in BACKENDS:
+                raise ValueError(f"Unknown backend {self.backend_name!r}, expected one of {', '.join(BACKENDS)}")
+            quantize = self.precision == "int8"
+            model, tokenizer, precision = load_model(self.model_path, "fp32" if quantize else self.precision)
+            self.precision = "int8" if quantize else precision
+            onnx_dir = None
+        pool = WorkerPool(model, tokenizer, self.backend_name, onnx_dir, self.workers, self.worker_threads,
+                          quantize=self.backend_name != "onnx" and self.precision == "int8")
+        try:
+            pool.start()
+        except Exception:
+            pool.shutdown()
+            raise
+        self.pool, self.tokenizer = pool, tokenizer
@@ -1,16 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
-import torch
+import asyncio
 import time
-from typing import Optional
+from typing import Dict, Optional, Union
 import logging
-import requests
-import base64
-from PIL import Image
-import io
 import json
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from t5_batching import MicroBatchScheduler
+from t5_cache import GenerationCache, cache_key
+from t5_executor import DeadlineExceededError, QueueFullError
+from t5_generation import GenerationParams, TextChunkStreamer
+from t5_model import ModelLoader, ModelNotReadyError
+from rate_limiter import RateLimiter, RateLimiterUnavailable, RateLimitExceeded, client_id
+from sd_client import SDClient
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,50 +24,160 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# Model configuration
+MODEL_PATH = os.getenv("T5_MODEL_PATH", "E:/MegaProject/Text/flan-t5-base")
+WARMUP = os.getenv("T5_WARMUP", "1") == "1"  # Run one short generation before reporting ready
+PRECISION = os.getenv("T5_PRECISION", "fp32")  # fp32, int8 (dynamic quantization) or bf16
+BACKEND = os.getenv("T5_BACKEND", "eager")  # eager, compiled (torch.compile) or onnx (ONNX Runtime)
+ONNX_DIR = os.getenv("T5_ONNX_DIR") or None  # Exported graphs, defaults to <T5_MODEL_PATH>/onnx
+
+# Multi-process configuration
+WORKERS = int(os.getenv("T5_WORKERS", "1"))  # Above 1, worker processes share one copy of the weights
+WORKER_THREADS = int(os.getenv("T5_WORKER_THREADS", "0")) or None  # torch threads per worker, default its share of the cores
+
 # Rate limiting configuration
 RATE_LIMIT_WINDOW = 60  # 1 minute in seconds
-MAX_REQUESTS_PER_WINDOW = 10  # Allow 10 requests per minute
-request_timestamps = []
+MAX_REQUESTS_PER_WINDOW = int(os.getenv("T5_MAX_REQUESTS_PER_WINDOW", "10"))  # Allow 10 requests per minute per client
+# Buckets are shared through RATE_LIMIT_DB, so the limit holds across worker processes
+rate_limiter = RateLimiter("t5_server", MAX_REQUESTS_PER_WINDOW, RATE_LIMIT_WINDOW)
+
+# Micro-batching configuration
+BATCH_WINDOW_MS = float(os.getenv("T5_BATCH_WINDOW_MS", "15"))  # How long the first request waits for company
+MAX_BATCH_SIZE = int(os.getenv("T5_MAX_BATCH_SIZE", "8"))  # Set to 1 to disable batching
+
+# Load shedding configuration
+MAX_QUEUE_DEPTH = int(os.getenv("T5_MAX_QUEUE_DEPTH", "32"))  # Requests allowed to wait for inference
+REQUEST_TIMEOUT = float(os.getenv("T5_REQUEST_TIMEOUT", "120"))  # Default and maximum per-request deadline in seconds
+DISCONNECT_POLL_INTERVAL = 0.5  # How often waiting requests check whether the client is still there
+MODEL_RETRY_AFTER = 5  # Retry-After seconds while the model is still loading
+
+# Generation cache configuration
+CACHE_MAX_ENTRIES = int(os.getenv("T5_CACHE_MAX_ENTRIES", "1024"))  # In-memory LRU size
+CACHE_DIR = os.getenv("T5_CACHE_DIR", "t5_cache")  # Set to an empty string to disable the disk tier
+CACHE_MAX_DISK_MB = float(os.getenv("T5_CACHE_MAX_DISK_MB", "64"))
 
 class GenerationRequest(BaseModel):
     prompt: str
     max_length: Optional[int] = 100
     temperature: Optional[float] = 0.6
     top_p: Optional[float] = 0.8
+    seed: Optional[int] = None  # Makes sampling reproducible
+    use_cache: Optional[bool] = True  # Set to false for a fresh sample
+    timeout: Optional[float] = None  # Seconds, capped at T5_REQUEST_TIMEOUT
 
-def check_rate_limit():
-    current_time = time.time()
-    # Remove timestamps older than the window
-    while request_timestamps and current_time - request_timestamps[0] > RATE_LIMIT_WINDOW:
-        request_timestamps.pop(0)
-    
-    if len(request_timestamps) >= MAX_REQUESTS_PER_WINDOW:
-        time_until_next = request_timestamps[0] + RATE_LIMIT_WINDOW - current_time
+class BatchPrompt(BaseModel):
+    prompt: str
+    max_length: Optional[int] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    seed: Optional[int] = None
+
+class BatchGenerationRequest(BaseModel):
+    # Named prompts, either plain strings or prompts with their own parameters
+    prompts: Dict[str, Union[str, BatchPrompt]]
+    # Defaults for prompts that don't set their own parameters
+    max_length: Optional[int] = 100
+    temperature: Optional[float] = 0.6
+    top_p: Optional[float] = 0.8
+    use_cache: Optional[bool] = True  # Set to false for fresh samples
+    timeout: Optional[float] = None  # Seconds, capped at T5_REQUEST_TIMEOUT
+
+async def check_rate_limit(http_request):
+    try:
+        # SQLite may wait on other processes' locks; keep that off the event loop
+        await asyncio.to_thread(rate_limiter.acquire, client_id(http_request))
+    except RateLimitExceeded as e:
         raise HTTPException(
             status_code=429,
-            detail=f"Rate limit exceeded. Please try again in {int(time_until_next)} seconds"
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
         )
-    
-    request_timestamps.append(current_time)
+    except RateLimiterUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+# Weights load in the background once the server is up; /ready reports when they're usable
+model_loader = ModelLoader(
+    MODEL_PATH,
+    warmup=WARMUP,
+    precision=PRECISION,
+    backend=BACKEND,
+    onnx_dir=ONNX_DIR,
+    workers=WORKERS,
+    worker_threads=WORKER_THREADS
+)
 
-def load_model():
+# With several workers, one batch per worker runs at a time and each goes to the least busy worker
+scheduler = MicroBatchScheduler(
+    model_loader.run_batch,
+    window_ms=BATCH_WINDOW_MS,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_queue_depth=MAX_QUEUE_DEPTH,
+    max_concurrent_batches=WORKERS
+)
+
+generation_cache = GenerationCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    cache_dir=CACHE_DIR or None,
+    max_disk_bytes=int(CACHE_MAX_DISK_MB * 1024 * 1024)
+)
+
+@app.on_event("startup")
+async def start_scheduler():
+    model_loader.start()
+    await scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await scheduler.stop()
+    model_loader.shutdown()
+
+def request_timeout(timeout):
+    """Per-request deadline, never longer than the server-wide limit"""
+    return min(timeout, REQUEST_TIMEOUT) if timeout else REQUEST_TIMEOUT
+
+async def wait_for_inference(http_request, coro, timeout):
+    """Await an inference coroutine, cancelling it if the client disconnects or the deadline passes"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    task = asyncio.create_task(coro)
     try:
-        logger.info("Loading model and tokenizer...")
-        model_path = "E:/MegaProject/Text/flan-t5-base"
-        tokenizer = AutoTokenizer.from_pretrained(model_path)
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
-        logger.info("Model and tokenizer loaded successfully")
-        return model, tokenizer
-    except Exception as e:
-        logger.error(f"Error loading model: {str(e)}")
-        raise
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"Generation did not finish within {timeout:g} seconds")
+            done, _ = await asyncio.wait({task}, timeout=min(DISCONNECT_POLL_INTERVAL, remaining))
+            if done:
+                return task.result()
+            if http_request is not None and await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling generation")
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
 
-model, tokenizer = load_model()
+def inference_error(e):
+    """Map a scheduler or model loading error to an HTTP error"""
+    if isinstance(e, ModelNotReadyError):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(MODEL_RETRY_AFTER)})
+    if isinstance(e, QueueFullError):
+        logger.warning(f"Shedding load: {str(e)}")
+        return HTTPException(
+            status_code=503,
+            detail="Server is busy. Please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return HTTPException(status_code=504, detail=str(e))
 
-def generate_image(prompt, negative_prompt="", width=512, height=512, steps=20):
-    """Generate an image using Stable Diffusion API"""
-    url = "http://127.0.0.1:7861/sdapi/v1/txt2img"
-    
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def generate_image(prompt, negative_prompt="", width=512, height=512, steps=20):
+    """Generate an image on the least loaded Stable Diffusion backend"""
     payload = {
         "prompt": prompt,
         "negative_prompt": negative_prompt,
@@ -75,30 +191,10 @@ def generate_image(prompt, negative_prompt="", width=512, height=512, steps=20):
     
     logger.info(f"Generating image with prompt: {prompt}")
     try:
-        logger.info(f"Sending request to Stable Diffusion API at {url}")
-        response = requests.post(url, json=payload, timeout=300)  # 5 minute timeout
-        logger.info(f"Got response with status code: {response.status_code}")
-        
-        if response.status_code != 200:
-            error_msg = f"Stable Diffusion API returned status code {response.status_code}: {response.text}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
-            
-        r = response.json()
-        if 'images' not in r or not r['images']:
-            error_msg = f"No images in response. Full response: {json.dumps(r, indent=2)}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
-            
-        image_data = base64.b64decode(r['images'][0])
-        image = Image.open(io.BytesIO(image_data))
+        async with SDClient() as client:
+            image = await client.txt2img(payload)
         logger.info("Successfully generated and decoded image")
         return image
-        
-    except requests.exceptions.ConnectionError as e:
-        error_msg = "Could not connect to Stable Diffusion API. Make sure it's running on http://127.0.0.1:7861"
-        logger.error(error_msg)
-        raise Exception(error_msg) from e
     except Exception as e:
         logger.error(f"Error generating image: {str(e)}")
         logger.error(f"Error type: {type(e)}")
@@ -110,59 +206,214 @@ def create_pdf(text, image_path):
     # TO DO: implement PDF creation
     pass
 
+@app.get("/health")
+async def health_check():
+    """Liveness: the server is up, whether or not the model has loaded"""
+    health = {
+        "status": "healthy",
+        "model": model_loader.state,
+        "queue_depth": scheduler.queue_depth,
+        "batching": scheduler.stats,
+        "cache": generation_cache.stats
+    }
+    if model_loader.pool is not None:
+        health["workers"] = model_loader.pool.stats
+    return health
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 200 once the model can serve generations, 503 until then"""
+    if not model_loader.is_ready:
+        return JSONResponse(
+            status_code=503,
+            content={"status": model_loader.state, "error": model_loader.error},
+            headers={"Retry-After": str(MODEL_RETRY_AFTER)}
+        )
+    return {"status": "ready", "load_seconds": model_loader.load_seconds, "precision": model_loader.precision,
+            "backend": model_loader.backend_name}
+
 @app.post("/generate")
-async def generate_text(request: GenerationRequest):
+async def generate_text(request: GenerationRequest, http_request: Request):
     try:
         # Check rate limit
-        check_rate_limit()
-        
-        # Process the prompt to handle bullet points
-        processed_prompt = request.prompt.replace('\n', ' ').replace('- ', ', ').strip()
+        await check_rate_limit(http_request)
         
-        # Tokenize and generate
-        inputs = tokenizer(processed_prompt, return_tensors="pt", truncation=True, max_length=512)
-        inputs = {k: v.to(model.device) for k, v in inputs.items()}
+        # Queue the prompt unless it's cached or already being generated;
+        # concurrent requests are decoded together in one batch
+        timeout = request_timeout(request.timeout)
+        keys = [cache_key(request) if request.use_cache else None]
         
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_length=request.max_length,
-                temperature=request.temperature,
-                top_p=request.top_p,
-                num_return_sequences=1,
-                do_sample=True,  # Enable sampling
-                no_repeat_ngram_size=3,  # Avoid repetition
-                length_penalty=1.5  # Encourage longer responses
-            )
+        async def generate(indices):
+            model_loader.ensure_ready()
+            return [await scheduler.submit(request, timeout)]
         
-        generated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Post-process the generated text
-        generated_text = generated_text.replace(" .", ".").replace(" ,", ",")
-        generated_text = " ".join(generated_text.split())  # Clean up whitespace
+        generated_text = (await wait_for_inference(
+            http_request, generation_cache.get_or_generate(keys, generate), timeout
+        ))[0]
         
         return {"generated_text": generated_text}
     
     except HTTPException as he:
         # Re-raise HTTP exceptions (like rate limit)
         raise
+    except (ModelNotReadyError, QueueFullError, DeadlineExceededError) as e:
+        raise inference_error(e)
     except Exception as e:
         logger.error(f"Error during text generation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Text generation failed: {str(e)}")
 
+@app.post("/generate-batch")
+async def generate_text_batch(request: BatchGenerationRequest, http_request: Request):
+    """Generate text for several named prompts in one batched forward pass"""
+    try:
+        if not request.prompts:
+            raise HTTPException(status_code=400, detail="At least one prompt is required")
+        
+        # A batch counts as a single request against the rate limit
+        await check_rate_limit(http_request)
+        
+        names = list(request.prompts.keys())
+        batch = []
+        for name in names:
+            item = request.prompts[name]
+            if isinstance(item, str):
+                item = BatchPrompt(prompt=item)
+            batch.append(GenerationRequest(
+                prompt=item.prompt,
+                max_length=item.max_length if item.max_length is not None else request.max_length,
+                temperature=item.temperature if item.temperature is not None else request.temperature,
+                top_p=item.top_p if item.top_p is not None else request.top_p,
+                seed=item.seed
+            ))
+        
+        # Only prompts that are neither cached nor in flight go to the model
+        timeout = request_timeout(request.timeout)
+        keys = [cache_key(r) if request.use_cache else None for r in batch]
+        
+        def generate(indices):
+            model_loader.ensure_ready()
+            return scheduler.submit_many([batch[i] for i in indices], timeout)
+        
+        generated_texts = await wait_for_inference(
+            http_request, generation_cache.get_or_generate(keys, generate), timeout
+        )
+        
+        return {"generated_texts": dict(zip(names, generated_texts))}
+    
+    except HTTPException as he:
+        raise
+    except (ModelNotReadyError, QueueFullError, DeadlineExceededError) as e:
+        raise inference_error(e)
+    except Exception as e:
+        logger.error(f"Error during batch text generation: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Text generation failed: {str(e)}")
+
+@app.post("/generate/stream")
+async def generate_text_stream(request: GenerationRequest, http_request: Request):
+    """Stream generated text as Server-Sent Events while it is being decoded.
+
+    Emits `chunk` events with cleaned text as it becomes final, then one `done`
+    event with the full text, time to first token and tokens per second.
+    Errors before the first chunk are returned as regular HTTP errors; later
+    ones are sent as an `error` event.
+    """
+    start = time.perf_counter()
+    try:
+        await check_rate_limit(http_request)
+        
+        key = cache_key(request) if request.use_cache else None
+        cached_text = await generation_cache.aget(key) if key is not None else None
+        if cached_text is not None:
+            async def cached_events():
+                ttft = time.perf_counter() - start
+                yield sse_event("chunk", {"text": cached_text})
+                yield sse_event("done", {"text": cached_text, "cached": True, "time_to_first_token": ttft,
+                                         "tokens": None, "tokens_per_second": None})
+            return StreamingResponse(cached_events(), media_type="text/event-stream")
+        
+        model_loader.ensure_ready()
+        timeout = request_timeout(request.timeout)
+        
+        # The streamer runs on the inference thread and hands chunks to the event loop
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        streamer = TextChunkStreamer(
+            model_loader.tokenizer,
+            lambda text: loop.call_soon_threadsafe(chunks.put_nowait, text)
+        )
+        params = GenerationParams(
+            request.prompt,
+            max_length=request.max_length,
+            temperature=request.temperature,
+            top_p=request.top_p,
+            seed=request.seed,
+            streamer=streamer
+        )
+        # submit_many gives the request a batch of its own
+        generation = asyncio.create_task(scheduler.submit_many([params], timeout))
+        generation.add_done_callback(lambda _: chunks.put_nowait(None))  # Wakes the reader up when decoding ends
+        
+        try:
+            first_chunk = await wait_for_inference(http_request, chunks.get(), timeout)
+            ttft = time.perf_counter() - start
+            if first_chunk is None:
+                generation.result()  # Raise the error if the generation failed without output
+        except BaseException:
+            generation.cancel()
+            raise
+    
+    except HTTPException as he:
+        raise
+    except (ModelNotReadyError, QueueFullError, DeadlineExceededError) as e:
+        raise inference_error(e)
+    except Exception as e:
+        logger.error(f"Error during streamed text generation: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Text generation failed: {str(e)}")
+    
+    async def events():
+        chunk = first_chunk
+        try:
+            while chunk is not None:
+                yield sse_event("chunk", {"text": chunk})
+                chunk = await chunks.get()
+            
+            try:
+                generated_text = (await generation)[0]
+            except Exception as e:
+                logger.error(f"Error during streamed text generation: {str(e)}")
+                yield sse_event("error", {"detail": f"Text generation failed: {str(e)}"})
+                return
+            
+            if key is not None:
+                await generation_cache.aput(key, generated_text)
+            yield sse_event("done", {
+                "text": generated_text,
+                "cached": False,
+                "time_to_first_token": ttft,
+                "tokens": streamer.tokens,
+                "tokens_per_second": streamer.tokens_per_second
+            })
+        finally:
+            # The client went away mid-stream, stop decoding
+            if not generation.done():
+                logger.info("Client disconnected, cancelling streamed generation")
+                generation.cancel()
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @app.post("/generate_brochure")
-async def generate_brochure(content: str):
+async def generate_brochure(content: str, http_request: Request):
     try:
         logger.info(f"Starting brochure generation for content: {content}")
         
         # Generate text content using T5
         request = GenerationRequest(prompt=content)
-        generated_text = (await generate_text(request))["generated_text"]
+        generated_text = (await generate_text(request, http_request))["generated_text"]
         logger.info("Successfully generated text content")
         
         # Generate image based on the content
         image_prompt = f"professional brochure image for: {content}, high quality, photorealistic"
-        image = generate_image(
+        image = await generate_image(
             prompt=image_prompt,
             negative_prompt="text, watermark, bad quality, blurry, cartoon, drawing",
             width=800,
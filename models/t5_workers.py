@@ -0,0 +1,310 @@
+"""Pre-forked T5 inference workers sharing one copy of the model weights.
+
+The parent loads the model once and moves its parameters to shared memory.
+Each worker process maps the same memory, pins itself to its own cores and
+runs batches with its own torch thread pool. WorkerPool.run_batch sends a
+batch to the worker with the fewest batches outstanding.
+"""
+import concurrent.futures
+import itertools
+import logging
+import os
+import threading
+import time
+
+import torch
+import torch.multiprocessing as mp
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+WORKER_START_TIMEOUT = 600  # Seconds a worker may take to load its backend and warm up
+CANCEL_POLL_INTERVAL = 0.05  # How often a waiting batch checks whether it was abandoned
+
+
+def available_cores():
+    """CPU cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    if psutil is not None:
+        return sorted(psutil.Process().cpu_affinity())
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(cores, num_workers):
+    """Give each worker a contiguous block of cores; with too few cores, workers share them"""
+    if len(cores) < num_workers:
+        return [[cores[i % len(cores)]] for i in range(num_workers)]
+    size, extra = divmod(len(cores), num_workers)
+    blocks, start = [], 0
+    for i in range(num_workers):
+        end = start + size + (1 if i < extra else 0)
+        blocks.append(cores[start:end])
+        start = end
+    return blocks
+
+
+def pin_process(cores, num_threads=None):
+    """Restrict this process to `cores` and size torch's thread pool to match"""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    elif psutil is not None:
+        psutil.Process().cpu_affinity(cores)
+    else:
+        logger.warning("Cannot pin worker to cores on this platform without psutil")
+    torch.set_num_threads(num_threads or len(cores))
+
+
+def process_memory_mb(pid):
+    """(RSS, USS) of a process in MB; USS counts only pages private to it. None where unavailable"""
+    if psutil is None:
+        return None, None
+    process = psutil.Process(pid)
+    try:
+        uss = process.memory_full_info().uss / (1024 * 1024)
+    except (psutil.AccessDenied, AttributeError):
+        uss = None
+    return process.memory_info().rss / (1024 * 1024), uss
+
+
+class _JobCancelled:
+    """Cancel flag for one job, backed by a value shared with the parent"""
+
+    def __init__(self, cancelled_job, job_id):
+        self.cancelled_job = cancelled_job
+        self.job_id = job_id
+
+    def is_set(self):
+        return self.cancelled_job.value == self.job_id
+
+
+def _worker_main(index, model, tokenizer, backend_name, onnx_dir, quantize, cores, num_threads, conn, cancelled_job):
+    from t5_backends import create_backend
+    from t5_generation import GenerationParams, TextChunkStreamer, generate_batch
+    from t5_model import WARMUP_PROMPT, apply_precision
+
+    try:
+        pin_process(cores, num_threads)
+        if quantize:
+            model, _ = apply_precision(model, "int8")
+        backend = create_backend(backend_name, model=model, onnx_dir=onnx_dir)
+        # Warm-up in the worker: lazy initialisation and compilation happen per process
+        generate_batch(backend, tokenizer, [GenerationParams(WARMUP_PROMPT, max_length=8)])
+    except Exception as e:
+        conn.send(("failed", None, str(e)))
+        return
+    conn.send(("ready", None, os.getpid()))
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        job_id, requests, streamed = message
+
+        streamers = {}
+        for i in streamed:
+            def send_chunk(text, i=i):
+                conn.send(("chunk", job_id, (i, text)))
+            streamers[i] = requests[i].streamer = TextChunkStreamer(tokenizer, send_chunk)
+
+        try:
+            results = generate_batch(backend, tokenizer, requests, _JobCancelled(cancelled_job, job_id))
+        except Exception as e:
+            conn.send(("error", job_id, f"{type(e).__name__}: {str(e)}"))
+            continue
+        timings = {
+            i: (s.tokens, s.started_at, s.first_token_at, s.finished_at)
+            for i, s in streamers.items()
+        }
+        conn.send(("result", job_id, (results, timings)))
+
+
+class _Worker:
+    def __init__(self, index, cores, process, conn, cancelled_job):
+        self.index = index
+        self.cores = cores
+        self.process = process
+        self.conn = conn
+        self.cancelled_job = cancelled_job
+        self.pid = None
+        self.alive = True
+        self.outstanding = 0
+        self.batches = 0
+        self.send_lock = threading.Lock()
+        self.jobs = {}  # job_id -> (future, streamers)
+
+
+class WorkerPool:
+    """N worker processes serving batches from one shared copy of the model.
+
+    For the eager and compiled backends the parent's model is moved to shared
+    memory and handed to every worker, so the weights are held once. Dynamically
+    quantized weights can't live in shared memory, so with `quantize` the
+    shared fp32 model is quantized by each worker into its own int8 copy. The
+    onnx backend loads its graphs in each worker. Workers are spawned rather
+    than forked, which is safe with the parent's threads and works on Windows.
+    """
+
+    def __init__(self, model, tokenizer, backend="eager", onnx_dir=None, num_workers=2,
+                 num_threads=None, cores=None, quantize=False):
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+        self.model = model
+        self.tokenizer = tokenizer
+        self.backend = backend
+        self.onnx_dir = onnx_dir
+        self.num_workers = num_workers
+        self.num_threads = num_threads
+        self.cores = cores or available_cores()
+        self.quantize = quantize
+        self.workers = []
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._closing = False
+
+    def start(self):
+        """Spawn the workers and block until every one has warmed up"""
+        context = mp.get_context("spawn")
+        if self.model is not None:
+            self.model.share_memory()
+        for index, cores in enumerate(split_cores(self.cores, self.num_workers)):
+            parent_conn, child_conn = context.Pipe()
+            cancelled_job = context.Value("q", 0, lock=False)
+            process = context.Process(
+                target=_worker_main,
+                args=(index, self.model, self.tokenizer, self.backend, self.onnx_dir, self.quantize, cores,
+                      self.num_threads, child_conn, cancelled_job),
+                name=f"t5-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.workers.append(_Worker(index, cores, process, parent_conn, cancelled_job))
+
+        for worker in self.workers:
+            if not worker.conn.poll(WORKER_START_TIMEOUT):
+                raise RuntimeError(f"T5 worker {worker.index} did not start within {WORKER_START_TIMEOUT}s")
+            status, _, detail = worker.conn.recv()
+            if status != "ready":
+                raise RuntimeError(f"T5 worker {worker.index} failed to start: {detail}")
+            worker.pid = detail
+            threading.Thread(target=self._read, args=(worker,), name=f"t5-worker-{worker.index}-reader",
+                             daemon=True).start()
+            logger.info(f"T5 worker {worker.index} (pid {worker.pid}) ready on cores {worker.cores}")
+
+    def run_batch(self, requests, cancel_event=None):
+        """Run a batch on the least busy worker and block until its results arrive.
+
+        Same contract as generate_batch: one text per request, decoding stops
+        early once `cancel_event` is set, and streamers get their chunks.
+        """
+        with self._lock:
+            live = [w for w in self.workers if w.alive]
+            if not live:
+                raise RuntimeError("No T5 workers are running")
+            worker = min(live, key=lambda w: (w.outstanding, w.batches))
+            worker.outstanding += 1
+            job_id = next(self._job_ids)
+
+        # Streamers can't cross the process boundary; workers send their chunks back instead
+        from t5_generation import GenerationParams
+        streamers = {}
+        payload = []
+        for i, r in enumerate(requests):
+            streamer = getattr(r, "streamer", None)
+            if streamer is not None:
+                streamers[i] = streamer
+                r = GenerationParams(r.prompt, r.max_length, r.temperature, r.top_p, r.seed)
+            payload.append(r)
+
+        future = concurrent.futures.Future()
+        worker.jobs[job_id] = (future, streamers)
+        try:
+            with worker.send_lock:
+                worker.conn.send((job_id, payload, list(streamers)))
+            cancel_sent = False
+            while True:
+                try:
+                    return future.result(timeout=CANCEL_POLL_INTERVAL)
+                except concurrent.futures.TimeoutError:
+                    if not worker.alive:
+                        raise RuntimeError(f"T5 worker {worker.index} exited")
+                    if not cancel_sent and cancel_event is not None and cancel_event.is_set():
+                        worker.cancelled_job.value = job_id
+                        cancel_sent = True
+        finally:
+            worker.jobs.pop(job_id, None)
+            with self._lock:
+                worker.outstanding -= 1
+                worker.batches += 1
+
+    def _read(self, worker):
+        while True:
+            try:
+                kind, job_id, data = worker.conn.recv()
+            except (EOFError, OSError):
+                break
+            job = worker.jobs.get(job_id)
+            if job is None:
+                continue
+            future, streamers = job
+            if kind == "chunk":
+                i, text = data
+                streamer = streamers[i]
+                streamer.text += text
+                streamer.on_text(text)
+            elif kind == "result":
+                results, timings = data
+                for i, (tokens, started_at, first_token_at, finished_at) in timings.items():
+                    streamer = streamers[i]
+                    streamer.tokens = tokens
+                    streamer.started_at, streamer.first_token_at, streamer.finished_at = started_at, first_token_at, finished_at
+                future.set_result(results)
+            else:
+                future.set_exception(RuntimeError(f"T5 worker {worker.index} failed: {data}"))
+
+        worker.alive = False
+        if not self._closing:
+            logger.error(f"T5 worker {worker.index} (pid {worker.pid}) exited")
+        for future, _ in list(worker.jobs.values()):
+            if not future.done():
+                future.set_exception(RuntimeError(f"T5 worker {worker.index} exited"))
+
+    @property
+    def stats(self):
+        return [
+            {"index": w.index, "pid": w.pid, "alive": w.alive, "cores": w.cores,
+             "outstanding": w.outstanding, "batches": w.batches}
+            for w in self.workers
+        ]
+
+    def memory_mb(self):
+        """Summed RSS and USS of the parent and all workers, in MB"""
+        total_rss, total_uss = 0.0, 0.0
+        for pid in [os.getpid()] + [w.pid for w in self.workers if w.alive]:
+            rss, uss = process_memory_mb(pid)
+            if rss is None:
+                return None, None
+            total_rss += rss
+            total_uss = total_uss + uss if uss is not None and total_uss is not None else None
+        return total_rss, total_uss
+
+    def shutdown(self):
+        self._closing = True
+        for worker in self.workers:
+            if worker.alive:
+                try:
+                    with worker.send_lock:
+                        worker.conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+        deadline = time.monotonic() + 10
+        for worker in self.workers:
+            worker.process.join(max(0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self.workers = []
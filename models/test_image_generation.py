@@ -1,9 +1,198 @@
-import requests
-import base64
-import io
-from PIL import Image
+import asyncio
 import os
 import json
+import time
+
+try:
+    from .brochure_assets import write_behind
+    from .image_bank import get_image_bank
+    from .image_cache import get_image_cache, image_cache_key, write_atomic
+    from .image_slots import SD_UPSCALER, round_to_multiple
+    from .sd_client import ImageResult, SDClient
+except ImportError:  # Run as a script
+    from brochure_assets import write_behind
+    from image_bank import get_image_bank
+    from image_cache import get_image_cache, image_cache_key, write_atomic
+    from image_slots import SD_UPSCALER, round_to_multiple
+    from sd_client import ImageResult, SDClient
+
+NEGATIVE_PROMPT = "low quality, blurry, distorted, ugly, bad anatomy, bad proportions, deformed"
+IMAGE_STEPS = 20
+
+# Two-phase generation: a quick preview, then the final images from the same seeds
+PHASES = ("preview", "final")
+SD_PREVIEW_STEPS = int(os.getenv("SD_PREVIEW_STEPS", "8"))
+SD_PREVIEW_SCALE = float(os.getenv("SD_PREVIEW_SCALE", "0.5"))  # Preview size relative to the final image
+HIRES_STEPS = 10  # Steps of the final phase's second pass at full size
+HIRES_DENOISING = 0.55
+
+def hotel_image_payloads(hotel_name, location, slots=None, phase=None, seeds=None):
+    """txt2img payloads for the exterior, room and restaurant images, keyed by image name.
+
+    With `slots` ({name: ImageSlot}) each image is sized to fit its slot in the layout.
+    With a `phase`, both phases render their first pass at SD_PREVIEW_SCALE of
+    the size from the same `seeds` ({name: seed}), so the final image keeps
+    the preview's composition. The preview stops there after SD_PREVIEW_STEPS
+    steps. The final phase runs all steps, then upscales in latent space and
+    refines at full size (SD's hires fix).
+    """
+    # Define prompts
+    prompts = [
+        {
+            "name": "exterior",
+            "prompt": f"Professional architectural photography of {hotel_name} in {location}, luxury resort exterior, beachfront, palm trees, sunset, high-end hotel photography, 4k, detailed, professional lighting"
+        },
+        {
+            "name": "room",
+            "prompt": f"Interior photography of a luxury suite at {hotel_name}, elegant hotel room, ocean view, king size bed, modern furniture, ambient lighting, professional hotel photography, 4k, detailed"
+        },
+        {
+            "name": "restaurant",
+            "prompt": f"Elegant restaurant interior at {hotel_name}, luxury dining area, ocean view, fine dining setup, warm lighting, professional restaurant photography, 4k, detailed"
+        }
+    ]
+    payloads = {}
+    for prompt_data in prompts:
+        slot = (slots or {}).get(prompt_data["name"])
+        width, height = slot.sd_size() if slot is not None else (768, 512)
+        payload = {
+            "prompt": prompt_data["prompt"],
+            "negative_prompt": NEGATIVE_PROMPT,
+            "steps": IMAGE_STEPS,
+            "width": width,
+            "height": height,
+            "cfg_scale": 7.0,
+            "sampler_name": "Euler a",
+            "batch_size": 1
+        }
+        if seeds is not None:
+            payload["seed"] = seeds[prompt_data["name"]]
+        if phase is not None:
+            base_width, base_height = round_to_multiple(width * SD_PREVIEW_SCALE), round_to_multiple(height * SD_PREVIEW_SCALE)
+            if phase == "preview":
+                payload.update(width=base_width, height=base_height, steps=SD_PREVIEW_STEPS)
+            elif (base_width, base_height) != (width, height):
+                payload.update(
+                    width=base_width,
+                    height=base_height,
+                    enable_hr=True,
+                    hr_resize_x=width,
+                    hr_resize_y=height,
+                    hr_upscaler="Latent",
+                    hr_second_pass_steps=HIRES_STEPS,
+                    denoising_strength=HIRES_DENOISING
+                )
+        payloads[prompt_data["name"]] = payload
+    return payloads
+
+async def generate_hotel_images(hotel_name, location, output_dir="generated_images", client=None,
+                                force_regenerate=False, cache=None, slots=None, phase=None, seeds=None,
+                                on_progress=None, fast=False, location_type=None, bank=None):
+    """Request all three images at once and save the ones that succeed.
+
+    Returns {name: ImageResult}; saved results get a `path`. The PNG bytes SD
+    sent are written as they are, never decoded and re-encoded, and each
+    result's `image` decodes from those bytes in memory when first used.
+    With `output_dir=None` nothing is saved and the images stay in memory.
+    With `slots` each image is rendered at its slot's aspect ratio and, if
+    SD_UPSCALER is set, upscaled towards the slot size in a separate step
+    (never for previews). `phase` and `seeds` select two-phase generation,
+    see hotel_image_payloads. `on_progress(name, progress, eta)` follows each
+    image's sampling on the SD backend; cached images report 1.0 at once.
+    With `fast`, each image is first looked up in the pre-generated image
+    bank by prompt similarity, among images for `location_type`; only the
+    ones without a close enough match go on to the cache and SD.
+    Images already in the image cache are read from it without calling SD;
+    `force_regenerate` skips the lookup but still stores the new images,
+    which is done in the background. Pass a shared SDClient to reuse its
+    connection pool, otherwise one is opened for the call.
+    """
+    payloads = hotel_image_payloads(hotel_name, location, slots, phase, seeds)
+    upscales = {}
+    if phase != "preview":
+        for name, slot in (slots or {}).items():
+            factor = slot.upscale()
+            if name in payloads and factor is not None:
+                upscales[name] = (SD_UPSCALER, factor)
+    cache = cache or get_image_cache()
+    safe_hotel_name = hotel_name.replace(' ', '_')
+
+    results = {}
+    keys = {}
+    not_upscaled = set()
+    bank = bank or (get_image_bank() if fast else None)
+    if bank is not None:
+        for name, payload in payloads.items():
+            match = bank.match(name, payload["prompt"], location_type)
+            data = await asyncio.to_thread(bank.read, match[0]) if match is not None else None
+            if data is not None:
+                results[name] = ImageResult(name, data=data, seconds=0.0, cached=True)
+                if on_progress is not None:
+                    on_progress(name, 1.0, 0.0)
+    if cache is not None:
+        for name, payload in payloads.items():
+            if name in results:
+                continue
+            keys[name] = image_cache_key(payload, upscales.get(name))
+            if force_regenerate:
+                cache.bypass()
+                continue
+            data = await asyncio.to_thread(cache.read, keys[name])
+            if data is not None:
+                results[name] = ImageResult(name, data=data, seconds=0.0, cached=True)
+                if on_progress is not None:
+                    on_progress(name, 1.0, 0.0)
+    missing = {name: payload for name, payload in payloads.items() if name not in results}
+
+    if missing:
+        if client is None:
+            async with SDClient() as client:
+                results.update(await _generate(client, missing, upscales, not_upscaled, on_progress))
+        else:
+            results.update(await _generate(client, missing, upscales, not_upscaled, on_progress))
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    for name, result in results.items():
+        if not result.ok:
+            continue
+        # An image whose upscale failed mustn't be cached under the upscaled key
+        if not result.cached and cache is not None and name not in not_upscaled:
+            write_behind(cache.put, keys[name], result.data)
+        if output_dir is None:
+            continue
+        # Save the image with consistent path separator and name
+        filename = os.path.join(output_dir, f"{safe_hotel_name}_{name}.png").replace('\\', '/')
+        await asyncio.to_thread(write_atomic, filename, result.data)
+        result.path = filename
+    return {name: results[name] for name in payloads}
+
+async def _generate(client, payloads, upscales, not_upscaled, on_progress=None):
+    """Generate the images, then upscale the ones in `upscales` ({name: (upscaler, factor)}).
+
+    Names whose upscale failed are added to `not_upscaled`.
+    """
+    results = await client.generate(payloads, on_progress)
+
+    async def upscale(name, upscaler, factor):
+        result = results[name]
+        start = time.perf_counter()
+        try:
+            data = await client.upscale(result.data, factor, upscaler)
+        except Exception as e:
+            # Upscaling is optional; the renderer resizes the original instead
+            print(f"Could not upscale {name} image, using it as generated: {str(e)}")
+            not_upscaled.add(name)
+            return
+        upscaled = ImageResult(name, data=data, seconds=result.seconds + time.perf_counter() - start)
+        results[name] = upscaled
+
+    await asyncio.gather(*(
+        upscale(name, upscaler, factor)
+        for name, (upscaler, factor) in upscales.items()
+        if name in results and results[name].ok
+    ))
+    return results
 
 def test_image_generation(hotel_name="Sunset Bay Resort", location="Maldives", custom_prompts=None):
     """Generate images using Stable Diffusion API"""
@@ -21,95 +210,22 @@ def test_image_generation(hotel_name="Sunset Bay Resort", location="Maldives", c
             if hotel_name.replace(' ', '_') in f:
                 print(f"  {f}")
 
-        # Define prompts
-        prompts = [
-            {
-                "name": "exterior",
-                "prompt": f"Professional architectural photography of {hotel_name} in {location}, luxury resort exterior, beachfront, palm trees, sunset, high-end hotel photography, 4k, detailed, professional lighting"
-            },
-            {
-                "name": "room",
-                "prompt": f"Interior photography of a luxury suite at {hotel_name}, elegant hotel room, ocean view, king size bed, modern furniture, ambient lighting, professional hotel photography, 4k, detailed"
-            },
-            {
-                "name": "restaurant",
-                "prompt": f"Elegant restaurant interior at {hotel_name}, luxury dining area, ocean view, fine dining setup, warm lighting, professional restaurant photography, 4k, detailed"
-            }
-        ]
-        print(f"Using prompts: {json.dumps(prompts, indent=2)}")
-
-        # Track generated images
-        generated_images = []
-        failed_images = []
+        print(f"Using payloads: {json.dumps(hotel_image_payloads(hotel_name, location), indent=2)}")
 
-        # Generate each image
-        for prompt_data in prompts:
-            try:
-                print(f"\nGenerating {prompt_data['name']} image...")
-                
-                # Prepare the request
-                payload = {
-                    "prompt": prompt_data["prompt"],
-                    "negative_prompt": "low quality, blurry, distorted, ugly, bad anatomy, bad proportions, deformed",
-                    "steps": 20,
-                    "width": 768,
-                    "height": 512,
-                    "cfg_scale": 7.0,
-                    "sampler_name": "Euler a",
-                    "batch_size": 1
-                }
-
-                # Make the API request
-                api_url = "http://127.0.0.1:7861/sdapi/v1/txt2img"  # Updated port to 7861
-                print(f"Sending request to: {api_url}")
-                response = requests.post(
-                    url=api_url,
-                    json=payload,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=300  # 5 minute timeout
-                )
+        # The three images are requested concurrently
+        results = asyncio.run(generate_hotel_images(hotel_name, location, output_dir))
 
-                # Check if request was successful
-                if response.status_code != 200:
-                    print(f"Error: Received status code {response.status_code}")
-                    print(f"Response content: {response.text}")
-                    failed_images.append(prompt_data['name'])
-                    continue
-
-                # Get the image data
-                response_data = response.json()
-                if 'images' not in response_data or not response_data['images']:
-                    print("No images in response")
-                    print(f"Full response: {json.dumps(response_data, indent=2)}")
-                    failed_images.append(prompt_data['name'])
-                    continue
-
-                # Process the first image
-                image_data = response_data['images'][0]
-                if ',' in image_data:  # Remove data URL prefix if present
-                    image_data = image_data.split(',', 1)[1]
-
-                # Convert base64 to image
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-
-                # Save the image with consistent path separator and name
-                safe_hotel_name = hotel_name.replace(' ', '_')
-                filename = os.path.join(output_dir, f"{safe_hotel_name}_{prompt_data['name']}.png").replace('\\', '/')
-                print(f"Saving image to: {filename}")
-                image.save(filename)
-                print(f"Successfully saved {prompt_data['name']} image to {filename}")
-                print(f"File exists after save: {os.path.exists(filename)}")
-                print(f"File size: {os.path.getsize(filename)} bytes")
-                generated_images.append(filename)
-
-            except requests.exceptions.ConnectionError:
-                print(f"Error generating {prompt_data['name']}: Could not connect to Stable Diffusion API")
-                print("Please make sure the API is running on http://127.0.0.1:7861")
-                failed_images.append(prompt_data['name'])
-            except Exception as e:
-                print(f"Error generating {prompt_data['name']}: {str(e)}")
-                failed_images.append(prompt_data['name'])
+        generated_images = []
+        failed_images = []
+        for name, result in results.items():
+            if result.ok:
+                source = "from cache" if result.cached else f"in {result.seconds:.1f}s"
+                print(f"Successfully saved {name} image to {result.path} {source}")
+                print(f"File size: {len(result.data)} bytes")
+                generated_images.append(result.path)
+            else:
+                print(f"Error generating {name}: {str(result.error)}")
+                failed_images.append(name)
 
         print("\nDirectory contents after generation:")
         for f in os.listdir(output_dir):
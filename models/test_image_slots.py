@@ -0,0 +1,61 @@
+"""Stable Diffusion sizes for the brochure's image slots.
+
+    python -m pytest models/test_image_slots.py -q
+"""
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import image_slots
+from image_slots import SD_MIN_SIDE, ImageSlot, fit_to_slot, round_to_multiple
+
+
+def test_round_to_multiple_of_8():
+    assert round_to_multiple(527) == 528
+    assert round_to_multiple(523.9) == 520
+    assert round_to_multiple(3) == 8
+
+
+@pytest.mark.parametrize("width, height", [(1780, 2480), (1000, 600), (600, 300), (512, 512)])
+def test_sd_size_keeps_the_aspect_within_the_pixel_budget(width, height):
+    slot = ImageSlot("slot", width, height, max_pixels=768 * 512)
+    sd_width, sd_height = slot.sd_size()
+    assert sd_width % 8 == 0 and sd_height % 8 == 0
+    # Rounding each side to a multiple of 8 moves it by at most 4 pixels
+    pixels = min(width * height, 768 * 512)
+    assert abs(sd_width * sd_height - pixels) <= 4 * (sd_width + sd_height) + 16
+    assert sd_width / sd_height == pytest.approx(slot.aspect, rel=0.03)
+
+
+def test_full_bleed_slots():
+    assert ImageSlot("background", 1780, 2480).sd_size() == (528, 744)
+    assert ImageSlot("room", 650, 390).sd_size() == (648, 392)
+
+
+def test_slot_smaller_than_the_budget_gets_its_own_size():
+    assert ImageSlot("thumb", 400, 300).sd_size() == (400, 304)
+
+
+def test_thin_slot_keeps_the_minimum_side():
+    sd_width, sd_height = ImageSlot("banner", 4000, 100).sd_size()
+    assert min(sd_width, sd_height) >= SD_MIN_SIDE
+    assert sd_width / sd_height == pytest.approx(40, rel=0.05)
+
+
+def test_upscale_only_when_enabled_and_worthwhile(monkeypatch):
+    slot = ImageSlot("background", 1780, 2480)
+    assert slot.upscale() is None
+    monkeypatch.setattr(image_slots, "SD_UPSCALER", "R-ESRGAN 4x+")
+    assert slot.upscale_factor() == pytest.approx(max(1780 / 528, 2480 / 744))
+    assert slot.upscale() == 3.5
+    assert ImageSlot("thumb", 320, 240).upscale() is None
+
+
+def test_fit_to_slot_fills_the_slot():
+    image = Image.new('RGB', (768, 512), 'red')
+    assert fit_to_slot(image, ImageSlot("room", 1000, 600)).size == (1000, 600)
@@ -0,0 +1,114 @@
+"""Layer cache of the brochure renderer: eviction, and layers that draw the same pixels as drawing directly.
+
+    python -m pytest models/test_layer_cache.py -q
+"""
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageDraw
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fonts import load_font
+from layer_cache import LayerCache, draw_block, draw_text, page_overlay
+from overlays import full_bleed_gradient
+from page_backends import RasterPage
+from text_layout import layout_text
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "Montserrat-Regular.ttf")
+
+
+def tile(shade, size=(10, 10)):
+    # 10x10 RGBA is 400 bytes
+    return Image.new('RGBA', size, (shade, shade, shade, 255))
+
+
+def test_least_recently_used_layer_is_evicted_past_max_bytes():
+    cache = LayerCache(max_bytes=1000)
+    cache.get("a", lambda: tile(1))
+    cache.get("b", lambda: tile(2))
+    cache.get("a", lambda: tile(99))
+    cache.get("c", lambda: tile(3))
+
+    assert cache.bytes == 800
+    assert cache.get("a", lambda: tile(99)).getpixel((0, 0))[0] == 1
+    assert cache.get("b", lambda: tile(99)).getpixel((0, 0))[0] == 99
+    assert cache.summary()["entries"] == 2
+
+
+def test_hits_return_the_cached_layer_without_building():
+    cache = LayerCache(max_bytes=1000)
+    built = []
+
+    def build():
+        built.append(True)
+        return tile(1)
+
+    first = cache.get("a", build)
+    assert cache.get("a", build) is first
+    assert built == [True]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_layer_larger_than_the_cache_is_built_but_not_kept():
+    cache = LayerCache(max_bytes=1000)
+    cache.get("small", lambda: tile(1))
+    big = cache.get("big", lambda: tile(2, (20, 20)))
+    assert big.size == (20, 20)
+    assert cache.summary()["entries"] == 1
+    assert cache.bytes == 400
+
+
+def test_clear_empties_the_cache():
+    cache = LayerCache(max_bytes=1000)
+    cache.get("a", lambda: tile(1))
+    cache.clear()
+    assert cache.bytes == 0
+    assert cache.summary()["entries"] == 0
+
+
+def test_cached_page_overlay_matches_building_it():
+    assert page_overlay(300, 400).tobytes() == full_bleed_gradient(300, 400).tobytes()
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("fill", [(20, 20, 20), (255, 255, 255, 128)])
+def test_cached_text_sprite_draws_the_same_pixels_as_draw_text(mode, fill):
+    font = load_font(FONT_PATH, 40)
+    expected = Image.new(mode, (500, 160), 'white')
+    ImageDraw.Draw(expected).text((13, 7), "Jaipur, Rajasthan", font=font, fill=fill)
+    ImageDraw.Draw(expected).text((-5, 90), "gÿ Ŧ", font=font, fill=fill)
+
+    actual = Image.new(mode, (500, 160), 'white')
+    draw = ImageDraw.Draw(actual)
+    draw_text(draw, (13, 7), "Jaipur, Rajasthan", font, fill)
+    draw_text(draw, (-5, 90), "gÿ Ŧ", font, fill)
+
+    assert actual.tobytes() == expected.tobytes()
+
+
+def test_cached_text_block_matches_text_block_draw():
+    font = load_font(FONT_PATH, 28)
+    block = layout_text("Hand-carved furniture and elegant décor\nwith views over the palace gardens", font,
+                        max_width=300, align='center')
+
+    expected = Image.new('RGBA', (400, 300), 'white')
+    block.draw(ImageDraw.Draw(expected), (20, 10), font, (20, 20, 20))
+    actual = Image.new('RGBA', (400, 300), 'white')
+    draw_block(ImageDraw.Draw(actual), block, (20, 10), font, (20, 20, 20))
+
+    assert actual.tobytes() == expected.tobytes()
+
+
+def test_raster_page_block_matches_drawing_directly():
+    font = load_font(FONT_PATH, 28)
+    block = layout_text("Private villas with plunge pools", font, max_width=250)
+
+    expected = Image.new('RGBA', (300, 200), 'white')
+    block.draw(ImageDraw.Draw(expected), (10, 10), font, (20, 20, 20))
+    page = RasterPage(300, 200)
+    page.block(block, (10, 10), font)
+
+    assert page.image.tobytes() == expected.tobytes()
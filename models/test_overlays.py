@@ -0,0 +1,18 @@
+"""Vectorized gradient overlays of the brochure renderer against the row-by-row reference.
+
+    python -m pytest models/test_overlays.py -q
+"""
+import os
+import sys
+
+import pytest
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_overlays import CASES
+
+
+@pytest.mark.parametrize("name, rows_fn, vectorized_fn, size", CASES, ids=[case[0] for case in CASES])
+def test_vectorized_overlay_matches_row_by_row_reference(name, rows_fn, vectorized_fn, size):
+    assert rows_fn(*size).tobytes() == vectorized_fn(*size).tobytes()
@@ -0,0 +1,112 @@
+"""Token-bucket rate limiter shared through SQLite.
+
+    python -m pytest models/test_rate_limiter.py -q
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rate_limiter
+from rate_limiter import RateLimiter, RateLimiterUnavailable, RateLimitExceeded
+
+
+class Clock:
+    """Stands in for the time module, so refills don't need real waiting"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+def test_burst_then_refused_with_retry_after(clock):
+    limiter = RateLimiter("test", max_requests=3, window=60, db_path=":memory:")
+    for _ in range(3):
+        limiter.acquire("client")
+    with pytest.raises(RateLimitExceeded) as refused:
+        limiter.acquire("client")
+    # One token comes back every 20 seconds
+    assert refused.value.retry_after == 20
+
+
+def test_bucket_refills_evenly_up_to_its_capacity(clock):
+    limiter = RateLimiter("test", max_requests=3, window=60, db_path=":memory:")
+    for _ in range(3):
+        limiter.acquire("client")
+
+    clock.now += 20
+    limiter.acquire("client")
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("client")
+
+    # A long idle spell refills the burst, not more
+    clock.now += 3600
+    for _ in range(3):
+        limiter.acquire("client")
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("client")
+
+
+def test_clients_and_scopes_have_their_own_buckets(clock, tmp_path):
+    db_path = str(tmp_path / "limits.sqlite3")
+    t5 = RateLimiter("t5", max_requests=1, window=60, db_path=db_path)
+    brochures = RateLimiter("brochures", max_requests=1, window=60, db_path=db_path)
+    t5.acquire("alice")
+    t5.acquire("bob")
+    brochures.acquire("alice")
+    with pytest.raises(RateLimitExceeded):
+        t5.acquire("alice")
+
+
+def test_processes_sharing_the_database_share_the_limit(clock, tmp_path):
+    db_path = str(tmp_path / "limits.sqlite3")
+    # Two limiters on one file stand for two worker processes
+    first = RateLimiter("t5", max_requests=2, window=60, db_path=db_path)
+    second = RateLimiter("t5", max_requests=2, window=60, db_path=db_path)
+    first.acquire("client")
+    second.acquire("client")
+    with pytest.raises(RateLimitExceeded):
+        first.acquire("client")
+
+
+def test_reset_refills_the_bucket(clock):
+    limiter = RateLimiter("test", max_requests=1, window=60, db_path=":memory:")
+    limiter.acquire("client")
+    limiter.reset("client")
+    limiter.acquire("client")
+
+
+def test_cost_larger_than_the_tokens_left_is_refused_without_charging(clock):
+    limiter = RateLimiter("test", max_requests=3, window=60, db_path=":memory:")
+    limiter.acquire("client", cost=2)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("client", cost=2)
+    limiter.acquire("client")
+
+
+def test_locked_database_is_reported_as_unavailable(tmp_path):
+    db_path = str(tmp_path / "limits.sqlite3")
+    limiter = RateLimiter("test", max_requests=10, window=60, db_path=db_path)
+    other = sqlite3.connect(db_path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(RateLimiterUnavailable) as unavailable:
+            limiter.acquire("client")
+        assert unavailable.value.retry_after >= 1
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    limiter.acquire("client")
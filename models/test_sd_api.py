@@ -1,12 +1,13 @@
-import requests
+import asyncio
 import json
-import base64
-from PIL import Image
-import io
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sd_client import SDClient, SDError
+from sd_pool import SD_URLS
 
 def test_sd_api():
-    url = "http://127.0.0.1:7861/sdapi/v1/txt2img"  # Changed port from 7860 to 7861
-    
     payload = {
         "prompt": "exterior of a modern restaurant, professional photo, high quality",
         "negative_prompt": "blurry, bad quality",
@@ -17,32 +18,25 @@ def test_sd_api():
         "cfg_scale": 7,
         "seed": -1
     }
-    
-    print(f"Sending request to Stable Diffusion API at {url}")
+
+    print(f"Sending request to Stable Diffusion API at {', '.join(SD_URLS)}")
+    async def run():
+        async with SDClient() as client:
+            try:
+                return await client.txt2img(payload)
+            finally:
+                print(f"Backend pool: {json.dumps(client.pool.stats, indent=2)}")
+
     try:
-        response = requests.post(url, json=payload)
-        print(f"Response status code: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"Error response: {response.text}")
-            return
-            
-        r = response.json()
-        if 'images' not in r or not r['images']:
-            print("No images in response")
-            print(f"Full response: {json.dumps(r, indent=2)}")
-            return
-            
-        image_data = base64.b64decode(r['images'][0])
-        
+        image = asyncio.run(run())
+
         # Save the image
-        image = Image.open(io.BytesIO(image_data))
         image.save("test_output.png")
         print("Image generated successfully and saved as 'test_output.png'")
-        
-    except requests.exceptions.ConnectionError:
-        print("Connection error: Could not connect to the Stable Diffusion API")
-        print("Please make sure the API is running on http://127.0.0.1:7861")
+
+    except SDError as e:
+        print(f"Error: {str(e)}")
+        print("Please make sure the API is running on the URLs in SD_URLS (comma separated)")
         print("Check if the start_sd_api.bat script is running")
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,120 @@
+"""Async Stable Diffusion client against fake backends: concurrency caps, failover and hedging.
+
+    python -m pytest models/test_sd_client.py -q
+"""
+import asyncio
+import base64
+import io
+import os
+import sys
+
+import httpx
+from PIL import Image
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sd_client import SDClient
+from sd_pool import BackendPool
+
+
+def png_base64():
+    data = io.BytesIO()
+    Image.new('RGB', (1, 1), 'white').save(data, format='PNG')
+    return base64.b64encode(data.getvalue()).decode('ascii')
+
+
+PNG = png_base64()
+
+
+class FakeBackends:
+    """httpx handler answering txt2img after a per-host delay and recording every call"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.calls = []
+        self.in_flight = {host: 0 for host in delays}
+        self.peak = {host: 0 for host in delays}
+
+    async def __call__(self, request):
+        host = request.url.host
+        self.calls.append((host, request.url.path))
+        if request.url.path.endswith("/interrupt"):
+            return httpx.Response(200, json={})
+        self.in_flight[host] += 1
+        self.peak[host] = max(self.peak[host], self.in_flight[host])
+        try:
+            await asyncio.sleep(self.delays[host])
+        finally:
+            self.in_flight[host] -= 1
+        return httpx.Response(200, json={"images": [PNG]})
+
+
+def client_for(handler, *args, **kwargs):
+    """An SDClient whose requests are answered by handler instead of the network"""
+    client = SDClient(*args, **kwargs)
+    client._client = httpx.AsyncClient(base_url="http://a", transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_concurrency_is_capped_per_backend():
+    backends = FakeBackends({"a": 0.02, "b": 0.02})
+    pool = BackendPool(["http://a", "http://b"])
+
+    async def scenario():
+        async with client_for(backends, pool=pool, max_concurrency=2) as client:
+            return await asyncio.gather(*(client.txt2img({}) for _ in range(12)))
+
+    images = asyncio.run(scenario())
+    assert [image.size for image in images] == [(1, 1)] * 12
+    assert backends.peak == {"a": 2, "b": 2}
+    assert all(b.in_flight == 0 for b in pool.backends)
+
+
+def test_failed_job_does_not_cancel_the_others():
+    async def handler(request):
+        if b"broken" in request.content:
+            return httpx.Response(400, text="bad payload")
+        return httpx.Response(200, json={"images": [PNG]})
+
+    async def scenario():
+        async with client_for(handler, "http://a") as client:
+            return await client.generate({"exterior": {"prompt": "pool"}, "room": {"prompt": "broken"}})
+
+    results = asyncio.run(scenario())
+    assert results["exterior"].ok
+    assert not results["room"].ok
+
+
+def test_unreachable_backend_fails_over():
+    async def handler(request):
+        if request.url.host == "down":
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(200, json={"images": [PNG]})
+
+    pool = BackendPool(["http://down", "http://up"])
+    pool.backends[1].ewma_seconds = 10.0  # Route the first attempt to down
+
+    async def scenario():
+        async with client_for(handler, pool=pool) as client:
+            return await client.txt2img({})
+
+    assert asyncio.run(scenario()).size == (1, 1)
+    assert pool.stats["backends"][0]["failures"] == 1
+
+
+def test_slow_request_is_hedged_and_the_loser_interrupted_and_charged():
+    backends = FakeBackends({"slow": 5, "fast": 0.01})
+    pool = BackendPool(["http://slow", "http://fast"])
+    slow, fast = pool.backends
+    fast.ewma_seconds = 10.0  # Route the first attempt to slow
+
+    async def scenario():
+        async with client_for(backends, pool=pool, hedge_after=0.1) as client:
+            await client.txt2img({})
+
+    asyncio.run(scenario())
+    assert backends.calls == [("slow", "/sdapi/v1/txt2img"), ("fast", "/sdapi/v1/txt2img"), ("slow", "/sdapi/v1/interrupt")]
+    assert (pool.hedges, pool.hedge_wins) == (1, 1)
+    assert slow.hedges_lost == 1 and slow.ewma_seconds >= 0.1
+    assert slow.in_flight == fast.in_flight == 0
@@ -0,0 +1,116 @@
+"""Stable Diffusion backend pool: routing, circuit breaker and latency EWMA.
+
+    python -m pytest models/test_sd_pool.py -q
+"""
+import os
+import sys
+
+import pytest
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sd_pool
+from sd_pool import CLOSED, EWMA_ALPHA, HALF_OPEN, OPEN, BackendPool
+
+
+class Clock:
+    """Stands in for the time module, so the breaker's reset can be reached without waiting"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sd_pool, "time", clock)
+    return clock
+
+
+def fail(pool, backend, times):
+    for _ in range(times):
+        assert pool.acquire(exclude={b.url for b in pool.backends if b is not backend}) is backend
+        pool.release(backend, ok=False)
+
+
+def test_ewma_of_successful_latencies():
+    pool = BackendPool(["http://a"])
+    backend = pool.backends[0]
+    for seconds in (10.0, 20.0):
+        pool.acquire()
+        pool.release(backend, ok=True, seconds=seconds)
+    assert backend.ewma_seconds == pytest.approx((1 - EWMA_ALPHA) * 10 + EWMA_ALPHA * 20)
+    assert backend.in_flight == 0
+
+
+def test_routes_to_the_backend_expected_to_finish_first():
+    pool = BackendPool(["http://slow", "http://fast"])
+    slow, fast = pool.backends
+    slow.ewma_seconds, fast.ewma_seconds = 9.0, 3.0
+    # fast finishes its queue of two at 9s, slow is then first free
+    assert [pool.acquire().url for _ in range(3)] == ["http://fast", "http://fast", "http://slow"]
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_after_reset(clock):
+    pool = BackendPool(["http://a", "http://b"], failure_threshold=3, reset_after=30)
+    a, b = pool.backends
+    fail(pool, a, 2)
+    assert a.state == CLOSED
+    fail(pool, a, 1)
+    assert a.state == OPEN
+    assert pool.acquire(exclude={"http://b"}) is None
+
+    clock.now += 30
+    probe = pool.acquire(exclude={"http://b"})
+    assert probe is a and a.state == HALF_OPEN
+    # Only one probe at a time
+    assert pool.acquire(exclude={"http://b"}) is None
+    pool.release(a, ok=True, seconds=1.0)
+    assert a.state == CLOSED and a.consecutive_failures == 0
+
+
+def test_failed_probe_opens_the_breaker_again(clock):
+    pool = BackendPool(["http://a"], failure_threshold=1, reset_after=30)
+    a = pool.backends[0]
+    fail(pool, a, 1)
+    clock.now += 30
+    fail(pool, a, 1)
+    assert a.state == OPEN and a.opened_at == clock.now
+
+
+def test_success_resets_the_failure_streak():
+    pool = BackendPool(["http://a"], failure_threshold=2)
+    a = pool.backends[0]
+    fail(pool, a, 1)
+    pool.acquire()
+    pool.release(a, ok=True, seconds=1.0)
+    fail(pool, a, 1)
+    assert a.state == CLOSED
+
+
+def test_abandoned_probe_can_be_retried_at_once(clock):
+    pool = BackendPool(["http://a"], failure_threshold=1, reset_after=30)
+    a = pool.backends[0]
+    fail(pool, a, 1)
+    clock.now += 30
+    pool.acquire()
+    pool.release(a, ok=None)
+    assert a.state == OPEN
+    assert pool.acquire() is a
+
+
+def test_lost_hedge_only_raises_the_estimate_and_counts_towards_the_breaker():
+    pool = BackendPool(["http://a"], failure_threshold=2)
+    a = pool.backends[0]
+    a.ewma_seconds = 10.0
+    pool.record_slow(a, 4.0)
+    assert a.ewma_seconds == 10.0
+    assert a.state == CLOSED
+    pool.record_slow(a, 20.0)
+    assert a.ewma_seconds == pytest.approx((1 - EWMA_ALPHA) * 10 + EWMA_ALPHA * 20)
+    assert a.state == OPEN
+    assert pool.stats["backends"][0]["hedges_lost"] == 2
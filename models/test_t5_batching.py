@@ -0,0 +1,225 @@
+"""Micro-batching scheduler, request deadlines and client disconnects of the T5 server.
+
+    python -m pytest models/test_t5_batching.py -q
+"""
+import asyncio
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from t5_batching import MicroBatchScheduler
+from t5_executor import DeadlineExceededError, QueueFullError
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def request(prompt, max_length=10):
+    return SimpleNamespace(prompt=prompt, max_length=max_length, temperature=0.6, top_p=0.8)
+
+
+class Recorder:
+    """run_batch that answers each prompt with itself, remembering every batch it was given.
+
+    While `gate` is clear it blocks, so tests can keep the scheduler's slot busy.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, requests, cancel_event):
+        self.batches.append([r.prompt for r in requests])
+        self.started.set()
+        self.gate.wait(5)
+        return [r.prompt.upper() for r in requests]
+
+
+async def stopping(scheduler, coro):
+    try:
+        return await coro
+    finally:
+        await scheduler.stop()
+
+
+def test_concurrent_requests_share_one_batch():
+    recorder = Recorder()
+    scheduler = MicroBatchScheduler(recorder, window_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(*(scheduler.submit(request(p)) for p in "abc"))
+
+    assert run(stopping(scheduler, scenario())) == ["A", "B", "C"]
+    assert recorder.batches == [["a", "b", "c"]]
+    assert scheduler.stats["batches"] == 1
+    assert scheduler.stats["max_batch_size_seen"] == 3
+
+
+def test_batches_hold_one_max_length_and_at_most_max_batch_size():
+    recorder = Recorder()
+    scheduler = MicroBatchScheduler(recorder, window_ms=50, max_batch_size=2)
+    requests = [request("a", 10), request("b", 20), request("c", 10), request("d", 10)]
+
+    async def scenario():
+        return await asyncio.gather(*(scheduler.submit(r) for r in requests))
+
+    assert run(stopping(scheduler, scenario())) == ["A", "B", "C", "D"]
+    assert sorted(map(sorted, recorder.batches)) == [["a", "c"], ["b"], ["d"]]
+
+
+def test_run_batch_error_reaches_every_caller():
+    def run_batch(requests, cancel_event):
+        raise RuntimeError("model crashed")
+
+    scheduler = MicroBatchScheduler(run_batch, window_ms=20)
+
+    async def scenario():
+        return await asyncio.gather(*(scheduler.submit(request(p)) for p in "ab"), return_exceptions=True)
+
+    errors = run(stopping(scheduler, scenario()))
+    assert [str(e) for e in errors] == ["model crashed", "model crashed"]
+
+
+def test_submit_many_decodes_mixed_lengths_together():
+    recorder = Recorder()
+    scheduler = MicroBatchScheduler(recorder, window_ms=1)
+
+    async def scenario():
+        return await scheduler.submit_many([request("a", 10), request("b", 50)])
+
+    assert run(stopping(scheduler, scenario())) == ["A", "B"]
+    assert recorder.batches == [["a", "b"]]
+
+
+def test_full_queue_sheds_with_retry_after():
+    recorder = Recorder()
+    recorder.gate.clear()
+    scheduler = MicroBatchScheduler(recorder, window_ms=1, max_queue_depth=2)
+
+    async def scenario():
+        running = asyncio.create_task(scheduler.submit(request("running")))
+        await asyncio.to_thread(recorder.started.wait, 5)
+        queued = [asyncio.create_task(scheduler.submit(request(p))) for p in "ab"]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError) as shed:
+            await scheduler.submit(request("c"))
+        recorder.gate.set()
+        return shed.value, await asyncio.gather(running, *queued)
+
+    shed, results = run(stopping(scheduler, scenario()))
+    assert shed.retry_after >= 1
+    assert results == ["RUNNING", "A", "B"]
+    assert scheduler.stats["shed"] == 1
+
+
+def test_deadline_passing_in_the_queue_fails_before_inference():
+    recorder = Recorder()
+    recorder.gate.clear()
+    scheduler = MicroBatchScheduler(recorder, window_ms=1)
+
+    async def scenario():
+        running = asyncio.create_task(scheduler.submit(request("running")))
+        await asyncio.to_thread(recorder.started.wait, 5)
+        late = asyncio.create_task(scheduler.submit(request("late"), timeout=0.05))
+        await asyncio.sleep(0.1)
+        recorder.gate.set()
+        assert await running == "RUNNING"
+        with pytest.raises(DeadlineExceededError):
+            await late
+
+    run(stopping(scheduler, scenario()))
+    assert recorder.batches == [["running"]]
+    assert scheduler.stats["expired"] == 1
+
+
+def test_batch_is_cancelled_once_every_caller_is_gone():
+    started = threading.Event()
+    cancelled = threading.Event()
+
+    def run_batch(requests, cancel_event):
+        started.set()
+        if cancel_event.wait(5):
+            cancelled.set()
+        return [None] * len(requests)
+
+    scheduler = MicroBatchScheduler(run_batch, window_ms=1)
+
+    async def scenario():
+        caller = asyncio.create_task(scheduler.submit(request("a")))
+        await asyncio.to_thread(started.wait, 5)
+        caller.cancel()
+        await asyncio.to_thread(cancelled.wait, 5)
+
+    run(stopping(scheduler, scenario()))
+    assert cancelled.is_set()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """The T5 server module, polling for disconnects every 10ms"""
+    # Keep the server's generation cache in memory instead of a t5_cache directory in the working directory
+    os.environ.setdefault("T5_CACHE_DIR", "")
+    import t5_server
+    monkeypatch.setattr(t5_server, "DISCONNECT_POLL_INTERVAL", 0.01)
+    return t5_server
+
+
+class FakeRequest:
+    """The part of a Starlette request wait_for_inference uses"""
+
+    def __init__(self, disconnected):
+        self.disconnected = disconnected
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def test_client_disconnect_answers_499_and_cancels_generation(server):
+    from fastapi import HTTPException
+    cancelled = []
+
+    async def generation():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await server.wait_for_inference(FakeRequest(disconnected=True), generation(), timeout=5)
+        await asyncio.sleep(0)
+        return error.value
+
+    assert run(scenario()).status_code == 499
+    assert cancelled == [True]
+
+
+def test_generation_past_its_deadline_answers_504(server):
+    async def scenario():
+        with pytest.raises(DeadlineExceededError) as error:
+            await server.wait_for_inference(FakeRequest(disconnected=False), asyncio.sleep(5), timeout=0.05)
+        return error.value
+
+    assert server.inference_error(run(scenario())).status_code == 504
+
+
+def test_request_timeout_is_capped_by_the_server_limit(server):
+    assert server.request_timeout(None) == server.REQUEST_TIMEOUT
+    assert server.request_timeout(5) == 5
+    assert server.request_timeout(server.REQUEST_TIMEOUT * 2) == server.REQUEST_TIMEOUT
+
+
+def test_shed_request_answers_503_with_retry_after(server):
+    error = server.inference_error(QueueFullError(7))
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == "7"
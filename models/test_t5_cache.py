@@ -0,0 +1,186 @@
+"""Generation cache of the T5 server: memory and disk tiers, coalescing and cancellation.
+
+    python -m pytest models/test_t5_cache.py -q
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from t5_cache import GenerationCache, cache_key
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def request(prompt, max_length=100, seed=None):
+    return SimpleNamespace(prompt=prompt, max_length=max_length, temperature=0.6, top_p=0.8, seed=seed)
+
+
+class Generator:
+    """generate(indices) for get_or_generate that answers text-<index> after `delay` seconds"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.cancelled = False
+
+    async def __call__(self, indices):
+        self.calls.append(list(indices))
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return [f"text-{i}" for i in indices]
+
+
+def test_cache_key_ignores_whitespace_but_not_parameters():
+    key = cache_key(request("Describe  the\nhotel"))
+    assert key == cache_key(request("Describe the hotel"))
+    assert key != cache_key(request("Describe the hotel", max_length=120))
+    assert key != cache_key(request("Describe the hotel", seed=1))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = GenerationCache(max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.stats["evictions"] == 1
+
+
+def test_disk_tier_survives_a_restart_and_stays_under_its_cap(tmp_path):
+    cache = GenerationCache(max_entries=1, cache_dir=str(tmp_path), max_disk_bytes=10)
+    cache.put("a", "12345")
+    cache.put("b", "67890")
+    cache.put("c", "abcde")
+    assert sorted(os.listdir(tmp_path)) == ["b.txt", "c.txt"]
+    assert cache.stats["disk_evictions"] == 1
+
+    restarted = GenerationCache(cache_dir=str(tmp_path), max_disk_bytes=10)
+    assert restarted.get("b") == "67890"
+    assert restarted.stats["disk_hits"] == 1
+    assert restarted.get("a") is None
+
+
+def test_get_or_generate_reads_and_writes_the_disk_tier(tmp_path):
+    GenerationCache(cache_dir=str(tmp_path)).put("old", "from disk")
+    cache = GenerationCache(cache_dir=str(tmp_path))
+    generate = Generator()
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_generate(["old", "new"], generate),
+            cache.get_or_generate(["old"], generate),
+        )
+
+    assert run(scenario()) == [["from disk", "text-1"], ["from disk"]]
+    assert generate.calls == [[1]]
+    assert (cache.stats["disk_hits"], cache.stats["coalesced"], cache.stats["misses"]) == (1, 1, 1)
+    assert GenerationCache(cache_dir=str(tmp_path)).get("new") == "text-1"
+
+
+def test_async_get_and_put_use_the_disk_tier(tmp_path):
+    cache = GenerationCache(max_entries=1, cache_dir=str(tmp_path))
+
+    async def scenario():
+        await cache.aput("a", "A")
+        await cache.aput("b", "B")
+        return await cache.aget("a"), await cache.aget("missing")
+
+    assert run(scenario()) == ("A", None)
+    assert cache.stats["disk_hits"] == 1
+
+
+def test_hits_skip_generation_and_none_keys_bypass_the_cache():
+    cache = GenerationCache()
+    cache.put("cached", "from cache")
+    generate = Generator()
+
+    results = run(cache.get_or_generate(["cached", None, "new"], generate))
+
+    assert results == ["from cache", "text-1", "text-2"]
+    assert generate.calls == [[1, 2]]
+    assert cache.get("new") == "text-2"
+    assert cache.stats["bypassed"] == 1
+
+
+def test_identical_requests_in_flight_share_one_generation():
+    cache = GenerationCache()
+    generate = Generator(delay=0.05)
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_generate(["same"], generate),
+            cache.get_or_generate(["same"], generate),
+        )
+
+    assert run(scenario()) == [["text-0"], ["text-0"]]
+    assert generate.calls == [[0]]
+    assert cache.stats["coalesced"] == 1
+
+
+def test_generation_continues_while_one_caller_still_waits():
+    cache = GenerationCache()
+    generate = Generator(delay=0.05)
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_or_generate(["same"], generate))
+        second = asyncio.create_task(cache.get_or_generate(["same"], generate))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert run(scenario()) == ["text-0"]
+    assert not generate.cancelled
+    assert cache.get("same") == "text-0"
+
+
+def test_generation_is_cancelled_once_every_caller_is_gone():
+    cache = GenerationCache()
+    generate = Generator(delay=5)
+
+    async def scenario():
+        callers = [asyncio.create_task(cache.get_or_generate(["same"], generate)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        # A new request starts over instead of waiting on the cancelled generation
+        return await cache.get_or_generate(["same"], Generator())
+
+    assert run(scenario()) == ["text-0"]
+    assert generate.cancelled
+
+
+def test_failed_generation_reaches_every_waiter_and_is_not_cached():
+    cache = GenerationCache()
+
+    async def fail(indices):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model crashed")
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_generate(["same"], fail),
+            cache.get_or_generate(["same"], fail),
+            return_exceptions=True
+        )
+
+    errors = run(scenario())
+    assert [str(e) for e in errors] == ["model crashed", "model crashed"]
+    assert cache.get("same") is None
+    with pytest.raises(RuntimeError):
+        run(cache.get_or_generate(["same"], fail))
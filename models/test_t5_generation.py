@@ -0,0 +1,119 @@
+"""Per-row sampling and per-row length limits of batched T5 generation, on a tiny random model.
+
+    python -m pytest models/test_t5_generation.py -q
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+import torch
+from transformers import (LogitsProcessorList, T5Config, T5ForConditionalGeneration, TemperatureLogitsWarper,
+                          TopKLogitsWarper, TopPLogitsWarper)
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from t5_backends import EagerBackend
+from t5_generation import BatchedSamplingWarper, generate_batch
+
+VOCAB_SIZE = 100
+
+
+def request(prompt, max_length, temperature=0.6, top_p=0.8):
+    return SimpleNamespace(prompt=prompt, max_length=max_length, temperature=temperature, top_p=top_p)
+
+
+def builtin_warpers(temperature, top_p):
+    """What model.generate applies for one temperature and top_p"""
+    return LogitsProcessorList([
+        TemperatureLogitsWarper(temperature),
+        TopKLogitsWarper(50),
+        TopPLogitsWarper(top_p),
+    ])
+
+
+class Tokenizer:
+    """Maps each word to a token id and back, remembering the ids it was asked to decode"""
+
+    pad_token_id = 0
+
+    def __init__(self):
+        self.decoded = []
+
+    def __call__(self, prompts, **kwargs):
+        rows = [[2 + len(word) for word in prompt.split()] + [1] for prompt in prompts]
+        width = max(map(len, rows))
+        return {
+            "input_ids": torch.tensor([row + [0] * (width - len(row)) for row in rows]),
+            "attention_mask": torch.tensor([[1] * len(row) + [0] * (width - len(row)) for row in rows]),
+        }
+
+    def decode(self, token_ids, skip_special_tokens=False):
+        token_ids = token_ids.tolist()
+        self.decoded.append(token_ids)
+        return " ".join(f"t{i}" for i in token_ids if i > 1)
+
+
+class RecordingBackend(EagerBackend):
+    def __init__(self, model):
+        super().__init__(model)
+        self.max_lengths = []
+
+    def generate(self, input_ids, attention_mask, max_length, *args):
+        self.max_lengths.append(max_length)
+        return super().generate(input_ids, attention_mask, max_length, *args)
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = T5Config(vocab_size=VOCAB_SIZE, d_model=16, d_kv=8, d_ff=32, num_layers=1, num_heads=2,
+                      decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+    model = T5ForConditionalGeneration(config).eval()
+    # Never stop early, so every row is decoded up to the batch's max_length
+    model.generation_config.eos_token_id = None
+    return model
+
+
+@pytest.mark.parametrize("temperature, top_p", [(0.6, 0.8), (1.0, 1.0), (1.7, 0.3)])
+def test_single_row_matches_the_builtin_warpers(temperature, top_p):
+    torch.manual_seed(1)
+    scores = torch.randn(1, VOCAB_SIZE) * 4
+    input_ids = torch.zeros(1, 1, dtype=torch.long)
+
+    expected = builtin_warpers(temperature, top_p)(input_ids, scores.clone())
+    warped = BatchedSamplingWarper([temperature], [top_p])(input_ids, scores.clone())
+
+    assert torch.equal(torch.isinf(warped), torch.isinf(expected))
+    kept = ~torch.isinf(expected)
+    assert torch.allclose(warped[kept], expected[kept])
+
+
+def test_rows_are_warped_with_their_own_parameters():
+    torch.manual_seed(2)
+    scores = torch.randn(2, VOCAB_SIZE) * 4
+    input_ids = torch.zeros(2, 1, dtype=torch.long)
+
+    warped = BatchedSamplingWarper([0.5, 1.5], [0.9, 0.4])(input_ids, scores.clone())
+
+    for row, (temperature, top_p) in enumerate([(0.5, 0.9), (1.5, 0.4)]):
+        alone = BatchedSamplingWarper([temperature], [top_p])(input_ids[row:row + 1], scores[row:row + 1].clone())
+        assert torch.equal(warped[row:row + 1], alone)
+
+
+@pytest.mark.parametrize("temperature", [0.0, -0.5])
+def test_temperature_must_be_positive(temperature):
+    with pytest.raises(ValueError):
+        BatchedSamplingWarper([0.6, temperature], [0.8, 0.8])
+
+
+def test_rows_are_cut_back_to_their_own_max_length(model):
+    backend = RecordingBackend(model)
+    tokenizer = Tokenizer()
+
+    generate_batch(backend, tokenizer, [request("short answer", 5), request("a longer answer please", 12)])
+
+    # One padded decode up to the longest limit, then each row is cut to its own
+    assert backend.max_lengths == [12]
+    assert [len(ids) for ids in tokenizer.decoded] == [5, 12]
@@ -1,24 +1,15 @@
 import requests
 import json
-import time
-from collections import deque
+
+from rate_limiter import RateLimiter
 
 # Rate limiting setup
 RATE_LIMIT_WINDOW = 3600  # 1 hour in seconds
 MAX_REQUESTS_PER_WINDOW = 100
-request_timestamps = deque()
+rate_limiter = RateLimiter("t5_client", MAX_REQUESTS_PER_WINDOW, RATE_LIMIT_WINDOW)
 
 def check_rate_limit():
-    current_time = time.time()
-    # Remove timestamps older than the window
-    while request_timestamps and current_time - request_timestamps[0] > RATE_LIMIT_WINDOW:
-        request_timestamps.popleft()
-    
-    if len(request_timestamps) >= MAX_REQUESTS_PER_WINDOW:
-        time_until_next = request_timestamps[0] + RATE_LIMIT_WINDOW - current_time
-        raise Exception(f"Rate limit exceeded. Please try again in {int(time_until_next)} seconds")
-    
-    request_timestamps.append(current_time)
+    rate_limiter.acquire()
 
 def generate_hotel_description(hotel_name, section):
     url = "http://localhost:8003/generate"  # Updated port to 8003
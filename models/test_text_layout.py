@@ -0,0 +1,83 @@
+"""Text wrapping and placement of the brochure renderer, and title fitting.
+
+    python -m pytest models/test_text_layout.py -q
+"""
+import os
+import sys
+
+import pytest
+
+# Import the modules next to this file, as the servers do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fonts import fit_font_size, load_font
+from text_layout import font_metrics, layout_text
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "Montserrat-Regular.ttf")
+TEXT = "Sweeping courtyards, fountains and rooftop views of the Aravalli hills greet every guest"
+
+
+@pytest.fixture
+def font():
+    return load_font(FONT_PATH, 36)
+
+
+def test_one_line_without_max_width(font):
+    block = layout_text(TEXT, font)
+    assert [line.text for line in block.lines] == [TEXT]
+    assert block.width == font_metrics(font).width(TEXT)
+    assert block.height == font_metrics(font).line_height
+
+
+def test_lines_fit_max_width_and_keep_every_word(font):
+    block = layout_text(TEXT, font, max_width=400)
+    assert len(block.lines) > 1
+    assert all(line.width <= 400 for line in block.lines)
+    assert " ".join(line.text for line in block.lines) == TEXT
+    # Greedy: the next line's first word would not have fit on the previous line
+    for line, following in zip(block.lines, block.lines[1:]):
+        first_word = following.text.split()[0]
+        assert font_metrics(font).width(f"{line.text} {first_word}") > 400
+
+
+def test_line_widths_match_measuring_the_line(font):
+    for line in layout_text(TEXT, font, max_width=400).lines:
+        assert line.width == font_metrics(font).width(line.text)
+
+
+def test_newlines_are_kept(font):
+    block = layout_text("Pool\n\nSpa", font)
+    assert [line.text for line in block.lines] == ["Pool", "", "Spa"]
+    assert block.text == "Pool\n\nSpa"
+    line_height = font_metrics(font).line_height
+    assert [line.y for line in block.lines] == [0, line_height, 2 * line_height]
+
+
+def test_word_wider_than_max_width_gets_its_own_line(font):
+    block = layout_text("A Supercalifragilisticexpialidocious stay", font, max_width=150)
+    assert [line.text for line in block.lines] == ["A", "Supercalifragilisticexpialidocious", "stay"]
+    assert block.width == block.lines[1].width > 150
+
+
+@pytest.mark.parametrize("align", ["left", "center", "right"])
+def test_alignment_within_the_widest_line(font, align):
+    block = layout_text("Spa\nRooftop restaurant", font, align=align)
+    short, wide = block.lines
+    assert wide.x == 0
+    expected = {"left": 0, "center": (block.width - short.width) // 2, "right": block.width - short.width}[align]
+    assert abs(short.x - expected) <= 1
+
+
+def test_explicit_line_height(font):
+    block = layout_text("One\nTwo\nThree", font, line_height=50)
+    assert [line.y for line in block.lines] == [0, 50, 100]
+    assert block.height == 150
+
+
+def test_fitted_title_is_placed_within_max_width():
+    title = "THE OBEROI UDAIVILAS LAKE PALACE RESORT"
+    size = fit_font_size(FONT_PATH, title, 1680, 140)
+    assert size < 140
+    assert layout_text(title, load_font(FONT_PATH, size)).width <= 1680
+    # The next size up would not have fit
+    assert layout_text(title, load_font(FONT_PATH, size + 5)).width > 1680
@@ -0,0 +1,119 @@
+"""Pixel-width text wrapping and line placement for the brochure renderer"""
+import math
+import threading
+import weakref
+
+MAX_CACHED_WORDS = 20000  # Per font; the cache starts over past this
+
+
+class FontMetrics:
+    """Advance widths of the words set in one font, each measured once.
+
+    A line is as wide as its words' advances plus one space advance between
+    each pair, so wrapping measures every word once instead of re-measuring
+    the growing line after each word.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.space = font.getlength(" ")
+        ascent, descent = font.getmetrics()
+        self.line_height = ascent + descent
+        self._advances = {}
+
+    def advance(self, word):
+        width = self._advances.get(word)
+        if width is None:
+            if len(self._advances) >= MAX_CACHED_WORDS:
+                self._advances = {}
+            width = self._advances[word] = self.font.getlength(word)
+        return width
+
+    def width(self, text):
+        """Width of text set on one line, in pixels"""
+        words = text.split()
+        return math.ceil(sum(self.advance(word) for word in words) + self.space * max(0, len(words) - 1))
+
+
+_metrics = weakref.WeakKeyDictionary()  # font -> FontMetrics
+_metrics_lock = threading.Lock()
+
+
+def font_metrics(font):
+    """The shared FontMetrics of font"""
+    metrics = _metrics.get(font)
+    if metrics is None:
+        with _metrics_lock:
+            metrics = _metrics.get(font)
+            if metrics is None:
+                metrics = _metrics[font] = FontMetrics(font)
+    return metrics
+
+
+class Line:
+    """One laid-out line: its text and box relative to the block's top-left corner"""
+
+    def __init__(self, text, x, y, width, height):
+        self.text = text
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+
+class TextBlock:
+    """Lines of text placed for drawing, and the size of the box they fill"""
+
+    def __init__(self, lines, width, height):
+        self.lines = lines
+        self.width = width
+        self.height = height
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def text(self):
+        return "\n".join(line.text for line in self.lines)
+
+    def draw(self, draw, position, font, fill):
+        """Draw every line with its top-left corner offset by position"""
+        x, y = position
+        for line in self.lines:
+            if line.text:
+                draw.text((x + line.x, y + line.y), line.text, font=font, fill=fill)
+
+
+def layout_text(text, font, max_width=None, line_height=None, align='left'):
+    """Wrap text to max_width pixels and place its lines, in one pass over the words.
+
+    Newlines in text are kept; a word wider than max_width gets a line of its
+    own. Lines are `line_height` apart (default: the font's ascent plus
+    descent) and aligned 'left', 'center' or 'right' within the widest line.
+    """
+    metrics = font_metrics(font)
+    line_height = line_height or metrics.line_height
+    rows = []  # (words, width)
+    for paragraph in text.split("\n"):
+        words, width = [], 0.0
+        for word in paragraph.split():
+            advance = metrics.advance(word)
+            if words and max_width is not None and width + metrics.space + advance > max_width:
+                rows.append((words, width))
+                words, width = [], 0.0
+            width = width + metrics.space + advance if words else advance
+            words.append(word)
+        rows.append((words, width))
+
+    block_width = math.ceil(max(width for _, width in rows))
+    lines = []
+    for i, (words, width) in enumerate(rows):
+        if align == 'center':
+            x = (block_width - width) // 2
+        elif align == 'right':
+            x = block_width - width
+        else:
+            x = 0
+        lines.append(Line(" ".join(words), int(x), round(i * line_height), math.ceil(width), line_height))
+    return TextBlock(lines, block_width, math.ceil(len(rows) * line_height))